@@ -0,0 +1,419 @@
+""" Benchmark suite for mooria
+
+Runs headless with an offscreen Qt platform and stores the results
+as json, such that the results of different versions can be compared::
+
+    python benchmarks/benchmark_mooria.py -o results_new.json
+    python benchmarks/benchmark_mooria.py --compare results_old.json results_new.json
+    python benchmarks/benchmark_mooria.py --budget results_new.json
+
+
+"""
+import sys
+import os
+import io
+import json
+import time
+import tempfile
+import platform
+import argparse
+import datetime
+import subprocess
+import contextlib
+
+# Has to be set before Qt is imported
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
+# Benchmark the mooria of this checkout
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__),'..'))
+sys.path.insert(0,ROOT_DIR)
+# Startup budget: median runtimes in seconds, that must not be exceeded
+STARTUP_BUDGET = {}
+STARTUP_BUDGET['import']       = 0.5 # Import of the GUI module
+STARTUP_BUDGET['startup']      = 0.2 # Create and show the main window
+STARTUP_BUDGET['cold_startup'] = 1.0 # Start of a fresh interpreter until the window is shown
+
+
+def timeit(func,repeat=5,setup=None):
+    """ Calls func repeat times and returns a list of the runtimes in
+    seconds. If setup is given, it is called before each run and its
+    return value is handed to func, the setup time is not measured.
+
+    """
+    times = []
+    for i in range(repeat):
+        args = ()
+        with contextlib.redirect_stdout(io.StringIO()): # mooria is verbose
+            if(setup is not None):
+                args = (setup(),)
+            t0 = time.perf_counter()
+            func(*args)
+            t1 = time.perf_counter()
+        times.append(t1 - t0)
+
+    return times
+
+
+def summarize(times,**params):
+    """ Creates a result record out of a list of runtimes
+    """
+    times_sorted = sorted(times)
+    n = len(times_sorted)
+    if(n % 2):
+        median = times_sorted[n//2]
+    else:
+        median = (times_sorted[n//2-1] + times_sorted[n//2])/2
+    result = {}
+    result['params'] = params
+    result['times']  = times
+    result['min']    = times_sorted[0]
+    result['median'] = median
+    result['max']    = times_sorted[-1]
+    return result
+
+
+def run_python(code,repeat=5):
+    """ Measures the runtime of code in a fresh interpreter
+    """
+    env = os.environ.copy()
+    env['QT_QPA_PLATFORM'] = 'offscreen'
+    env['PYTHONPATH'] = os.pathsep.join([ROOT_DIR] + [p for p in env.get('PYTHONPATH','').split(os.pathsep) if p])
+    cmd = [sys.executable,'-c',code]
+    def run():
+        subprocess.run(cmd,env=env,check=True,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+
+    return summarize(timeit(run,repeat))
+
+
+def bench_import(repeat=5):
+    """ Measures the import time of the mooria GUI in a fresh interpreter
+    """
+    return run_python('import mooria.mooria',repeat)
+
+
+def bench_cold_startup(repeat=5):
+    """ Measures the time from the start of a fresh interpreter until the main window is shown
+    """
+    code = 'from mooria.mooria import QtWidgets, mooriaMainWindow\n'
+    code += 'app = QtWidgets.QApplication([])\n'
+    code += 'window = mooriaMainWindow()\n'
+    code += 'window.show()\n'
+    code += 'app.processEvents()\n'
+    return run_python(code,repeat)
+
+
+def bench_startup(app,mooria,repeat=5):
+    """ Measures the time to create and show the main window
+    """
+    def run():
+        window = mooria.mooriaMainWindow()
+        window.show()
+        app.processEvents()
+        window.close()
+        window.deleteLater()
+
+    return summarize(timeit(run,repeat))
+
+
+@contextlib.contextmanager
+def catalog_size(mooria,ndevices,widget=None):
+    """ Temporarily inflates the builtin device catalog to ndevices
+    entries by copying the existing devices, the catalog model of
+    widget is updated accordingly
+    """
+    devices = mooria.mooria.devices
+    orig = dict(devices)
+    names = list(orig.keys())
+    i = 0
+    while(len(devices) < ndevices):
+        name = names[i % len(names)]
+        devname = '{:s}_{:05d}'.format(name,i)
+        devices[devname] = dict(orig[name])
+        devices[devname]['name'] = devname
+        i += 1
+
+    if(widget is not None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            widget.update_catalog_model()
+    try:
+        yield devices
+    finally:
+        devices.clear()
+        devices.update(orig)
+        if(widget is not None):
+            with contextlib.redirect_stdout(io.StringIO()):
+                widget.update_catalog_model()
+
+
+def bench_create_mooring_widget(widget,mooria,ndevices,repeat=5):
+    """ Measures create_mooring_widget for a catalog with ndevices devices
+    """
+    with catalog_size(mooria,ndevices,widget):
+        def run():
+            mooring = widget.create_mooring_widget('bench',depth=100)
+            mooring['widget'].deleteLater()
+
+        times = timeit(run,repeat)
+
+    return summarize(times,ndevices=ndevices)
+
+
+def bench_catalog_search(widget,mooria,ndevices,repeat=5):
+    """ Measures search as you type in a catalog with ndevices devices
+    """
+    with catalog_size(mooria,ndevices,widget):
+        with contextlib.redirect_stdout(io.StringIO()):
+            mooring = widget.create_mooring_widget('bench',depth=100)
+        def run():
+            for text in ['m','mi','mic','micr','micro','microcat','microcat t','']:
+                widget.filter_catalog(mooring,text)
+
+        times = timeit(run,repeat)
+        mooring['widget'].deleteLater()
+
+    return summarize(times,ndevices=ndevices)
+
+
+def bench_add_devices(widget,mooria,ndevices,repeat=5):
+    """ Measures add_device_to_mooring for ndevices devices
+    """
+    names = list(mooria.mooria.devices.keys())
+    def setup():
+        mooring = widget.create_mooring_widget('bench',depth=1000)
+        devs = []
+        for i in range(ndevices):
+            name = names[i % len(names)]
+            devs.append(widget.create_device_widget(mooring,name,mooria.mooria.devices[name]))
+        return (mooring,devs)
+
+    def run(args):
+        mooring,devs = args
+        for dev in devs:
+            widget.add_device_to_mooring(mooring,dev)
+
+    return summarize(timeit(run,repeat,setup=setup),ndevices=ndevices)
+
+
+def fill_moorings(widget,mooria,nmoorings,ndevices):
+    """ Creates nmoorings moorings with ndevices each in widget
+    """
+    names = list(mooria.mooria.devices.keys())
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(nmoorings):
+            name = 'bench_{:04d}'.format(i)
+            widget.add_new_mooring(name=name,depth=100 + i)
+            row = widget.allmoorings['table'].rowCount() - 1
+            mooring = widget.moorings[-1]
+            table = widget.allmoorings['table']
+            for head,val in [('Longitude','{:3.5f}'.format(10 + i/100)),('Latitude','{:3.5f}'.format(54 + i/100)),
+                             ('Deployed','2020-05-01 12:00:00'),('Recovered','2021-05-01 12:00:00'),
+                             ('Long term series','bench'),('Campaign','bench'),('Comment','')]:
+                item = mooria.QtWidgets.QTableWidgetItem(val)
+                table.setItem(row,widget.allmoorings['headers'][head],item)
+
+            for j in range(ndevices):
+                devname = names[j % len(names)]
+                dev = widget.create_device_widget(mooring,devname,mooria.mooria.devices[devname])
+                dev['device_widgets']['location'][0].setText(str(10 * j))
+                widget.add_device_to_mooring(mooring,dev)
+
+
+def bench_roundtrip(widget,mooria,nmoorings,repeat=5):
+    """ Measures create_mooring_dict, save_yaml_summary and load_mooring_dict
+
+    The artifact cache of the yaml export is a temporary one, not the
+    cache of the user. save_yaml_summary is measured with an empty cache
+    (comparable to versions without cache) and save_yaml_summary_warm
+    with all moorings in the cache
+    """
+    results = {}
+    results['create_mooring_dict'] = summarize(timeit(widget.create_mooring_dict,repeat),nmoorings=nmoorings)
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = widget.create_mooring_dict()
+        data_nodev = widget.create_mooring_dict(with_devices=False)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir,'bench.yaml')
+        cache = mooria.cache.artifactCache(os.path.join(tmpdir,'artifacts.sqlite'))
+        previous = mooria.cache.set_cache(cache)
+        try:
+            times = timeit(lambda c: widget.save_yaml_summary(data,filename),repeat,setup=cache.clear)
+            results['save_yaml_summary'] = summarize(times,nmoorings=nmoorings)
+            times = timeit(lambda: widget.save_yaml_summary(data,filename),repeat)
+            results['save_yaml_summary_warm'] = summarize(times,nmoorings=nmoorings)
+        finally:
+            mooria.cache.set_cache(previous)
+            cache.close()
+        def setup():
+            return mooria.mainWidget()
+        def run(w):
+            with open(filename) as f:
+                w.load_mooring_dict(mooria.mooria.yaml.safe_load(f))
+        results['load_mooring_dict'] = summarize(timeit(run,repeat,setup=setup),nmoorings=nmoorings)
+        results['read_yaml'] = summarize(timeit(lambda: mooria.fileio.read_mooring_file(filename),repeat),nmoorings=nmoorings)
+        # The versioned JSON format
+        filename = os.path.join(tmpdir,'bench.json')
+        times = timeit(lambda: mooria.jsonformat.export_json(data,filename,compact=True),repeat)
+        results['save_json'] = summarize(times,nmoorings=nmoorings)
+        results['read_json'] = summarize(timeit(lambda: mooria.fileio.read_mooring_file(filename),repeat),nmoorings=nmoorings)
+        # Exporters
+        filename = os.path.join(tmpdir,'bench.geojson')
+        times = timeit(lambda: widget.save_geojson_summary(data_nodev,filename),repeat)
+        results['save_geojson_summary'] = summarize(times,nmoorings=nmoorings)
+        filename = os.path.join(tmpdir,'bench.csv')
+        times = timeit(lambda: widget.create_csv(filename),repeat)
+        results['create_csv'] = summarize(times,nmoorings=nmoorings)
+
+    return results
+
+
+def bench_reopen(widget,mooria,nmoorings,repeat=5):
+    """ Measures tearing down the first mooring to its data and creating its widgets again
+    """
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            row = 0
+            item = widget.allmoorings['table'].item(row,widget.allmoorings['headers']['Name'])
+            if(item.mooring is not None):
+                widget.teardown_mooring(item.mooring)
+            widget.open_mooring(row)
+
+    return summarize(timeit(run,repeat),nmoorings=nmoorings)
+
+
+def bench_plot(widget,mooria,app,dpi=300,repeat=3):
+    """ Measures plot_mooring_dict
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        mooring_dict = widget.create_mooring_dict()['moorings'][0]
+    def run():
+        widget.plot_mooring_dict(mooring_dict,dpi=dpi)
+        app.processEvents()
+
+    return summarize(timeit(run,repeat),dpi=dpi)
+
+
+def run_benchmarks(ndevices=(10,100),nmoorings=(10,100),repeat=5):
+    """ Runs all benchmarks and returns a dictionary with the results
+    """
+    results = {}
+    print('Import')
+    results['import'] = bench_import(repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import mooria
+
+    app = mooria.QtWidgets.QApplication.instance()
+    if(app is None):
+        app = mooria.QtWidgets.QApplication(sys.argv)
+
+    print('Startup')
+    results['startup'] = bench_startup(app,mooria,repeat)
+    print('Cold startup')
+    results['cold_startup'] = bench_cold_startup(repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        widget = mooria.mainWidget()
+    for n in ndevices:
+        print('create_mooring_widget',n)
+        results['create_mooring_widget_{:d}'.format(n)] = bench_create_mooring_widget(widget,mooria,n,repeat)
+        print('catalog_search',n)
+        results['catalog_search_{:d}'.format(n)] = bench_catalog_search(widget,mooria,n,repeat)
+        print('add_device_to_mooring',n)
+        results['add_device_to_mooring_{:d}'.format(n)] = bench_add_devices(widget,mooria,n,repeat)
+
+    for n in nmoorings:
+        print('Roundtrip',n)
+        with contextlib.redirect_stdout(io.StringIO()):
+            widget = mooria.mainWidget()
+        fill_moorings(widget,mooria,n,5)
+        for name,res in bench_roundtrip(widget,mooria,n,repeat).items():
+            results['{:s}_{:d}'.format(name,n)] = res
+        print('Reopen mooring',n)
+        results['reopen_mooring_{:d}'.format(n)] = bench_reopen(widget,mooria,n,repeat)
+
+    print('plot_mooring_dict')
+    results['plot_mooring_dict'] = bench_plot(widget,mooria,app)
+
+    summary = {}
+    summary['mooria_version'] = mooria.mooria.version
+    summary['python']         = platform.python_version()
+    summary['platform']       = platform.platform()
+    summary['date']           = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    summary['results']        = results
+    return summary
+
+
+def compare(filename_old,filename_new,threshold=1.2):
+    """ Compares two result files and prints the ratio of the median
+    runtimes. Returns the list of benchmarks slower than threshold.
+    """
+    with open(filename_old) as f:
+        old = json.load(f)
+    with open(filename_new) as f:
+        new = json.load(f)
+
+    print('Comparing {:s} ({:s}) with {:s} ({:s})'.format(filename_old,old['mooria_version'],filename_new,new['mooria_version']))
+    regressions = []
+    for name in new['results']:
+        if(name not in old['results']):
+            continue
+        told = old['results'][name]['median']
+        tnew = new['results'][name]['median']
+        ratio = tnew/told if told > 0 else float('inf')
+        flag = ''
+        if(ratio > threshold):
+            flag = 'SLOWER'
+            regressions.append(name)
+        print('{:40s} {:10.4f} s {:10.4f} s {:6.2f} {:s}'.format(name,told,tnew,ratio,flag))
+
+    return regressions
+
+
+def check_budget(filename,budget=STARTUP_BUDGET):
+    """ Checks the results in filename against the budget, returns the
+    list of benchmarks over budget
+    """
+    with open(filename) as f:
+        results = json.load(f)['results']
+
+    over = []
+    for name,limit in budget.items():
+        if(name not in results):
+            continue
+        t = results[name]['median']
+        flag = ''
+        if(t > limit):
+            flag = 'OVER BUDGET'
+            over.append(name)
+        print('{:40s} {:10.4f} s {:10.4f} s {:s}'.format(name,t,limit,flag))
+
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for mooria')
+    parser.add_argument('-o','--output',default=None,help='Filename of the json result file, default mooria_benchmark_<version>.json')
+    parser.add_argument('--repeat',type=int,default=5)
+    parser.add_argument('--ndevices',type=int,nargs='+',default=[10,100])
+    parser.add_argument('--nmoorings',type=int,nargs='+',default=[10,100])
+    parser.add_argument('--compare',nargs=2,metavar=('OLD','NEW'),help='Compare two result files')
+    parser.add_argument('--threshold',type=float,default=1.2,help='Ratio of median runtimes to flag a regression')
+    parser.add_argument('--budget',metavar='RESULTS',help='Check the startup times of a result file against the startup budget')
+    args = parser.parse_args()
+    if(args.budget is not None):
+        over = check_budget(args.budget)
+        sys.exit(1 if len(over) > 0 else 0)
+    if(args.compare is not None):
+        regressions = compare(args.compare[0],args.compare[1],args.threshold)
+        sys.exit(1 if len(regressions) > 0 else 0)
+
+    summary = run_benchmarks(args.ndevices,args.nmoorings,args.repeat)
+    filename = args.output
+    if(filename is None):
+        filename = 'mooria_benchmark_{:s}.json'.format(summary['mooria_version'])
+
+    with open(filename,'w') as f:
+        json.dump(summary,f,indent=1)
+
+    print('Results written to',filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,11 @@
-from .mooria import *
+# The GUI (Qt and matplotlib) is imported when first used, such that the
+# command line tools and the library modules start fast
+def __getattr__(name):
+    import importlib
+    gui = importlib.import_module('.mooria',__name__)
+    if(name == 'mooria'):
+        return gui
+    try:
+        return getattr(gui,name)
+    except AttributeError:
+        raise AttributeError("module 'mooria' has no attribute '{:s}'".format(name)) from None
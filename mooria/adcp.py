@@ -0,0 +1,254 @@
+""" Vertical coverage of ADCPs
+
+Computes the depth range profiled by the ADCPs of moorings, their bin
+centres and the zone near the surface (upward looking) or the bottom
+(downward looking) contaminated by side lobe reflections. The
+contaminated zone of an ADCP with the beam angle a at the distance D
+from the boundary is D*(1 - cos(a)) thick. All ADCPs of a collection
+are computed at once with numpy arrays.
+
+Fields not given in the device (range, blanking distance, bin size,
+beam angle) are taken from typical values of the instrument frequency.
+
+"""
+import numpy as np
+
+from .utils import parse_float, device_depth
+
+# Typical profiling range [m], blanking distance [m] and bin size [m] by frequency [kHz]
+DEFAULT_RANGE = {75:700.0,150:400.0,300:120.0,600:60.0,1000:25.0,1200:20.0,2000:10.0}
+DEFAULT_BLANK = {75:6.0,150:6.0,300:4.0,600:2.0,1000:0.4,1200:1.0,2000:0.2}
+DEFAULT_BIN   = {75:16.0,150:8.0,300:4.0,600:2.0,1000:1.0,1200:1.0,2000:0.5}
+# Beam angles of the catalog devices if not given [deg]
+DEFAULT_BEAM_ANGLE = {'Workhorse':20.0,'Aquadopp':25.0}
+DEFAULT_FREQUENCY  = {'Workhorse':300,'Aquadopp':1000}
+
+
+def is_adcp(device):
+    """ A device is treated as ADCP if it has an orientation and a frequency
+    """
+    return ('orientation' in device) and ('frequency' in device)
+
+
+def _default(table,frequency):
+    """ Value of the closest frequency in table
+    """
+    freqs = np.array(sorted(table.keys()))
+    return table[int(freqs[np.argmin(abs(freqs - frequency))])]
+
+
+def collect_adcps(data):
+    """ Collects the ADCPs of all moorings of a collection
+
+    Returns:
+        A dictionary of numpy arrays, one entry per ADCP: 'mooring' and
+        'device' (indices into data), 'depth' of the ADCP, 'bottom' depth
+        of the mooring, 'up' (True for upward looking), 'range',
+        'blank', 'binsize' and 'beam_angle', and the lists 'names'
+        (device names) and 'moorings' (mooring names)
+    """
+    rows = []
+    names = []
+    for i,mooring in enumerate(data.get('moorings',[])):
+        bottom = parse_float(mooring.get('depth',''))
+        for j,device in enumerate(mooring.get('devices',[])):
+            if(not is_adcp(device)):
+                continue
+            depth,mab = device_depth(device.get('location',''),bottom)
+            if((depth is None) or (bottom is None)):
+                continue
+            name = str(device.get('name',''))
+            frequency = parse_float(device.get('frequency',''))
+            if(frequency is None):
+                frequency = DEFAULT_FREQUENCY.get(name,300)
+            frange  = parse_float(device.get('range',''))
+            blank   = parse_float(device.get('blanking_distance',''))
+            binsize = parse_float(device.get('bin_size',''))
+            angle   = parse_float(device.get('beam_angle',''))
+            rows.append((i,j,depth,bottom,str(device.get('orientation','up')).lower() != 'down',
+                         _default(DEFAULT_RANGE,frequency) if frange is None else frange,
+                         _default(DEFAULT_BLANK,frequency) if blank is None else blank,
+                         _default(DEFAULT_BIN,frequency) if binsize is None else binsize,
+                         DEFAULT_BEAM_ANGLE.get(name,20.0) if angle is None else angle))
+            names.append((name,str(mooring.get('name',''))))
+
+    adcps = {}
+    cols = list(zip(*rows)) if len(rows) > 0 else [[]] * 9
+    adcps['mooring']    = np.array(cols[0],dtype=np.int64)
+    adcps['device']     = np.array(cols[1],dtype=np.int64)
+    adcps['depth']      = np.array(cols[2],dtype=float)
+    adcps['bottom']     = np.array(cols[3],dtype=float)
+    adcps['up']         = np.array(cols[4],dtype=bool)
+    adcps['range']      = np.array(cols[5],dtype=float)
+    adcps['blank']      = np.array(cols[6],dtype=float)
+    adcps['binsize']    = np.array(cols[7],dtype=float)
+    adcps['beam_angle'] = np.array(cols[8],dtype=float)
+    adcps['names']      = [n[0] for n in names]
+    adcps['moorings']   = [n[1] for n in names]
+    return adcps
+
+
+def adcp_coverage(adcps):
+    """ Computes the vertical coverage of the ADCPs of collect_adcps()
+
+    Returns:
+        A dictionary of arrays, one entry per ADCP, all depths positive
+        downwards: 'top' and 'bottom' of the profiled range,
+        'sidelobe_top' and 'sidelobe_bottom' of the side lobe zone
+        within the range (NaN if the range does not reach it),
+        'valid_top' and 'valid_bottom' of the range without the side
+        lobe zone, 'bins' of shape (nadcps,nbins) with the bin centres
+        (NaN padded) and 'bin_valid', True for bins outside the side
+        lobe zone
+    """
+    depth  = adcps['depth']
+    bottom = adcps['bottom']
+    up     = adcps['up']
+    # Distance to the boundary the ADCP is looking at
+    dist   = np.where(up,depth,bottom - depth)
+    dist   = np.maximum(dist,0)
+    sidelobe = dist * (1 - np.cos(np.deg2rad(adcps['beam_angle'])))
+    # Profiled range as distances from the ADCP
+    near = np.minimum(adcps['blank'],dist)
+    far  = np.minimum(adcps['blank'] + adcps['range'],dist)
+    # The clean range ends at the side lobe zone
+    clean = np.maximum(np.minimum(far,dist - sidelobe),near)
+    sign = np.where(up,-1.0,1.0)
+    result = {}
+    p1 = depth + sign * near
+    p2 = depth + sign * far
+    c2 = depth + sign * clean
+    result['top']          = np.minimum(p1,p2)
+    result['bottom']       = np.maximum(p1,p2)
+    result['valid_top']    = np.minimum(p1,c2)
+    result['valid_bottom'] = np.maximum(p1,c2)
+    has_sidelobe = far > clean
+    result['sidelobe_top']    = np.where(has_sidelobe,np.minimum(c2,p2),np.nan)
+    result['sidelobe_bottom'] = np.where(has_sidelobe,np.maximum(c2,p2),np.nan)
+    # Bin centres
+    binsize = adcps['binsize']
+    nbins = np.floor(np.maximum(far - near,0)/binsize).astype(np.int64)
+    nmax = nbins.max() if len(nbins) > 0 else 0
+    k = np.arange(nmax)
+    dbin = near[:,None] + binsize[:,None] * (k[None,:] + 0.5)
+    inrange = k[None,:] < nbins[:,None]
+    result['bins']      = np.where(inrange,depth[:,None] + sign[:,None] * dbin,np.nan)
+    result['bin_valid'] = inrange & (dbin <= clean[:,None])
+    return result
+
+
+def mooring_adcp_coverage(mooring_dict):
+    """ ADCPs and their coverage of a single mooring dictionary
+    """
+    adcps = collect_adcps({'moorings':[mooring_dict]})
+    return adcps,adcp_coverage(adcps)
+
+
+def campaign_adcp_coverage(data,dz=1.0):
+    """ Computes the fraction of the water column of every mooring of a
+    collection covered by valid (side lobe free) ADCP bins
+
+    Returns:
+        A dictionary with the mooring 'names', their 'depth', the
+        'covered' fraction (NaN for moorings without depth), 'nadcps',
+        the 'grid' of shape (nmoorings,ncells) with the number of ADCPs
+        covering a depth cell (-1 below the bottom), the cell edges
+        'depth_edges' and the uncovered 'gaps' of every mooring as
+        lists of (top,bottom)
+    """
+    moorings = data.get('moorings',[])
+    n = len(moorings)
+    names = [str(m.get('name','')) for m in moorings]
+    bottom = np.array([np.nan if parse_float(m.get('depth','')) is None else parse_float(m.get('depth','')) for m in moorings],dtype=float)
+    adcps = collect_adcps(data)
+    cov = adcp_coverage(adcps)
+    dmax = np.nanmax(bottom) if np.any(np.isfinite(bottom)) else dz
+    ncells = max(int(np.ceil(dmax/dz)),1)
+    edges = dz * np.arange(ncells + 1)
+    # Difference array over the depth cells of every mooring
+    i0 = np.clip(np.floor(cov['valid_top']/dz).astype(np.int64),0,ncells)
+    i1 = np.clip(np.ceil(cov['valid_bottom']/dz).astype(np.int64),0,ncells)
+    valid = i1 > i0
+    diff = np.zeros((n,ncells + 1),dtype=np.int32)
+    np.add.at(diff,(adcps['mooring'][valid],i0[valid]),1)
+    np.add.at(diff,(adcps['mooring'][valid],i1[valid]),-1)
+    grid = np.cumsum(diff,axis=1)[:,:-1]
+    centres = edges[:-1] + dz/2
+    inwater = centres[None,:] < bottom[:,None]
+    grid = np.where(inwater,grid,-1)
+    ncovered = ((grid > 0) & inwater).sum(axis=1)
+    nwater = inwater.sum(axis=1)
+    result = {}
+    result['names']       = names
+    result['depth']       = bottom
+    result['covered']     = np.where(nwater > 0,ncovered/np.maximum(nwater,1),np.nan)
+    result['nadcps']      = np.bincount(adcps['mooring'],minlength=n)
+    result['grid']        = grid
+    result['depth_edges'] = edges
+    # Gaps, changes between covered and uncovered cells
+    gaps = []
+    uncovered = np.zeros((n,ncells + 2),dtype=np.int8)
+    uncovered[:,1:-1] = (grid == 0)
+    change = np.diff(uncovered,axis=1)
+    for i in range(n):
+        starts = np.nonzero(change[i] == 1)[0]
+        ends   = np.nonzero(change[i] == -1)[0]
+        gaps.append([(edges[s],min(edges[e],bottom[i])) for s,e in zip(starts,ends)])
+    result['gaps'] = gaps
+    return result
+
+
+def adcp_report(result):
+    """ Creates a text report of the result of campaign_adcp_coverage()
+    """
+    lines = []
+    for i,name in enumerate(result['names']):
+        if(np.isnan(result['covered'][i])):
+            lines.append('{:s}: no depth'.format(name))
+            continue
+        lines.append('{:s}: {:d} ADCPs, {:.1f}% of {:.1f} m covered'.format(
+            name,int(result['nadcps'][i]),100 * result['covered'][i],result['depth'][i]))
+        for top,bottom in result['gaps'][i]:
+            lines.append('    gap {:.1f} - {:.1f} m'.format(top,bottom))
+
+    return '\n'.join(lines)
+
+
+def plot_adcp_coverage(ax,adcps,coverage,x=0,width=0.2):
+    """ Plots the profiled ranges, bins and side lobe zones of ADCPs into
+    the axes ax, the ADCPs are placed side by side around x
+    """
+    n = len(adcps['depth'])
+    for i in range(n):
+        xi = x + (i - (n - 1)/2) * width * 1.2
+        x0,x1 = xi - width/2,xi + width/2
+        ax.fill_between([x0,x1],coverage['valid_top'][i],coverage['valid_bottom'][i],color='tab:cyan',alpha=.4,lw=0)
+        if(np.isfinite(coverage['sidelobe_top'][i])):
+            ax.fill_between([x0,x1],coverage['sidelobe_top'][i],coverage['sidelobe_bottom'][i],
+                            facecolor='none',edgecolor='tab:red',hatch='//',lw=0)
+        bins = coverage['bins'][i]
+        valid = coverage['bin_valid'][i]
+        ax.hlines(bins[valid],x0,x1,color='tab:blue',lw=.5)
+        ax.hlines(bins[np.isfinite(bins) & ~valid],x0,x1,color='tab:red',lw=.5)
+        ax.plot(xi,adcps['depth'][i],'^' if adcps['up'][i] else 'v',color='k')
+        ax.text(x1,adcps['depth'][i],' ' + adcps['names'][i],va='center',fontsize='small')
+
+
+def plot_campaign_adcp_coverage(result,fig=None):
+    """ Plots the number of ADCPs covering every depth cell of every
+    mooring into the matplotlib figure fig, returns the figure
+    """
+    from matplotlib.figure import Figure
+    if(fig is None):
+        fig = Figure()
+    ax = fig.add_subplot(111)
+    grid = np.ma.masked_less(result['grid'].T.astype(float),0)
+    n = len(result['names'])
+    pc = ax.pcolormesh(np.arange(n + 1) - .5,result['depth_edges'],grid,cmap='viridis',vmin=0)
+    fig.colorbar(pc,ax=ax,label='Number of ADCPs')
+    ax.set_xticks(range(n))
+    ax.set_xticklabels(result['names'],rotation=90,fontsize='small')
+    dmax = np.nanmax(result['depth']) if np.any(np.isfinite(result['depth'])) else result['depth_edges'][-1]
+    ax.set_ylim(dmax,0)
+    ax.set_ylabel('Depth [m]')
+    return fig
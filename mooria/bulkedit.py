@@ -0,0 +1,203 @@
+""" Bulk editing of devices
+
+Selects the devices of a mooring collection by a query (device type,
+company, parameter, campaign and depth range) and changes fields of all
+of them at once. The changes are a transaction: they are made on copies
+of the affected moorings, which are validated, and only if no new
+errors are found the moorings of the collection are replaced::
+
+    mooria-bulkedit archive.yaml --device Microcat --campaign EMB228 --set sampling_interval=60 -o archive.yaml
+
+"""
+import sys
+import argparse
+import yaml
+
+from .catalog import get_catalog
+from .utils import parse_float, device_depth
+from .validate import validate_mooring_dict
+from .fileio import read_mooring_file, write_mooring_file
+
+# Use the fast libyaml loader if available
+SafeLoader = getattr(yaml,'CSafeLoader',yaml.SafeLoader)
+
+
+class bulkEditError(ValueError):
+    """ The changes of a bulk edit would make the collection invalid,
+    errors is the list of new errors as returned by validate_mooring_dict()
+    """
+    def __init__(self,errors):
+        ValueError.__init__(self,'{:d} new errors, nothing changed: {:s}'.format(len(errors),errors[0]['path'] + ': ' + errors[0]['message']))
+        self.errors = errors
+
+
+def device_matches(mooring,device,name=None,company=None,parameter=None,campaign=None,depth_min=None,depth_max=None,devices=None):
+    """ Returns True if the device of mooring matches the query, see
+    select_devices()
+    """
+    if((campaign is not None) and (str(mooring.get('campaign','')).strip().lower() != campaign.strip().lower())):
+        return False
+    dname = str(device.get('name',''))
+    if((name is not None) and (dname.lower() != name.strip().lower())):
+        return False
+    if(company is not None):
+        dcompany = device.get('company',None)
+        if(dcompany is None): # Not stored in the file, the one of the catalog
+            dcompany = (devices or {}).get(dname,{}).get('company','')
+        if(company.strip().lower() not in str(dcompany).lower()):
+            return False
+    if((parameter is not None) and (parameter not in [str(p) for p in device.get('parameter',[])])):
+        return False
+    if((depth_min is not None) or (depth_max is not None)):
+        depth,mab = device_depth(device.get('location',''),mooring.get('depth',''))
+        if(depth is None):
+            return False
+        if((depth_min is not None) and (depth < depth_min)):
+            return False
+        if((depth_max is not None) and (depth > depth_max)):
+            return False
+
+    return True
+
+
+def select_devices(data,name=None,company=None,parameter=None,campaign=None,depth_min=None,depth_max=None,devices=None):
+    """ Selects the devices of the collection data matching all given
+    query fields (None matches everything)
+
+    Args:
+        name: Device type, e.g. 'Microcat' (case insensitive)
+        company: Part of the company name (case insensitive), taken from the catalog if not in the device
+        parameter: A measured parameter, e.g. 'T'
+        campaign: Campaign of the mooring (case insensitive)
+        depth_min,depth_max: Depth range of the device location [m]
+        devices: Device catalog, default the catalog of mooria
+
+    Returns:
+        List of (mooring index,device index)
+    """
+    if(devices is None):
+        devices = get_catalog().devices
+    depth_min = parse_float(depth_min)
+    depth_max = parse_float(depth_max)
+    selection = []
+    for i,mooring in enumerate(data['moorings']):
+        for j,device in enumerate(mooring.get('devices',[])):
+            if(device_matches(mooring,device,name,company,parameter,campaign,depth_min,depth_max,devices)):
+                selection.append((i,j))
+
+    return selection
+
+
+def _error_keys(errors,indices):
+    """ The errors with the mooring path of the collection, not the one
+    of the validated list of moorings
+    """
+    keys = set()
+    for e in errors:
+        path = e['path']
+        if(path.startswith('moorings[')):
+            k = int(path[9:path.index(']')])
+            path = 'moorings[{:d}]'.format(indices[k]) + path[path.index(']') + 1:]
+        keys.add((e['level'],path,e['message']))
+
+    return keys
+
+
+def apply_changes(data,selection,changes,devices=None):
+    """ Sets the fields of the dictionary changes (field: value) in all
+    selected devices of the collection data, see select_devices()
+
+    The collection is only changed if the changed moorings have no new
+    errors, otherwise bulkEditError is raised. Warnings (e.g. a field not
+    in the catalog entry of a device) are accepted.
+
+    Returns:
+        List of the changes, dictionaries with 'mooring' and 'device'
+        (indices), 'field', 'old' and 'new'
+    """
+    indices = sorted(set(i for i,j in selection))
+    # The affected moorings are copied, the others are not touched
+    copies = {}
+    for i in indices:
+        mooring = dict(data['moorings'][i])
+        mooring['devices'] = [dict(d) for d in mooring.get('devices',[])]
+        copies[i] = mooring
+
+    log = []
+    for i,j in selection:
+        device = copies[i]['devices'][j]
+        for field,value in changes.items():
+            old = device.get(field,None)
+            if(old == value):
+                continue
+            device[field] = value
+            log.append({'mooring':i,'device':j,'field':field,'old':old,'new':value})
+
+    before = validate_mooring_dict({'moorings':[data['moorings'][i] for i in indices]},devices)
+    after  = validate_mooring_dict({'moorings':[copies[i] for i in indices]},devices)
+    known  = _error_keys(before,indices)
+    errors = []
+    for level,path,message in sorted(_error_keys(after,indices) - known):
+        if(level == 'error'):
+            errors.append({'path':path,'level':level,'message':message})
+    if(len(errors) > 0):
+        raise bulkEditError(errors)
+
+    for i in indices:
+        data['moorings'][i] = copies[i]
+
+    return log
+
+
+def bulk_edit(data,changes,devices=None,**query):
+    """ Selects the devices by the query (see select_devices()) and
+    applies the changes (see apply_changes()), returns the change log
+    """
+    selection = select_devices(data,devices=devices,**query)
+    return apply_changes(data,selection,changes,devices)
+
+
+def parse_change(s):
+    """ Parses a change 'field=value' of the command line, the value is
+    read as yaml, e.g. 'parameter=[T, C]'
+    """
+    if('=' not in s):
+        raise argparse.ArgumentTypeError('expected field=value, got {:s}'.format(s))
+    field,value = s.split('=',1)
+    value = yaml.load(value,Loader=SafeLoader)
+    return field.strip(),'' if value is None else value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Changes fields of all devices of a mooring file matching a query')
+    parser.add_argument('filename',help='The mooring file')
+    parser.add_argument('--device',help='Device type, e.g. Microcat')
+    parser.add_argument('--company',help='Part of the company name')
+    parser.add_argument('--parameter',help='A measured parameter, e.g. T')
+    parser.add_argument('--campaign',help='Campaign of the moorings')
+    parser.add_argument('--depth-min',type=float,help='Minimum depth of the devices [m]')
+    parser.add_argument('--depth-max',type=float,help='Maximum depth of the devices [m]')
+    parser.add_argument('--set',dest='changes',action='append',type=parse_change,required=True,help='The change field=value, can be given several times')
+    parser.add_argument('-o','--output',help='Write the changed moorings into this file, default: only show the changes')
+    args = parser.parse_args()
+    data = read_mooring_file(args.filename)
+    try:
+        log = bulk_edit(data,dict(args.changes),name=args.device,company=args.company,parameter=args.parameter,
+                        campaign=args.campaign,depth_min=args.depth_min,depth_max=args.depth_max)
+    except bulkEditError as e:
+        for err in e.errors:
+            print('{:s}: {:s}'.format(err['path'],err['message']))
+        print('Nothing changed')
+        sys.exit(1)
+
+    for change in log:
+        mooring = data['moorings'][change['mooring']]
+        device = mooring['devices'][change['device']]
+        print('{:s}, {:s}: {:s} {:s} -> {:s}'.format(str(mooring.get('name','')),str(device.get('name','')),change['field'],repr(change['old']),repr(change['new'])))
+    print('{:d} changes'.format(len(log)))
+    if(args.output is not None):
+        write_mooring_file(data,args.output)
+
+
+if __name__ == '__main__':
+    main()
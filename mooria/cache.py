@@ -0,0 +1,168 @@
+""" Content addressed cache of generated artifacts
+
+Exports (yaml fragments and plots of moorings) are
+stored under a key made of the content hash of the mooring, the kind
+and version of the exporter and its options. If a mooring did not
+change, its artifact is taken from the cache instead of being created
+again. The artifacts are kept in a sqlite database, the least recently
+used ones are removed if the cache grows larger than its size limit::
+
+    cache = get_cache()
+    images = cached_map(cache,'plot',PLOT_VERSION,{'dpi':dpi},moorings,plot_png)
+
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+
+from .diff import hash_dict
+
+logger = logging.getLogger('mooria.cache')
+
+# Size limit of the cache [bytes]
+MAXSIZE = 256 * 1024 * 1024
+# Keys per sqlite query
+BATCHSIZE = 500
+
+
+def default_cache_filename():
+    return os.path.join(os.path.expanduser('~'),'.mooria','artifacts.sqlite')
+
+
+def artifact_key(kind,version,options,content):
+    """ Returns the key of an artifact of the exporter kind in version
+    with options (json serializable) created from content (e.g. a
+    mooring dictionary)
+    """
+    s = json.dumps([kind,version,options,hash_dict(content)],sort_keys=True,default=str,separators=(',',':'))
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+
+class artifactCache():
+    """ Cache of artifacts (bytes) in the sqlite database filename,
+    limited to maxsize bytes
+    """
+    def __init__(self,filename=None,maxsize=MAXSIZE):
+        if(filename is None):
+            filename = default_cache_filename()
+        directory = os.path.dirname(filename)
+        if(len(directory) > 0):
+            os.makedirs(directory,exist_ok=True)
+        self.filename = filename
+        self.maxsize = maxsize
+        self.db = sqlite3.connect(filename,timeout=30)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS artifacts (key TEXT PRIMARY KEY, data BLOB, size INTEGER, atime REAL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS artifacts_atime ON artifacts (atime)')
+
+    def get_many(self,keys):
+        """ Returns a dictionary key: data of the keys found in the cache
+        and marks them as used
+        """
+        keys = list(set(keys))
+        found = {}
+        now = time.time()
+        with self.db:
+            for i in range(0,len(keys),BATCHSIZE):
+                batch = keys[i:i + BATCHSIZE]
+                marks = ','.join('?' * len(batch))
+                for key,data in self.db.execute('SELECT key,data FROM artifacts WHERE key IN ({:s})'.format(marks),batch):
+                    found[key] = data
+                self.db.execute('UPDATE artifacts SET atime=? WHERE key IN ({:s})'.format(marks),[now] + batch)
+
+        return found
+
+    def put_many(self,items):
+        """ Stores the artifacts of the dictionary key: data (bytes) and
+        removes the least recently used ones, if the cache is too large
+        """
+        now = time.time()
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO artifacts (key,data,size,atime) VALUES (?,?,?,?)',
+                                [(key,sqlite3.Binary(data),len(data),now) for key,data in items.items()])
+        self.evict()
+
+    def get(self,key):
+        return self.get_many([key]).get(key,None)
+
+    def put(self,key,data):
+        self.put_many({key:data})
+
+    def size(self):
+        return self.db.execute('SELECT COALESCE(SUM(size),0) FROM artifacts').fetchone()[0]
+
+    def evict(self,maxsize=None):
+        """ Removes the least recently used artifacts until the cache is
+        smaller than maxsize (default: the size limit of the cache)
+        """
+        maxsize = self.maxsize if maxsize is None else maxsize
+        excess = self.size() - maxsize
+        if(excess <= 0):
+            return 0
+        remove = []
+        for key,size in self.db.execute('SELECT key,size FROM artifacts ORDER BY atime'):
+            remove.append((key,))
+            excess -= size
+            if(excess <= 0):
+                break
+        with self.db:
+            self.db.executemany('DELETE FROM artifacts WHERE key=?',remove)
+        logger.debug('Removed {:d} artifacts from the cache'.format(len(remove)))
+        return len(remove)
+
+    def clear(self):
+        with self.db:
+            self.db.execute('DELETE FROM artifacts')
+
+    def close(self):
+        self.db.close()
+
+
+def cached_map(cache,kind,version,options,items,func):
+    """ Returns [func(item) for item in items], the results (bytes) are
+    taken from the cache if an item did not change, and only the
+    missing ones are created. If cache is None, all are created
+    """
+    if(cache is None):
+        return [func(item) for item in items]
+    keys = [artifact_key(kind,version,options,item) for item in items]
+    found = cache.get_many(keys)
+    created = {}
+    results = []
+    for key,item in zip(keys,items):
+        data = found.get(key,None)
+        if(data is None):
+            data = created.get(key,None)
+        if(data is None):
+            data = func(item)
+            created[key] = data
+        results.append(data)
+
+    if(len(created) > 0):
+        cache.put_many(created)
+    logger.debug('{:s}: {:d} of {:d} artifacts from the cache'.format(kind,len(items) - len(created),len(items)))
+    return results
+
+
+_cache = None
+def get_cache():
+    """ Returns the artifact cache of mooria, it is opened at the first call
+    """
+    global _cache
+    if(_cache is None):
+        _cache = artifactCache()
+
+    return _cache
+
+
+def set_cache(cache):
+    """ Replaces the artifact cache of mooria, e.g. by a temporary one,
+    returns the previous cache (None if it was not opened yet)
+    """
+    global _cache
+    previous = _cache
+    _cache = cache
+    return previous
@@ -0,0 +1,334 @@
+""" Device catalog tools
+
+The catalog is a dictionary of device names and device dictionaries,
+as read from the yaml files in mooria/devices. Additional catalog
+directories can be given per site and per user with the environment
+variables MOORIA_SITE_DEVICES and MOORIA_USER_DEVICES (several
+directories separated by os.pathsep), the user directory defaults to
+~/.mooria/devices. Devices of the user catalogs override site devices
+which override builtin devices with the same name.
+
+Entries with 'hardware: true' are mooring hardware without measurements
+(floats, releases), they can be added to moorings but are not counted
+as instruments.
+
+"""
+import os
+import re
+import types
+import logging
+import collections.abc
+import yaml
+
+logger = logging.getLogger('mooria.catalog')
+
+# Used to split names, companies and parameters into searchable tokens
+TOKEN_SPLIT = re.compile(r'[^\w]+')
+# Fields describing the catalog entry itself, they are not fields of the devices
+CATALOG_FIELDS = ['hardware']
+
+
+def tokenize(text):
+    """ Splits a text into lower case tokens
+    """
+    return [t for t in TOKEN_SPLIT.split(str(text).lower()) if len(t) > 0]
+
+
+def is_hardware(device_name,devices=None):
+    """ Returns True if the catalog entry of device_name is mooring
+    hardware and not an instrument, devices is the catalog, default the
+    catalog of mooria
+    """
+    if(devices is None):
+        devices = get_catalog().devices
+    device_dict = devices.get(str(device_name),None)
+    return isinstance(device_dict,dict) and (device_dict.get('hardware',False) is True)
+
+
+def instrument_names(devices=None):
+    """ Returns the names of the catalog entries, which are instruments
+    """
+    if(devices is None):
+        devices = get_catalog().devices
+    return [name for name in devices if not is_hardware(name,devices)]
+
+
+def device_tokens(device_name,device_dict):
+    """ Returns the set of tokens a device can be found with, these are
+    the name, the company and the parameters of the device
+    """
+    tokens = set(tokenize(device_name))
+    tokens.add(str(device_name).lower())
+    tokens.update(tokenize(device_dict.get('name','')))
+    tokens.update(tokenize(device_dict.get('company','')))
+    parameter = device_dict.get('parameter',[])
+    if(isinstance(parameter,(list,tuple))):
+        for par in parameter:
+            tokens.update(tokenize(par))
+    if(device_dict.get('hardware',False) is True):
+        tokens.add('hardware')
+
+    return tokens
+
+
+class catalogIndex():
+    """ Inverted index of a device catalog for search as you type
+
+    All prefixes of all tokens are indexed, such that a search is a
+    dictionary lookup per search term and an intersection of the
+    results. Several search terms are combined with AND, e.g. 'nortek u'
+    finds all Nortek devices measuring velocities.
+
+    """
+    def __init__(self,devices=None):
+        self.names   = []
+        self.postings = {}
+        if(devices is not None):
+            self.build(devices)
+
+    def build(self,devices):
+        """ (Re)builds the index for the catalog devices
+        """
+        self.names = list(devices.keys())
+        postings = {}
+        for name in self.names:
+            for token in device_tokens(name,devices[name]):
+                for i in range(1,len(token)+1):
+                    prefix = token[:i]
+                    try:
+                        postings[prefix].add(name)
+                    except KeyError:
+                        postings[prefix] = {name}
+
+        self.postings = postings
+
+    def search(self,query):
+        """ Searches the catalog, returns a set of device names or None if
+        the query is empty and all devices match
+        """
+        terms = tokenize(query)
+        if(len(terms) == 0):
+            return None
+
+        # Start with the rarest term to keep the intersections small
+        sets = [self.postings.get(term,set()) for term in terms]
+        sets.sort(key=len)
+        result = set(sets[0])
+        for s in sets[1:]:
+            if(len(result) == 0):
+                break
+            result &= s
+
+        return result
+
+
+class deviceDict(collections.abc.MutableMapping):
+    """ A device of a mooring, a dictionary referencing the catalog entry
+    of the device as template and storing only the fields set for the
+    device itself (serial number, location, ...)
+
+    The template is shared by all devices of the same type and never
+    changed, setting a field writes to the own fields of the device
+    (copy on write). Deleting a template field hides it.
+
+    """
+    __slots__ = ('template','overrides','deleted')
+
+    def __init__(self,template,overrides=None):
+        if(isinstance(template,deviceDict)):
+            overrides = dict(template.overrides,**(overrides or {}))
+            deleted = set(template.deleted)
+            template = template.template
+        else:
+            deleted = set()
+        self.template  = template if isinstance(template,types.MappingProxyType) else types.MappingProxyType(template)
+        self.overrides = {}
+        self.deleted   = deleted
+        if(overrides is not None):
+            for k,v in overrides.items():
+                self[k] = v
+
+    def __getitem__(self,key):
+        try:
+            return self.overrides[key]
+        except KeyError:
+            if(key in self.deleted):
+                raise
+            return self.template[key]
+
+    def __setitem__(self,key,value):
+        self.deleted.discard(key)
+        # Values equal to the template are not stored twice, numbers of
+        # the template are equal to their string representation in the widgets
+        if((key in self.template) and self._equal(self.template[key],value)):
+            self.overrides.pop(key,None)
+        else:
+            self.overrides[key] = value
+
+    @staticmethod
+    def _equal(tvalue,value):
+        if(isinstance(tvalue,(int,float)) and not isinstance(tvalue,bool) and isinstance(value,str)):
+            return str(tvalue) == value
+        return (type(tvalue) == type(value)) and (tvalue == value)
+
+    def __delitem__(self,key):
+        if(key not in self):
+            raise KeyError(key)
+        self.overrides.pop(key,None)
+        if(key in self.template):
+            self.deleted.add(key)
+
+    def __contains__(self,key):
+        return (key in self.overrides) or ((key in self.template) and (key not in self.deleted))
+
+    def __iter__(self):
+        for k in self.template:
+            if(k not in self.deleted):
+                yield k
+        for k in self.overrides:
+            if(k not in self.template):
+                yield k
+
+    def __len__(self):
+        return sum(1 for k in self)
+
+    def __repr__(self):
+        return 'deviceDict(' + repr(dict(self)) + ')'
+
+    def copy(self):
+        return deviceDict(self)
+
+
+def catalog_directories():
+    """ Returns the list of catalog directories, sorted from lowest
+    (builtin) to highest (user) priority
+    """
+    directories = [os.path.join(os.path.dirname(os.path.abspath(__file__)),'devices')]
+    for env in ['MOORIA_SITE_DEVICES','MOORIA_USER_DEVICES']:
+        paths = os.environ.get(env,None)
+        if((paths is None) and (env == 'MOORIA_USER_DEVICES')):
+            paths = os.path.join(os.path.expanduser('~'),'.mooria','devices')
+        if(paths is None):
+            continue
+        for path in paths.split(os.pathsep):
+            if(len(path) > 0):
+                directories.append(os.path.abspath(os.path.expanduser(path)))
+
+    return directories
+
+
+class deviceCatalog():
+    """ Device catalog merged from the yaml files of several directories
+
+    rescan() checks size and modification time of all files and parses
+    only new or changed files. The merged dictionary self.devices is
+    updated in place, such that references to it stay valid. self.version
+    is increased with every change of self.devices.
+
+    """
+    def __init__(self,directories=None):
+        if(directories is None):
+            directories = catalog_directories()
+        self.directories = directories
+        self.files   = {} # Filename: {'mtime','size','devices'}
+        self.devices = {}
+        self.version = 0
+        self.rescan()
+
+    def list_files(self):
+        """ Returns all yaml files of the catalog directories in the order of their priority
+        """
+        filenames = []
+        for directory in self.directories:
+            try:
+                fnames = sorted(os.listdir(directory))
+            except OSError:
+                continue
+            for fname in fnames:
+                if(fname.endswith('.yaml')):
+                    filenames.append(os.path.join(directory,fname))
+
+        return filenames
+
+    def load_file(self,filename):
+        """ Reads the devices of a catalog yaml file
+        """
+        with open(filename,'r') as f:
+            devtmp = yaml.safe_load(f)
+
+        if(devtmp is None):
+            devtmp = {}
+        if(not isinstance(devtmp,dict)):
+            raise ValueError('Catalog file does not contain a dictionary of devices')
+        # Imported here, validate uses the catalog
+        from .validate import validate_catalog
+        for e in validate_catalog(devtmp):
+            logger.warning('{:s}: invalid catalog entry {:s}: {:s}'.format(filename,e['path'],e['message']))
+
+        return devtmp
+
+    def rescan(self):
+        """ Parses all new and changed catalog files and updates the merged
+        catalog. Returns the set of device names that were added, changed
+        or removed
+        """
+        filenames = self.list_files()
+        changed = set()
+        for filename in filenames:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            old = self.files.get(filename,None)
+            if((old is not None) and (old['mtime'] == st.st_mtime) and (old['size'] == st.st_size)):
+                continue
+            logger.debug('Reading catalog file {:s}'.format(filename))
+            try:
+                devtmp = self.load_file(filename)
+            except Exception as e:
+                # Keep the old content of the file, it might be written at the moment
+                logger.warning('Could not read catalog file {:s}: {:s}'.format(filename,str(e)))
+                continue
+            olddevs = {} if old is None else old['devices']
+            for name in set(olddevs) | set(devtmp):
+                if(olddevs.get(name,None) != devtmp.get(name,None)):
+                    changed.add(name)
+            self.files[filename] = {'mtime':st.st_mtime,'size':st.st_size,'devices':devtmp}
+
+        # Removed files
+        for filename in list(self.files.keys()):
+            if(filename not in filenames):
+                changed.update(self.files.pop(filename)['devices'].keys())
+
+        if(len(changed) > 0):
+            merged = {}
+            for filename in filenames:
+                if(filename in self.files):
+                    merged.update(self.files[filename]['devices'])
+            self.devices.clear()
+            self.devices.update(merged)
+            self.version += 1
+
+        return changed
+
+
+_catalog = None
+def get_catalog():
+    """ Returns the device catalog of mooria, it is read at the first call
+    """
+    global _catalog
+    if(_catalog is None):
+        _catalog = deviceCatalog()
+
+    return _catalog
+
+
+def catalog_version(devices=None):
+    """ Returns the version of the device catalog of mooria if devices is
+    None or its dictionary of devices, otherwise None
+    """
+    if(devices is None):
+        return get_catalog().version
+    if((_catalog is not None) and (devices is _catalog.devices)):
+        return _catalog.version
+    return None
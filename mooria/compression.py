@@ -0,0 +1,66 @@
+""" Compressed mooring files
+
+Files ending with .gz, .xz or .zst are compressed with gzip, xz or
+zstd. They are read and written as streams, a yaml file is parsed
+while it is decompressed. zstd needs the zstandard package, it is only
+imported when a .zst file is opened::
+
+    with open_file('archive.yaml.xz','r') as f:
+        data = yaml.load(f,Loader=SafeLoader)
+
+"""
+import io
+import os
+import gzip
+import lzma
+
+# Extension: compression
+COMPRESSIONS = {'.gz':'gzip','.xz':'xz','.zst':'zstd','.zstd':'zstd'}
+# gzip compresses with level 9 by default, 6 is much faster and almost as small
+GZIP_LEVEL = 6
+
+
+def compression_of(filename):
+    """ Returns the compression of filename by its extension, None if not compressed
+    """
+    return COMPRESSIONS.get(os.path.splitext(str(filename))[1].lower(),None)
+
+
+def strip_compression(filename):
+    """ Returns filename without the extension of the compression, e.g.
+    'archive.yaml' for 'archive.yaml.gz'
+    """
+    if(compression_of(filename) is None):
+        return filename
+    return os.path.splitext(filename)[0]
+
+
+def _open_zstd(filename,mode):
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstd compressed files need the zstandard package (pip install zstandard)')
+    return zstandard.open(filename,mode)
+
+
+def open_file(filename,mode='r',encoding=None,newline=None):
+    """ Opens a file like open(), files with the extension of a
+    compression are decompressed while reading and compressed while
+    writing. Compressed text files are utf-8 if no encoding is given
+    """
+    compression = compression_of(filename)
+    if(compression is None):
+        if('b' in mode):
+            return open(filename,mode)
+        return open(filename,mode,encoding=encoding,newline=newline)
+
+    bmode = mode.replace('t','').replace('b','') + 'b'
+    if(compression == 'gzip'):
+        f = gzip.open(filename,bmode,compresslevel=GZIP_LEVEL)
+    elif(compression == 'xz'):
+        f = lzma.open(filename,bmode)
+    else:
+        f = _open_zstd(filename,bmode)
+    if('b' in mode):
+        return f
+    return io.TextIOWrapper(f,encoding=encoding or 'utf-8',newline=newline)
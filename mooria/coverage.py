@@ -0,0 +1,246 @@
+""" Depth, time and parameter coverage of mooring collections
+
+Counts the instruments measuring a parameter in a depth bin during a
+time bin, using the 'parameter' list and the location of every device
+and the deployment window of its mooring. The result is a matrix of
+shape (depth bins, time bins, parameters), e.g. to plan the moorings
+of a campaign by looking at what was measured where and when before.
+
+"""
+import datetime
+import numpy as np
+
+from .catalog import get_catalog, is_hardware
+from .utils import parse_datetime, parse_float, device_depth
+
+DEPTH_BIN = 100.0
+TIME_BIN  = np.timedelta64(30,'D')
+
+
+def collect_instruments(data,campaign=None,region=None,devices=None):
+    """ Collects the depth, deployment window and parameters of all
+    devices of the moorings of a collection
+
+    Args:
+        data: Mooring dictionary as created by mainWidget.create_mooring_dict()
+        campaign: Use only moorings of this campaign, all if None
+        region: Use only moorings within (lonmin,lonmax,latmin,latmax), all if None
+        devices: Device catalog, its mooring hardware is not used, default the catalog of mooria
+
+    Returns:
+        A dictionary with the arrays 'depth', 'start', 'end' (datetime64)
+        and 'parameter' (index into 'parameters'), one entry per device
+        and parameter, 'instrument' (index of the device the entry
+        belongs to) and the list of 'parameters'. Devices without a
+        depth or moorings without a deployment window are counted in
+        'skipped'
+    """
+    depth   = []
+    start   = []
+    end     = []
+    parind  = []
+    devind  = []
+    parameters = {}
+    if(devices is None):
+        devices = get_catalog().devices
+    skipped = 0
+    ndevices = 0
+    for mooring in data.get('moorings',[]):
+        if((campaign is not None) and (str(mooring.get('campaign','')) != campaign)):
+            continue
+        if(region is not None):
+            lon = parse_float(mooring.get('lon',''))
+            lat = parse_float(mooring.get('lat',''))
+            if((lon is None) or (lat is None)):
+                continue
+            if(not ((region[0] <= lon <= region[1]) and (region[2] <= lat <= region[3]))):
+                continue
+        deployed  = parse_datetime(mooring.get('deployed',''))
+        recovered = parse_datetime(mooring.get('recovered',''))
+        if((deployed is None) or (recovered is None) or (recovered < deployed)):
+            skipped += sum(1 for d in mooring.get('devices',[]) if not is_hardware(d.get('name',''),devices))
+            continue
+        for device in mooring.get('devices',[]):
+            if(is_hardware(device.get('name',''),devices)):
+                continue
+            ddepth,mab = device_depth(device.get('location',''),mooring.get('depth',''))
+            if(ddepth is None):
+                skipped += 1
+                continue
+            for par in device.get('parameter',[]):
+                depth.append(ddepth)
+                start.append(deployed)
+                end.append(recovered)
+                parind.append(parameters.setdefault(par,len(parameters)))
+                devind.append(ndevices)
+            ndevices += 1
+
+    instruments = {}
+    instruments['depth']      = np.array(depth,dtype=float)
+    instruments['start']      = np.array(start,dtype='datetime64[s]')
+    instruments['end']        = np.array(end,dtype='datetime64[s]')
+    instruments['parameter']  = np.array(parind,dtype=np.int64)
+    instruments['instrument'] = np.array(devind,dtype=np.int64)
+    instruments['parameters'] = list(parameters.keys())
+    instruments['skipped']    = skipped
+    return instruments
+
+
+def make_depth_edges(depth,dz=DEPTH_BIN):
+    """ Returns depth bin edges of width dz from the surface down to the deepest value
+    """
+    dmax = depth.max() if len(depth) > 0 else dz
+    return np.arange(0,np.floor(dmax/dz) * dz + 2 * dz,dz)
+
+
+def make_time_edges(start,end,dt=TIME_BIN):
+    """ Returns time bin edges of width dt covering all deployments,
+    starting at midnight before the first deployment
+    """
+    if(len(start) == 0):
+        t0 = np.datetime64(datetime.date.today(),'D').astype('datetime64[s]')
+        return np.array([t0,t0 + dt]).astype('datetime64[s]')
+    t0 = start.min().astype('datetime64[D]').astype('datetime64[s]')
+    t1 = end.max()
+    dt = np.timedelta64(dt).astype('timedelta64[s]')
+    n = int(np.ceil((t1 - t0)/dt))
+    return t0 + dt * np.arange(max(n,1) + 1)
+
+
+def coverage_matrix(instruments,depth_edges=None,time_edges=None,parameters=None,dz=DEPTH_BIN,dt=TIME_BIN):
+    """ Counts the instruments of collect_instruments() in depth and time bins
+
+    An instrument is counted in every time bin its deployment overlaps
+    with. The counting uses a difference array along the time axis,
+    such that the work does not depend on the length of the deployments.
+
+    Args:
+        instruments: Result of collect_instruments()
+        depth_edges: Depth bin edges, bins of width dz if None
+        time_edges: Time bin edges (datetime64), bins of width dt if None
+        parameters: The parameters of the last axis, all if None
+
+    Returns:
+        A dictionary with the 'counts' of shape (ndepth,ntime,nparameters),
+        the number of 'instruments' of shape (ndepth,ntime) measuring any
+        of the parameters, the 'depth_edges', the 'time_edges' and the
+        'parameters'
+    """
+    depth = instruments['depth']
+    start = instruments['start']
+    end   = instruments['end']
+    if(depth_edges is None):
+        depth_edges = make_depth_edges(depth,dz)
+    if(time_edges is None):
+        time_edges = make_time_edges(start,end,dt)
+    depth_edges = np.asarray(depth_edges,dtype=float)
+    time_edges  = np.asarray(time_edges).astype('datetime64[s]')
+    if(parameters is None):
+        parameters = list(instruments['parameters'])
+    # Map the parameter indices of the instruments onto the requested parameters
+    parmap = np.array([parameters.index(p) if p in parameters else -1 for p in instruments['parameters']],dtype=np.int64)
+    par = parmap[instruments['parameter']] if len(parmap) > 0 else np.zeros(0,dtype=np.int64)
+
+    ndepth = len(depth_edges) - 1
+    ntime  = len(time_edges) - 1
+    npar   = len(parameters)
+    di = np.searchsorted(depth_edges,depth,side='right') - 1
+    # First and last time bin overlapping with [start,end)
+    ts = np.searchsorted(time_edges,start,side='right') - 1
+    te = np.searchsorted(time_edges,end,side='left') - 1
+    ts = np.maximum(ts,0)
+    te = np.minimum(te,ntime - 1)
+    valid = (par >= 0) & (di >= 0) & (di < ndepth) & (ts <= te) & (end > start)
+    diff = np.zeros((ndepth,ntime + 1,npar),dtype=np.int32)
+    np.add.at(diff,(di[valid],ts[valid],par[valid]),1)
+    np.add.at(diff,(di[valid],te[valid] + 1,par[valid]),-1)
+    # Every instrument once, with the first of its entries
+    if('instrument' in instruments):
+        first = np.unique(instruments['instrument'][valid],return_index=True)[1]
+    else:
+        first = np.arange(np.sum(valid))
+    di,ts,te = di[valid][first],ts[valid][first],te[valid][first]
+    idiff = np.zeros((ndepth,ntime + 1),dtype=np.int32)
+    np.add.at(idiff,(di,ts),1)
+    np.add.at(idiff,(di,te + 1),-1)
+    result = {}
+    result['counts']      = np.cumsum(diff,axis=1)[:,:-1,:]
+    result['instruments'] = np.cumsum(idiff,axis=1)[:,:-1]
+    result['depth_edges'] = depth_edges
+    result['time_edges']  = time_edges
+    result['parameters']  = list(parameters)
+    return result
+
+
+def campaign_coverage(data,dz=DEPTH_BIN,dt=TIME_BIN,region=None,devices=None):
+    """ Computes the coverage matrix of every campaign of a collection,
+    all campaigns share the same bins and parameters
+
+    Returns:
+        A dictionary of campaign: result of coverage_matrix()
+    """
+    campaigns = {}
+    for mooring in data.get('moorings',[]):
+        campaigns.setdefault(str(mooring.get('campaign','')),[]).append(mooring)
+    instruments = {c:collect_instruments({'moorings':m},region=region,devices=devices) for c,m in campaigns.items()}
+    depth = np.concatenate([inst['depth'] for inst in instruments.values()] + [np.zeros(0)])
+    start = np.concatenate([inst['start'] for inst in instruments.values()] + [np.zeros(0,dtype='datetime64[s]')])
+    end   = np.concatenate([inst['end'] for inst in instruments.values()] + [np.zeros(0,dtype='datetime64[s]')])
+    parameters = []
+    for inst in instruments.values():
+        parameters += [p for p in inst['parameters'] if p not in parameters]
+    dedges = make_depth_edges(depth,dz)
+    tedges = make_time_edges(start,end,dt)
+    results = {}
+    for campaign in sorted(instruments):
+        results[campaign] = coverage_matrix(instruments[campaign],dedges,tedges,parameters)
+
+    return results
+
+
+def save_coverage(filename,result):
+    """ Saves the result of coverage_matrix() as compressed numpy file
+    """
+    np.savez_compressed(filename,counts=result['counts'],instruments=result['instruments'],depth_edges=result['depth_edges'],
+                        time_edges=result['time_edges'].astype(np.int64),
+                        parameters=np.array(result['parameters'],dtype=str))
+
+
+def load_coverage(filename):
+    """ Loads a coverage matrix saved with save_coverage()
+    """
+    with np.load(filename) as f:
+        result = {}
+        result['counts']      = f['counts']
+        result['instruments'] = f['instruments']
+        result['depth_edges'] = f['depth_edges']
+        result['time_edges']  = f['time_edges'].astype('datetime64[s]')
+        result['parameters']  = [str(p) for p in f['parameters']]
+
+    return result
+
+
+def plot_coverage(result,parameter=None,fig=None):
+    """ Plots the number of instruments over time and depth as heatmap
+    into the matplotlib figure fig, for one parameter or of all
+    parameters if parameter is None, returns the figure
+    """
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+    if(fig is None):
+        fig = Figure()
+    ax = fig.add_subplot(111)
+    if(parameter is None):
+        counts = result['instruments']
+        title = 'All parameters'
+    else:
+        counts = result['counts'][:,:,result['parameters'].index(parameter)]
+        title = parameter
+    t = mdates.date2num(result['time_edges'].astype('O'))
+    pc = ax.pcolormesh(t,result['depth_edges'],np.ma.masked_equal(counts,0),cmap='viridis')
+    fig.colorbar(pc,ax=ax,label='Number of instruments')
+    ax.set_ylim(result['depth_edges'][-1],result['depth_edges'][0])
+    ax.xaxis_date()
+    ax.set_ylabel('Depth [m]')
+    ax.set_title(title)
+    return fig
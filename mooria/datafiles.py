@@ -0,0 +1,223 @@
+""" Scanner for the raw and processed data files of the devices
+
+The 'raw_data' and 'processed_data' fields of a device contain one or
+several filenames (separated by ';', wildcards are allowed), relative
+filenames are resolved relative to a base directory, e.g. the
+directory of the mooring file. The files are checksummed (sha256) in
+a thread pool with memory mapped, chunked reads. Size, modification
+time and checksum are cached, unchanged files are not read again on
+later scans.
+
+"""
+import os
+import glob
+import json
+import mmap
+import hashlib
+import logging
+import concurrent.futures
+
+logger = logging.getLogger('mooria.datafiles')
+
+# The device fields with data files
+DATA_FIELDS = ['raw_data','processed_data']
+# Size of the chunks handed to the hash function
+CHUNKSIZE = 16 * 1024 * 1024
+
+
+def default_cache_filename():
+    return os.path.join(os.path.expanduser('~'),'.mooria','datacache.json')
+
+
+def split_paths(text):
+    """ Splits the content of a data field into single filenames
+    """
+    paths = []
+    for p in str(text).replace('\n',';').split(';'):
+        p = p.strip()
+        if(len(p) > 0):
+            paths.append(p)
+
+    return paths
+
+
+def resolve_paths(text,basedir=None):
+    """ Returns the absolute filenames of a data field, wildcards are
+    expanded, patterns without matches are returned unchanged
+    """
+    if(basedir is None):
+        basedir = os.getcwd()
+    filenames = []
+    for p in split_paths(text):
+        p = os.path.expanduser(p)
+        if(not os.path.isabs(p)):
+            p = os.path.join(basedir,p)
+        p = os.path.normpath(p)
+        if(glob.has_magic(p)):
+            matches = sorted(glob.glob(p))
+            if(len(matches) > 0):
+                filenames.extend(matches)
+                continue
+        filenames.append(p)
+
+    return filenames
+
+
+def hash_file(filename,chunksize=CHUNKSIZE):
+    """ Returns the sha256 checksum of a file, the file is memory mapped
+    and hashed in chunks
+    """
+    h = hashlib.sha256()
+    with open(filename,'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if(size == 0):
+            return h.hexdigest()
+        try:
+            mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        except (ValueError,OSError): # Not mappable, e.g. special files
+            for chunk in iter(lambda: f.read(chunksize),b''):
+                h.update(chunk)
+            return h.hexdigest()
+        with mm:
+            view = memoryview(mm)
+            try:
+                for i in range(0,size,chunksize):
+                    h.update(view[i:i+chunksize])
+            finally:
+                view.release()
+
+    return h.hexdigest()
+
+
+class dataCache():
+    """ Cache of size, modification time and checksum of data files,
+    stored as json
+    """
+    def __init__(self,filename=None):
+        if(filename is None):
+            filename = default_cache_filename()
+        self.filename = filename
+        self.entries = {}
+        self.changed = False
+        try:
+            with open(filename,'r') as f:
+                self.entries = json.load(f)
+        except (OSError,ValueError):
+            pass
+
+    def lookup(self,filename,st):
+        """ Returns the cached entry of filename if size and modification
+        time are unchanged, otherwise None
+        """
+        entry = self.entries.get(filename,None)
+        if((entry is not None) and (entry['size'] == st.st_size) and (entry['mtime'] == st.st_mtime)):
+            return entry
+        return None
+
+    def update(self,filename,entry):
+        self.entries[filename] = entry
+        self.changed = True
+
+    def save(self):
+        if(not self.changed):
+            return
+        directory = os.path.dirname(self.filename)
+        if(len(directory) > 0):
+            os.makedirs(directory,exist_ok=True)
+        tmpname = self.filename + '.tmp'
+        with open(tmpname,'w') as f:
+            json.dump(self.entries,f)
+        os.replace(tmpname,self.filename)
+        self.changed = False
+
+
+def scan_files(filenames,cache=None,nthreads=4):
+    """ Checks and checksums files, files with unchanged size and
+    modification time are taken from the cache
+
+    Returns:
+        A dictionary of filename: {'exists','size','mtime','sha256'}
+    """
+    results = {}
+    tohash = []
+    for filename in set(filenames):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            results[filename] = {'exists':False,'size':None,'mtime':None,'sha256':None}
+            continue
+        if(not os.path.isfile(filename)):
+            results[filename] = {'exists':False,'size':None,'mtime':None,'sha256':None}
+            continue
+        entry = None if cache is None else cache.lookup(filename,st)
+        if(entry is not None):
+            results[filename] = dict(entry,exists=True)
+        else:
+            tohash.append((filename,st))
+
+    def hash_entry(args):
+        filename,st = args
+        return filename,{'size':st.st_size,'mtime':st.st_mtime,'sha256':hash_file(filename)}
+
+    if(len(tohash) > 0):
+        logger.debug('Hashing {:d} files'.format(len(tohash)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=nthreads) as executor:
+            for filename,entry in executor.map(hash_entry,tohash):
+                if(cache is not None):
+                    cache.update(filename,entry)
+                results[filename] = dict(entry,exists=True)
+
+    return results
+
+
+def data_status(data,basedir=None,cache=None,nthreads=4):
+    """ Checks the data files of all devices of a mooring collection
+
+    Returns:
+        A list with one dictionary per mooring, with the 'name', the
+        number of 'devices', the number of devices with all raw and
+        processed files existing ('raw','processed'), the list of
+        'missing' files, the 'files' with their scan results and a short
+        'summary' string
+    """
+    # Collect all files first, such that they are hashed together
+    filenames = []
+    resolved = []
+    for mooring in data.get('moorings',[]):
+        mres = []
+        for device in mooring.get('devices',[]):
+            dres = {}
+            for field in DATA_FIELDS:
+                dres[field] = resolve_paths(device.get(field,''),basedir)
+                filenames.extend(dres[field])
+            mres.append(dres)
+        resolved.append(mres)
+
+    scanned = scan_files(filenames,cache,nthreads)
+    status = []
+    for mooring,mres in zip(data.get('moorings',[]),resolved):
+        mstatus = {'name':mooring.get('name',''),'devices':len(mres),'missing':[],'files':{}}
+        for field in DATA_FIELDS:
+            n = 0
+            for dres in mres:
+                files = dres[field]
+                ok = len(files) > 0
+                for f in files:
+                    mstatus['files'][f] = scanned[f]
+                    if(not scanned[f]['exists']):
+                        ok = False
+                        mstatus['missing'].append(f)
+                if(ok):
+                    n += 1
+            mstatus[field.split('_')[0]] = n
+
+        mstatus['summary'] = 'raw {:d}/{:d}, processed {:d}/{:d}'.format(mstatus['raw'],mstatus['devices'],
+                                                                          mstatus['processed'],mstatus['devices'])
+        if(len(mstatus['missing']) > 0):
+            mstatus['summary'] += ', {:d} missing'.format(len(mstatus['missing']))
+        status.append(mstatus)
+
+    if(cache is not None):
+        cache.save()
+
+    return status
@@ -0,0 +1,328 @@
+""" Diff and merge of mooring collections
+
+Works on dictionaries as created by mainWidget.create_mooring_dict().
+Moorings are identified by their name and deployment date, devices
+within a mooring by their name and serial number. Every mooring and
+device is hashed by its content, such that unchanged moorings are
+skipped without comparing them field by field and collections are
+compared in linear time::
+
+    mooria-diff shore.yaml ship.yaml
+    mooria-diff --base common.yaml shore.yaml ship.yaml -o merged.yaml
+
+"""
+import sys
+import json
+import hashlib
+import argparse
+import yaml
+
+from .compression import open_file
+from .jsonformat import is_json_file, read_json_file, export_json, migrate
+
+# Use the fast libyaml loader if available
+SafeLoader = getattr(yaml,'CSafeLoader',yaml.SafeLoader)
+
+
+def hash_dict(d):
+    """ Returns a content hash of a (mooring or device) dictionary
+    """
+    s = json.dumps(d,sort_keys=True,default=str,separators=(',',':'))
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+
+def mooring_key(mooring):
+    return (str(mooring.get('name','')),str(mooring.get('deployed','')))
+
+
+def device_key(device):
+    return (str(device.get('name','')),str(device.get('Serial Number','')))
+
+
+def key_to_str(key):
+    """ Human readable form of a mooring or device key
+    """
+    name,second,n = key
+    s = name
+    if(second != ''):
+        s += ' (' + second + ')'
+    if(n > 0):
+        s += ' #{:d}'.format(n + 1)
+    return s
+
+
+def index_items(items,keyfunc):
+    """ Returns a dictionary of key: (hash,item) for a list of moorings or
+    devices, the key is made unique by counting identical keys
+    """
+    index = {}
+    counts = {}
+    for item in items:
+        k = keyfunc(item)
+        n = counts.get(k,0)
+        counts[k] = n + 1
+        index[k + (n,)] = (hash_dict(item),item)
+
+    return index
+
+
+def diff_fields(old,new,exclude=('devices',)):
+    """ Returns a dictionary of field: (old,new) of all fields that differ,
+    missing fields are given as None
+    """
+    fields = {}
+    for k in list(old.keys()) + [k for k in new.keys() if k not in old]:
+        if(k in exclude):
+            continue
+        vold = old.get(k,None)
+        vnew = new.get(k,None)
+        if(vold != vnew):
+            fields[k] = (vold,vnew)
+
+    return fields
+
+
+def diff_devices(old,new):
+    """ Compares two lists of devices
+    """
+    iold = index_items(old,device_key)
+    inew = index_items(new,device_key)
+    result = {'added':[],'removed':[],'changed':[]}
+    for k in inew:
+        if(k not in iold):
+            result['added'].append(k)
+    for k in iold:
+        if(k not in inew):
+            result['removed'].append(k)
+        elif(iold[k][0] != inew[k][0]):
+            result['changed'].append({'key':k,'fields':diff_fields(iold[k][1],inew[k][1],exclude=())})
+
+    return result
+
+
+def diff_moorings(old,new):
+    """ Compares two mooring collections
+
+    Returns:
+        A dictionary with the lists 'added', 'removed' (mooring keys) and
+        'changed' (dictionaries with the mooring 'key', the changed
+        'fields' as field: (old,new) and the 'devices' diff) and the
+        number of 'unchanged' moorings
+    """
+    iold = index_items(old.get('moorings',[]),mooring_key)
+    inew = index_items(new.get('moorings',[]),mooring_key)
+    result = {'added':[],'removed':[],'changed':[],'unchanged':0}
+    for k in inew:
+        if(k not in iold):
+            result['added'].append(k)
+    for k in iold:
+        if(k not in inew):
+            result['removed'].append(k)
+        elif(iold[k][0] == inew[k][0]):
+            result['unchanged'] += 1
+        else:
+            mold = iold[k][1]
+            mnew = inew[k][1]
+            change = {}
+            change['key']     = k
+            change['fields']  = diff_fields(mold,mnew)
+            change['devices'] = diff_devices(mold.get('devices',[]),mnew.get('devices',[]))
+            result['changed'].append(change)
+
+    return result
+
+
+def merge_fields(base,ours,theirs,conflicts,context,exclude=('devices',)):
+    """ Three way merge of the fields of a mooring or device, conflicting
+    fields keep our value and are appended to conflicts
+    """
+    merged = {}
+    keys = list(ours.keys()) + [k for k in theirs.keys() if k not in ours]
+    keys += [k for k in base.keys() if (k not in ours) and (k not in theirs)]
+    missing = object()
+    for k in keys:
+        if(k in exclude):
+            continue
+        b = base.get(k,missing)
+        o = ours.get(k,missing)
+        t = theirs.get(k,missing)
+        if(o == t):
+            v = o
+        elif(o == b):
+            v = t
+        elif(t == b):
+            v = o
+        else:
+            v = o
+            conflict = dict(context)
+            conflict['field']  = k
+            conflict['base']   = None if b is missing else b
+            conflict['ours']   = None if o is missing else o
+            conflict['theirs'] = None if t is missing else t
+            conflicts.append(conflict)
+        if(v is not missing):
+            merged[k] = v
+
+    return merged
+
+
+def merge_items(base,ours,theirs,keyfunc,merge_item,conflicts,context):
+    """ Three way merge of lists of moorings or devices
+
+    Items changed on one side only are taken from that side, items
+    added on one side are added, items removed on one side and
+    unchanged on the other side are removed. Items removed on one side
+    and changed on the other side are kept and reported as conflict.
+    """
+    ibase   = index_items(base,keyfunc)
+    iours   = index_items(ours,keyfunc)
+    itheirs = index_items(theirs,keyfunc)
+    merged  = []
+    # Our order first, then the items only existing at their side
+    keys = list(iours.keys()) + [k for k in itheirs.keys() if k not in iours]
+    for k in keys:
+        b = ibase.get(k,None)
+        o = iours.get(k,None)
+        t = itheirs.get(k,None)
+        ctx = dict(context)
+        ctx[context['level']] = k
+        if((o is not None) and (t is not None)):
+            if(o[0] == t[0]):
+                merged.append(o[1])
+            elif((b is not None) and (o[0] == b[0])):
+                merged.append(t[1])
+            elif((b is not None) and (t[0] == b[0])):
+                merged.append(o[1])
+            else:
+                merged.append(merge_item({} if b is None else b[1],o[1],t[1],conflicts,ctx))
+        elif(o is not None): # Not at their side
+            if(b is None): # Added by us
+                merged.append(o[1])
+            elif(b[0] != o[0]): # Removed by them, changed by us
+                merged.append(o[1])
+                ctx['field'] = None
+                ctx['message'] = 'removed by theirs, changed by ours'
+                conflicts.append(ctx)
+        else: # Not at our side
+            if(b is None): # Added by them
+                merged.append(t[1])
+            elif(b[0] != t[0]): # Removed by us, changed by them
+                merged.append(t[1])
+                ctx['field'] = None
+                ctx['message'] = 'removed by ours, changed by theirs'
+                conflicts.append(ctx)
+
+    return merged
+
+
+def merge_device(base,ours,theirs,conflicts,context):
+    return merge_fields(base,ours,theirs,conflicts,context,exclude=())
+
+
+def merge_mooring(base,ours,theirs,conflicts,context):
+    merged = merge_fields(base,ours,theirs,conflicts,context)
+    if(any(('devices' in m) for m in (base,ours,theirs))):
+        ctx = dict(context)
+        ctx['level'] = 'device'
+        merged['devices'] = merge_items(base.get('devices',[]),ours.get('devices',[]),theirs.get('devices',[]),
+                                        device_key,merge_device,conflicts,ctx)
+    return merged
+
+
+def merge_moorings(base,ours,theirs):
+    """ Three way merge of mooring collections
+
+    Args:
+        base: The common ancestor of ours and theirs
+        ours: Our collection, its values are kept in case of conflicts
+        theirs: Their collection
+
+    Returns:
+        The merged collection and a list of conflicts, every conflict is a
+        dictionary with the 'mooring' and 'device' keys, the 'field' and
+        the values of 'base', 'ours' and 'theirs'
+    """
+    conflicts = []
+    context = {'level':'mooring','mooring':None,'device':None}
+    merged = {}
+    merged['moorings'] = merge_items(base.get('moorings',[]),ours.get('moorings',[]),theirs.get('moorings',[]),
+                                     mooring_key,merge_mooring,conflicts,context)
+    for c in conflicts:
+        c.pop('level',None)
+    return merged,conflicts
+
+
+def print_diff(result):
+    """ Prints the result of diff_moorings
+    """
+    for k in result['added']:
+        print('+ mooring',key_to_str(k))
+    for k in result['removed']:
+        print('- mooring',key_to_str(k))
+    for change in result['changed']:
+        print('~ mooring',key_to_str(change['key']))
+        for f,(vold,vnew) in change['fields'].items():
+            print('    {:s}: {:s} -> {:s}'.format(f,repr(vold),repr(vnew)))
+        devices = change['devices']
+        for k in devices['added']:
+            print('    + device',key_to_str(k))
+        for k in devices['removed']:
+            print('    - device',key_to_str(k))
+        for dchange in devices['changed']:
+            print('    ~ device',key_to_str(dchange['key']))
+            for f,(vold,vnew) in dchange['fields'].items():
+                print('        {:s}: {:s} -> {:s}'.format(f,repr(vold),repr(vnew)))
+
+    print('{:d} added, {:d} removed, {:d} changed, {:d} unchanged moorings'.format(
+        len(result['added']),len(result['removed']),len(result['changed']),result['unchanged']))
+
+
+def read_yaml(filename):
+    """ Reads a yaml or JSON mooring file, both migrated to the current
+    format version, such that they can be compared
+    """
+    if(is_json_file(filename)):
+        return read_json_file(filename)
+    with open_file(filename,'r') as f:
+        data = yaml.load(f,Loader=SafeLoader)
+    if(isinstance(data,dict)):
+        data = migrate(data)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares or merges mooring files')
+    parser.add_argument('files',nargs=2,metavar=('OURS','THEIRS'),help='The mooring files to compare')
+    parser.add_argument('--base',default=None,help='Common ancestor, merges OURS and THEIRS')
+    parser.add_argument('-o','--output',default=None,help='File for the merged moorings')
+    args = parser.parse_args()
+    ours   = read_yaml(args.files[0])
+    theirs = read_yaml(args.files[1])
+    if(args.base is None):
+        print_diff(diff_moorings(ours,theirs))
+        return
+
+    merged,conflicts = merge_moorings(read_yaml(args.base),ours,theirs)
+    for c in conflicts:
+        where = key_to_str(c['mooring'])
+        if(c['device'] is not None):
+            where += ' / ' + key_to_str(c['device'])
+        if(c['field'] is None):
+            print('Conflict {:s}: {:s}'.format(where,c['message']))
+        else:
+            print('Conflict {:s} field {:s}: base {:s}, ours {:s}, theirs {:s}'.format(
+                where,c['field'],repr(c['base']),repr(c['ours']),repr(c['theirs'])))
+
+    print('{:d} conflicts, our values are kept'.format(len(conflicts)))
+    if(args.output is not None):
+        if(is_json_file(args.output)):
+            export_json(merged,args.output)
+        else:
+            with open_file(args.output,'w') as outfile:
+                yaml.dump(merged,outfile,default_flow_style=False)
+
+    sys.exit(1 if len(conflicts) > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+""" Exports of mooring collections
+
+Writes the moorings of a collection as yaml, JSON, GeoJSON, csv and as
+plots.
+The yaml fragments and the plots are expensive to create, they are
+created for every mooring on its own and kept in the artifact cache
+(see cache.py) under the content hash of the mooring, the exporter
+version and its options. Exporting a collection again only creates the
+moorings that changed. GeoJSON and csv rows are cheaper to create than
+to look up and are always written directly::
+
+    mooria-export archive/ --yaml archive.yaml --geojson archive.geojson --csv archive.csv --plots plots/
+
+The versions have to be increased if the output of an exporter changes.
+
+"""
+import io
+import os
+import sys
+import argparse
+import yaml
+
+from .cache import get_cache, cached_map
+from .fileio import read_mooring_files, mooring_filename
+from .compression import open_file
+from .jsonformat import export_json
+
+YAML_VERSION    = 1
+PLOT_VERSION    = 1
+# Reference coordinate system of the GeoJSON export
+CRS = { "type": "name", "properties": { "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } }
+# Columns of the csv export and the mooring fields
+CSV_HEADER = ['Name','Depth','Longitude','Latitude','Deployed','Recovered','Data']
+CSV_FIELDS = {'Name':'name','Long term series':'longtermseries','Depth':'depth','Deployed':'deployed',
+              'Recovered':'recovered','Longitude':'lon','Latitude':'lat','Campaign':'campaign',
+              'Comment':'comment','Data':'data'}
+
+
+def yaml_fragment(mooring):
+    """ The mooring as item of the moorings list of a yaml file
+    """
+    s = yaml.dump({'moorings':[mooring]},default_flow_style=False)
+    return s[s.index('\n') + 1:].encode('utf-8')
+
+
+def export_yaml(data,filename,cache=None):
+    """ Writes the collection data into the yaml file filename, the same
+    as yaml.dump(data) if data has only moorings
+    """
+    if(set(data.keys()) != {'moorings'}):
+        with open_file(filename,'w') as f:
+            yaml.dump(data,f,default_flow_style=False)
+        return
+    fragments = cached_map(cache,'yaml',YAML_VERSION,{},data['moorings'],yaml_fragment)
+    with open_file(filename,'wb') as f:
+        if(len(fragments) == 0):
+            f.write(b'moorings: []\n')
+            return
+        f.write(b'moorings:\n')
+        for fragment in fragments:
+            f.write(fragment)
+
+
+def geojson_feature(mooring,properties):
+    """ The mooring as GeoJSON point feature with the given properties,
+    empty if it has no valid position
+    """
+    import geojson
+    try:
+        lon = float(mooring['lon'])
+        lat = float(mooring['lat'])
+    except Exception as e:
+        return b''
+    p = geojson.Point((lon, lat))
+    prop = {}
+    for o in properties:
+        prop[o] = mooring[o]
+
+    return geojson.dumps(geojson.Feature(geometry=p, properties=prop)).encode('utf-8')
+
+
+def export_geojson(data,filename):
+    """ Writes the moorings of the collection data as GeoJSON feature
+    collection, with the fields of the first mooring as properties.
+    Moorings without a valid position are skipped
+    """
+    import geojson
+    moorings = data['moorings']
+    if(len(moorings) == 0):
+        return
+    properties = list(moorings[0].keys())
+    features = [geojson_feature(mooring,properties) for mooring in moorings]
+    for mooring,feature in zip(moorings,features):
+        if(len(feature) == 0):
+            print('No valid positions in mooring:' + str(mooring['name']) +  ' will not export it.' )
+    # The features are put into an empty collection, geojson.dump() writes the same
+    head = geojson.dumps(geojson.FeatureCollection([],name='moorings',crs=CRS))
+    head,tail = head.rsplit('[]',1)
+    with open_file(filename,'wb') as f:
+        f.write(head.encode('utf-8') + b'[')
+        f.write(b', '.join(feature for feature in features if len(feature) > 0))
+        f.write(b']' + tail.encode('utf-8'))
+
+
+def csv_rows(data,header=CSV_HEADER):
+    """ Returns the moorings of the collection data as rows of strings
+    formatted as in the moorings table
+    """
+    rows = []
+    for mooring in data['moorings']:
+        row = []
+        for head in header:
+            value = mooring.get(CSV_FIELDS.get(head,head),'')
+            if((head in ('Longitude','Latitude')) and (value != '')):
+                try:
+                    value = '{:3.5f}'.format(float(value))
+                except (TypeError,ValueError):
+                    pass
+            row.append(str(value))
+        rows.append(row)
+
+    return rows
+
+
+def export_csv(rows,filename,delimiter=';',header=CSV_HEADER):
+    """ Writes the rows (lists of strings) as csv file
+    """
+    with open_file(filename,'w',encoding='utf-8') as f:
+        f.write(delimiter.join(header) + '\n')
+        for row in rows:
+            f.write(delimiter.join(row) + '\n')
+
+
+def plot_png(mooring,dpi=100):
+    """ Plots the mooring into a png image
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from .mooringplot import mooringPlot
+    fig = Figure(dpi=dpi)
+    fig.set_size_inches(6,8)
+    canvas = FigureCanvasAgg(fig)
+    plot = mooringPlot(fig,animated=False)
+    plot.update(mooring)
+    plot.ax.set_title(str(mooring.get('name','')))
+    buf = io.BytesIO()
+    canvas.print_png(buf)
+    return buf.getvalue()
+
+
+def export_plots(data,directory,dpi=100,cache=None):
+    """ Writes a png plot of every mooring of the collection data into
+    directory, returns the filenames
+    """
+    os.makedirs(directory,exist_ok=True)
+    moorings = data['moorings']
+    images = cached_map(cache,'plot',PLOT_VERSION,{'dpi':dpi},moorings,lambda mooring: plot_png(mooring,dpi))
+    filenames = []
+    for mooring,image in zip(moorings,images):
+        filename = os.path.join(directory,mooring_filename(mooring,'.png'))
+        with open(filename,'wb') as f:
+            f.write(image)
+        filenames.append(filename)
+
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exports mooring files and directories, unchanged moorings are taken from the cache')
+    parser.add_argument('paths',nargs='+',help='Mooring files or directories')
+    parser.add_argument('--yaml',help='Write all moorings into this yaml file')
+    parser.add_argument('--json',help='Write all moorings into this versioned JSON file')
+    parser.add_argument('--compact',action='store_true',help='Compact JSON without whitespace')
+    parser.add_argument('--geojson',help='Write the positions of the moorings into this GeoJSON file')
+    parser.add_argument('--csv',help='Write a summary of the moorings into this csv file')
+    parser.add_argument('--plots',help='Write a plot of every mooring into this directory')
+    parser.add_argument('--dpi',type=int,default=100,help='Resolution of the plots')
+    parser.add_argument('--no-cache',action='store_true',help='Create everything without the cache')
+    args = parser.parse_args()
+    data,report = read_mooring_files(args.paths)
+    for filename,err in report['errors'].items():
+        print('{:s}: could not read file: {:s}'.format(filename,err))
+    cache = None if args.no_cache else get_cache()
+    if(args.yaml is not None):
+        export_yaml(data,args.yaml,cache=cache)
+    if(args.json is not None):
+        export_json(data,args.json,compact=args.compact)
+    if(args.geojson is not None):
+        # Only the metainformation, not the devices of the moorings
+        export_geojson({'moorings':[{k:v for k,v in m.items() if k != 'devices'} for m in data['moorings']]},args.geojson)
+    if(args.csv is not None):
+        export_csv(csv_rows(data),args.csv)
+    if(args.plots is not None):
+        export_plots(data,args.plots,dpi=args.dpi,cache=cache)
+    print('{:d} moorings exported'.format(len(data['moorings'])))
+    sys.exit(1 if len(report['errors']) > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
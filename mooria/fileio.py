@@ -0,0 +1,220 @@
+""" Reading of mooring files
+
+Reads yaml and JSON mooring files (see jsonformat.py), many at once with
+a pool of processes, and merges them into one collection. A mooring is identified by its name, position
+and deployment date. Every mooring is hashed by its identity and by its
+content, such that duplicates are found with one dictionary lookup per
+mooring instead of comparing all moorings pairwise::
+
+    mooria-import cruise1/ cruise2/ station_archive.yaml.gz -o archive.yaml.xz
+
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+import concurrent.futures
+import yaml
+
+from .utils import parse_datetime, parse_float
+from .compression import open_file
+from .jsonformat import is_json_file, read_json_file, export_json, migrate
+from .validate import list_mooring_files, normalize_mooring_dict
+from .diff import hash_dict
+
+logger = logging.getLogger('mooria.fileio')
+
+# Use the fast libyaml loader if available
+SafeLoader = getattr(yaml,'CSafeLoader',yaml.SafeLoader)
+# Decimals of the position, which identify a mooring (4 decimals are about 10 m)
+POSITION_DECIMALS = 4
+
+
+def read_mooring_file(filename):
+    """ Reads a yaml or JSON mooring file and migrates it to the current
+    format version, raises ValueError if it has no moorings
+    """
+    if(is_json_file(filename)):
+        data = read_json_file(filename)
+    else:
+        with open_file(filename,'r') as f:
+            data = yaml.load(f,Loader=SafeLoader)
+    if(not isinstance(data,dict) or not isinstance(data.get('moorings',None),list)):
+        raise ValueError('no moorings')
+    return migrate(data)
+
+
+def write_mooring_file(data,filename,compact=False):
+    """ Writes the mooring data as JSON file if filename ends with
+    .json, otherwise as yaml file. compact is the compact JSON without
+    whitespace
+    """
+    if(is_json_file(filename)):
+        export_json(data,filename,compact)
+        return
+    with open_file(filename,'w') as f:
+        yaml.dump({k:v for k,v in data.items() if k not in ('format','version')},f,default_flow_style=False)
+
+
+def iter_moorings(paths):
+    """ Yields the moorings of the mooring files and directories in
+    paths, only one file is held in memory. Unreadable files are skipped
+    """
+    if(isinstance(paths,str)):
+        paths = [paths]
+    for path in paths:
+        for filename in list_mooring_files(path):
+            try:
+                data = normalize_mooring_dict(read_mooring_file(filename))
+            except Exception as e:
+                logger.warning('{:s}: could not read file: {:s}'.format(filename,str(e)))
+                continue
+            for mooring in data['moorings']:
+                if(isinstance(mooring,dict)):
+                    yield mooring
+
+
+def mooring_identity(mooring):
+    """ Returns the hash of name, position and deployment date of a mooring
+    """
+    lon = parse_float(mooring.get('lon',''))
+    lat = parse_float(mooring.get('lat',''))
+    deployed = parse_datetime(mooring.get('deployed',''))
+    ident = [str(mooring.get('name','')).strip(),
+             None if lon is None else round(lon,POSITION_DECIMALS),
+             None if lat is None else round(lat,POSITION_DECIMALS),
+             str(mooring.get('deployed','')).strip() if deployed is None else deployed.isoformat()]
+    s = json.dumps(ident,separators=(',',':'))
+    return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+
+def mooring_filename(mooring,extension):
+    """ A filename for an export of a mooring, made of its name, its
+    deployment date and its identity hash
+    """
+    name = re.sub(r'[^A-Za-z0-9_.-]+','_',str(mooring.get('name','')).strip()).strip('_') or 'mooring'
+    deployed = parse_datetime(mooring.get('deployed',''))
+    if(deployed is not None):
+        name += '_' + deployed.strftime('%Y%m%d')
+    return name + '_' + mooring_identity(mooring)[:8] + extension
+
+
+def _read_and_hash(filename):
+    """ Reads a mooring file and hashes its moorings, returns the data,
+    the (identity,content) hashes of the moorings and an error message
+    """
+    try:
+        data = normalize_mooring_dict(read_mooring_file(filename))
+    except Exception as e:
+        return None,[],str(e)
+    moorings = [m for m in data['moorings'] if isinstance(m,dict)]
+    data['moorings'] = moorings
+    hashes = [(mooring_identity(m),hash_dict(m)) for m in moorings]
+    return data,hashes,None
+
+
+def known_moorings(moorings,description):
+    """ Returns the dictionary of identity hash: (description,content
+    hash) of moorings, which are already in a collection, for
+    merge_read_results()
+    """
+    return {mooring_identity(m):(description,hash_dict(m)) for m in moorings}
+
+
+def merge_read_results(results,known=None):
+    """ Merges the results of _read_and_hash() into one collection
+
+    Args:
+        results: List of (filename,data,hashes,error)
+        known: Dictionary of identity hash: (description,content hash) of
+               moorings, which are already in the collection, e.g. the
+               moorings table of the GUI, see known_moorings(). The
+               content hash can be None if it is not known
+
+    Returns:
+        The collection {'moorings':[...]} and a report with the number
+        of 'files' and 'moorings', the 'duplicates' (list of dictionaries
+        with 'file', 'name', 'duplicate_of' and 'identical', True if the
+        content is the same as well, None if the content of the known
+        mooring is not known) and the read 'errors' per file
+    """
+    seen = {}
+    contents = {}
+    for ident,(description,content) in (known or {}).items():
+        seen[ident] = description
+        contents[ident] = content
+    collection = {'moorings':[]}
+    report = {'files':len(results),'moorings':0,'duplicates':[],'errors':{}}
+    for filename,data,hashes,err in results:
+        if(err is not None):
+            report['errors'][filename] = err
+            continue
+        for mooring,(ident,content) in zip(data['moorings'],hashes):
+            if(ident in seen):
+                identical = None if contents[ident] is None else (contents[ident] == content)
+                report['duplicates'].append({'file':filename,'name':str(mooring.get('name','')),
+                                             'duplicate_of':seen[ident],'identical':identical})
+                continue
+            seen[ident] = filename
+            contents[ident] = content
+            collection['moorings'].append(mooring)
+
+    report['moorings'] = len(collection['moorings'])
+    return collection,report
+
+
+def describe_duplicate(dup):
+    """ A line of text describing a duplicate of merge_read_results()
+    """
+    if(dup['identical'] is None):
+        what = 'has the name, position and deployment date of a mooring in'
+    else:
+        what = 'is a copy of' if dup['identical'] else 'is a different version of'
+    return '{:s}: {:s} {:s} {:s}'.format(dup['file'],dup['name'],what,dup['duplicate_of'])
+
+
+def read_mooring_files(paths,nprocs=None,known=None):
+    """ Reads all mooring files in the directories or files given in
+    paths with nprocs processes (default: number of CPUs) and merges
+    them, see merge_read_results(). The files are merged in the order given,
+    the first mooring of duplicates is kept
+    """
+    if(isinstance(paths,str)):
+        paths = [paths]
+    filenames = []
+    for path in paths:
+        filenames.extend(list_mooring_files(path))
+
+    if((nprocs == 1) or (len(filenames) < 2)):
+        results = [_read_and_hash(filename) for filename in filenames]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nprocs) as executor:
+            chunksize = max(1,len(filenames)//(4 * (nprocs or os.cpu_count() or 1)))
+            results = list(executor.map(_read_and_hash,filenames,chunksize=chunksize))
+
+    return merge_read_results([(f,) + r for f,r in zip(filenames,results)],known)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merges mooring files and directories into one mooring file, duplicate moorings are skipped')
+    parser.add_argument('paths',nargs='+',help='Mooring files or directories')
+    parser.add_argument('-o','--output',required=True,help='The merged mooring file, JSON if it ends with .json')
+    parser.add_argument('--compact',action='store_true',help='Compact JSON without whitespace')
+    parser.add_argument('-j','--nprocs',type=int,default=None,help='Number of processes, default number of CPUs')
+    args = parser.parse_args()
+    collection,report = read_mooring_files(args.paths,nprocs=args.nprocs)
+    for filename,err in report['errors'].items():
+        print('{:s}: could not read file: {:s}'.format(filename,err))
+    for dup in report['duplicates']:
+        print(describe_duplicate(dup))
+
+    write_mooring_file(collection,args.output,args.compact)
+    print('{:d} files, {:d} moorings, {:d} duplicates'.format(report['files'],report['moorings'],len(report['duplicates'])))
+    sys.exit(1 if len(report['errors']) > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
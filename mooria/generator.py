@@ -0,0 +1,216 @@
+""" Generator for synthetic mooring campaigns
+
+Creates reproducible collections of moorings equipped with devices of
+the device catalog. The output has the same structure as
+mainWidget.create_mooring_dict() and can be saved as yaml and loaded
+by mooria. Intended for load and scaling tests::
+
+    mooria-generate -n 10000 --seed 1 -o campaign_10k.yaml
+
+"""
+import argparse
+import datetime
+import random
+
+from .catalog import get_catalog, instrument_names, CATALOG_FIELDS
+from .fileio import write_mooring_file
+
+# The format of the dates as used in the moorings table
+DATEFMT = '%Y-%m-%d %H:%M:%S'
+
+# Typical settings used to fill the fields of the devices, the
+# default is used for all devices not listed
+SAMPLING_INTERVALS = {}
+SAMPLING_INTERVALS['default']   = ['60','300','600']
+SAMPLING_INTERVALS['Workhorse'] = ['600','900','1800','3600']
+SAMPLING_INTERVALS['Aquadopp']  = ['300','600','900']
+SAMPLING_INTERVALS['Vector']    = ['0.0625','0.125','1']
+# Serial number ranges of the instrument pool
+SERIAL_START = {}
+SERIAL_START['default']   = 100000
+SERIAL_START['Workhorse'] = 10000
+SERIAL_START['Aquadopp']  = 2000
+SERIAL_START['Microcat']  = 3000
+SERIAL_START['Seacat']    = 4000
+SERIAL_START['miniDOT']   = 7450
+# Devices profiling the water column, these are mostly placed near the
+# bottom looking upwards
+PROFILERS = ['Workhorse','Aquadopp']
+
+
+def create_instrument_pool(devices,ninstruments=20):
+    """ Creates a pool of ninstruments instruments for each device in
+    devices, the pool is a dictionary with the device names as keys
+    and a list of serial numbers as values
+
+    """
+    pool = {}
+    for i,name in enumerate(sorted(devices)):
+        start = SERIAL_START.get(name,SERIAL_START['default'] + 1000 * i)
+        pool[name] = [str(start + j) for j in range(ninstruments)]
+
+    return pool
+
+
+def create_device(rng,device_name,device_dict,location,refsystem='Depth',serial='',orientation=None):
+    """ Creates a device dictionary in the same form as
+    mainWidget.create_dict_from_device()
+
+    """
+    devdict = {}
+    for k in device_dict.keys():
+        v = device_dict[k]
+        if(k in CATALOG_FIELDS):
+            continue
+        elif(k.lower() == 'parameter'):
+            devdict['parameter'] = list(v)
+        elif(isinstance(v,dict) and ('options' in v)):
+            options = [str(op) for op in v['options']]
+            if((k == 'orientation') and (orientation is not None)):
+                devdict[k] = orientation
+            else:
+                devdict[k] = rng.choice(options)
+        elif(k == 'sampling_interval'):
+            devdict[k] = rng.choice(SAMPLING_INTERVALS.get(device_name,SAMPLING_INTERVALS['default']))
+        else:
+            devdict[k] = str(v)
+
+    devdict['label']          = ''
+    devdict['Serial Number']  = serial
+    devdict['location']       = '{:.1f} {:s}'.format(location,refsystem)
+    devdict['raw_data']       = ''
+    devdict['processed_data'] = ''
+    return devdict
+
+
+def create_mooring_devices(rng,depth,ndevices,devices,pool=None):
+    """ Creates a list of ndevices devices distributed over the water
+    column of a mooring with the given depth, mooring hardware of the
+    catalog is not used
+
+    """
+    # Sorted, the order of the catalog depends on the filesystem
+    instruments = instrument_names(devices)
+    names     = sorted(n for n in instruments if n not in PROFILERS)
+    profilers = sorted(n for n in instruments if n in PROFILERS)
+    devlist   = []
+    for i in range(ndevices):
+        # The first device is a profiler at the bottom, if available
+        if((i == 0) and (len(profilers) > 0) and (rng.random() < 0.8)):
+            name = rng.choice(profilers)
+            location  = round(rng.uniform(0.5,3.0),1)
+            refsystem = 'Above bottom'
+            orientation = 'up'
+        else:
+            name = rng.choice(names if len(names) > 0 else profilers)
+            location  = round(rng.uniform(1.0,max(depth - 1.0,1.0)),1)
+            refsystem = 'Depth'
+            orientation = None
+
+        serial = ''
+        if((pool is not None) and (name in pool)):
+            serial = rng.choice(pool[name])
+        devlist.append(create_device(rng,name,devices[name],location,refsystem,serial,orientation))
+
+    return devlist
+
+
+def create_campaign(nmoorings=10,ndevices=(3,10),seed=None,devices=None,nstations=None,
+                    region=(10.0,20.0,54.0,58.0),depth=(20.0,250.0),start='2010-01-01 00:00:00',
+                    duration=(90,400),turnaround=(-2,10),campaign='synthetic',ninstruments=20,with_devices=True):
+    """ Creates a synthetic collection of moorings
+
+    Args:
+        nmoorings: Total number of moorings
+        ndevices: Tuple of minimum and maximum number of devices per mooring
+        seed: Seed of the random number generator, the same seed gives the same campaign
+        devices: Device catalog, default the mooria device catalog
+        nstations: Number of stations, every station is a long term series of
+                   consecutive deployments, default nmoorings/10
+        region: Tuple (lonmin,lonmax,latmin,latmax) of the stations
+        depth: Tuple (min,max) of the water depth of the stations
+        start: Deployment date of the first moorings
+        duration: Tuple (min,max) of the deployment duration in days
+        turnaround: Tuple (min,max) of days between recovery and next deployment,
+                    negative values create overlapping deployments
+        campaign: Name of the campaign, the year of deployment is appended
+        ninstruments: Number of instruments per device type in the instrument pool
+        with_devices: Create the devices of the moorings
+
+    Returns:
+        A dictionary of the same form as mainWidget.create_mooring_dict()
+
+    """
+    rng = random.Random(seed)
+    if(devices is None):
+        devices = get_catalog().devices
+    if(nstations is None):
+        nstations = max(1,nmoorings//10)
+    nstations = min(nstations,max(nmoorings,1))
+    tstart = datetime.datetime.strptime(start,DATEFMT)
+    pool = create_instrument_pool(instrument_names(devices),ninstruments)
+    # The stations with fixed positions and depths
+    stations = []
+    for i in range(nstations):
+        station = {}
+        station['name']  = 'S{:04d}'.format(i)
+        station['lon']   = rng.uniform(region[0],region[1])
+        station['lat']   = rng.uniform(region[2],region[3])
+        station['depth'] = rng.uniform(depth[0],depth[1])
+        station['next']  = tstart + datetime.timedelta(days=rng.uniform(0,60))
+        station['ndeploy'] = 0
+        stations.append(station)
+
+    data = {}
+    data['moorings'] = []
+    for i in range(nmoorings):
+        station = stations[i % nstations]
+        deployed  = station['next']
+        recovered = deployed + datetime.timedelta(days=rng.uniform(duration[0],duration[1]))
+        station['next'] = recovered + datetime.timedelta(days=rng.uniform(turnaround[0],turnaround[1]))
+        station['ndeploy'] += 1
+        mooring_depth = station['depth'] + rng.uniform(-1.0,1.0)
+        mooring_dict = {}
+        mooring_dict['name']           = '{:s}_{:03d}'.format(station['name'],station['ndeploy'])
+        mooring_dict['depth']          = '{:3.3f}'.format(mooring_depth)
+        mooring_dict['longtermseries'] = station['name']
+        mooring_dict['lon']            = round(station['lon'] + rng.uniform(-0.001,0.001),5)
+        mooring_dict['lat']            = round(station['lat'] + rng.uniform(-0.001,0.001),5)
+        mooring_dict['deployed']       = deployed.strftime(DATEFMT)
+        mooring_dict['recovered']      = recovered.strftime(DATEFMT)
+        mooring_dict['comment']        = ''
+        mooring_dict['campaign']       = '{:s}_{:d}'.format(campaign,deployed.year)
+        if(with_devices):
+            n = rng.randint(ndevices[0],ndevices[1])
+            mooring_dict['devices'] = create_mooring_devices(rng,mooring_depth,n,devices,pool)
+
+        data['moorings'].append(mooring_dict)
+
+    return data
+
+
+def save_campaign(data,filename):
+    """ Saves a campaign as yaml, the same way as mainWidget.save_yaml_summary(),
+    or as JSON if filename ends with .json
+    """
+    write_mooring_file(data,filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Creates synthetic mooring campaigns for load and scaling tests')
+    parser.add_argument('-n','--nmoorings',type=int,default=100,help='Number of moorings')
+    parser.add_argument('-d','--ndevices',type=int,nargs=2,default=[3,10],metavar=('MIN','MAX'),help='Number of devices per mooring')
+    parser.add_argument('-s','--nstations',type=int,default=None,help='Number of stations (long term series), default nmoorings/10')
+    parser.add_argument('--seed',type=int,default=0,help='Seed of the random number generator')
+    parser.add_argument('--start',default='2010-01-01 00:00:00',help='Start of the first deployments (yyyy-mm-dd HH:MM:SS)')
+    parser.add_argument('--campaign',default='synthetic',help='Campaign name')
+    parser.add_argument('-o','--output',required=True,help='yaml or JSON file to write the campaign to')
+    args = parser.parse_args()
+    data = create_campaign(args.nmoorings,args.ndevices,seed=args.seed,nstations=args.nstations,
+                           start=args.start,campaign=args.campaign)
+    save_campaign(data,args.output)
+    print('Wrote {:d} moorings to {:s}'.format(len(data['moorings']),args.output))
+
+
+if __name__ == '__main__':
+    main()
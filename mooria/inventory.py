@@ -0,0 +1,149 @@
+""" Instrument inventory
+
+Indexes all deployments of the instruments of a mooring collection by
+the device name and the serial number and finds instruments booked
+into overlapping deployments, e.g. at two positions at once.
+
+"""
+import datetime
+import numpy as np
+
+from .catalog import get_catalog, is_hardware
+from .utils import parse_datetime, parse_float
+
+# Positions closer than this (in degrees) are treated as the same position
+POSITION_TOLERANCE = 0.01
+EPOCH = datetime.datetime(1970,1,1)
+
+
+def instrument_key(device):
+    """ Returns the key of the instrument of a device, device name and
+    serial number, or None if the device has no serial number
+    """
+    serial = str(device.get('Serial Number','')).strip()
+    if(serial == ''):
+        return None
+    return (str(device.get('name','')),serial)
+
+
+def build_inventory(data,devices=None):
+    """ Creates an index of all instruments with serial numbers, mooring
+    hardware of the device catalog devices (default the catalog of
+    mooria) is not included
+
+    Returns:
+        A dictionary of (device name,serial number): list of deployments,
+        a deployment is a dictionary with the 'mooring' name, the
+        'mooring_index' and 'device_index' in data, the 'deployed' and
+        'recovered' datetimes (None if not given) and 'lon', 'lat'
+    """
+    if(devices is None):
+        devices = get_catalog().devices
+    inventory = {}
+    for i,mooring in enumerate(data.get('moorings',[])):
+        deployed  = parse_datetime(mooring.get('deployed',''))
+        recovered = parse_datetime(mooring.get('recovered',''))
+        lon = parse_float(mooring.get('lon',''))
+        lat = parse_float(mooring.get('lat',''))
+        for j,device in enumerate(mooring.get('devices',[])):
+            key = instrument_key(device)
+            if((key is None) or is_hardware(key[0],devices)):
+                continue
+            deployment = {}
+            deployment['mooring']       = str(mooring.get('name',''))
+            deployment['mooring_index'] = i
+            deployment['device_index']  = j
+            deployment['deployed']      = deployed
+            deployment['recovered']     = recovered
+            deployment['lon']           = lon
+            deployment['lat']           = lat
+            try:
+                inventory[key].append(deployment)
+            except KeyError:
+                inventory[key] = [deployment]
+
+    return inventory
+
+
+def find_double_bookings(inventory,tolerance=POSITION_TOLERANCE):
+    """ Finds instruments booked into overlapping deployments with a sweep
+    over the deployments sorted by instrument and deployment date
+
+    Returns:
+        A list of conflicts, dictionaries with the instrument 'key', the
+        'type' ('position' if the instrument is at two positions at once,
+        'overlap' otherwise) and the two deployments 'first' and 'second'
+    """
+    deployments = []
+    for key,deps in inventory.items():
+        for dep in deps:
+            if((dep['deployed'] is None) or (dep['recovered'] is None)):
+                continue
+            deployments.append((key,dep))
+
+    n = len(deployments)
+    if(n < 2):
+        return []
+
+    # Integer ids of the instruments and times in seconds
+    key_ids = {}
+    ids   = np.empty(n,dtype=np.int64)
+    start = np.empty(n,dtype=np.int64)
+    end   = np.empty(n,dtype=np.int64)
+    lon   = np.empty(n)
+    lat   = np.empty(n)
+    for i,(key,dep) in enumerate(deployments):
+        ids[i]   = key_ids.setdefault(key,len(key_ids))
+        start[i] = int((dep['deployed'] - EPOCH).total_seconds())
+        end[i]   = int((dep['recovered'] - EPOCH).total_seconds())
+        lon[i]   = np.nan if dep['lon'] is None else dep['lon']
+        lat[i]   = np.nan if dep['lat'] is None else dep['lat']
+
+    # Shift the times of every instrument into its own range, such that a
+    # single running maximum over all sorted deployments works per instrument
+    end   = np.maximum(end,start)
+    tmin  = start.min()
+    span  = end.max() - tmin + 1
+    start = (start - tmin) + ids * span
+    end   = (end - tmin) + ids * span
+    order = np.lexsort((start,ids))
+    start = start[order]
+    end   = end[order]
+    # The running maximum of the recovery and the deployment it belongs to
+    endmax = np.maximum.accumulate(end)
+    idx = np.arange(n)
+    argmax = np.maximum.accumulate(np.where(end == endmax,idx,0))
+    # A deployment conflicts if it starts before the latest recovery of
+    # the earlier deployments of the same instrument
+    conflict = np.zeros(n,dtype=bool)
+    conflict[1:] = start[1:] < endmax[:-1]
+    conflicts = []
+    for i in np.nonzero(conflict)[0]:
+        first  = order[argmax[i-1]]
+        second = order[i]
+        key,dep1 = deployments[first]
+        key,dep2 = deployments[second]
+        dist = max(abs(lon[first] - lon[second]),abs(lat[first] - lat[second]))
+        ctype = 'position' if dist > tolerance else 'overlap'
+        conflicts.append({'key':key,'type':ctype,'first':dep1,'second':dep2})
+
+    return conflicts
+
+
+def conflict_report(conflicts):
+    """ Creates a text report of the conflicts found by find_double_bookings
+    """
+    lines = []
+    for c in conflicts:
+        name,serial = c['key']
+        d1 = c['first']
+        d2 = c['second']
+        if(c['type'] == 'position'):
+            what = 'at two positions at once'
+        else:
+            what = 'in overlapping deployments'
+        lines.append('{:s} SN {:s} {:s}: {:s} ({:s} - {:s}) and {:s} ({:s} - {:s})'.format(
+            name,serial,what,d1['mooring'],str(d1['deployed']),str(d1['recovered']),
+            d2['mooring'],str(d2['deployed']),str(d2['recovered'])))
+
+    return '\n'.join(lines)
@@ -0,0 +1,325 @@
+""" Export of mooring metadata as ISO 19115-2 XML
+
+Every mooring becomes a gmi:MI_Metadata record with its position, time
+and depth range and keywords of the measured parameters; the mooring
+is described as platform with its devices as instruments. The records
+are written element by element with a SAX XMLGenerator, nothing of the
+document is kept in memory, such that whole archives are exported with
+constant memory. Either all records are written into one file or every
+record into its own file, in parallel::
+
+    mooria-iso19115 archive/ -o archive.xml
+    mooria-iso19115 archive/ -d records/ -j 8
+
+"""
+import os
+import argparse
+import datetime
+import concurrent.futures
+from xml.sax.saxutils import XMLGenerator
+
+from .utils import parse_datetime, parse_float, device_depth
+from .fileio import iter_moorings, mooring_identity, mooring_filename
+from .compression import open_file
+
+NAMESPACES = {}
+NAMESPACES['gmi'] = 'http://www.isotc211.org/2005/gmi'
+NAMESPACES['gmd'] = 'http://www.isotc211.org/2005/gmd'
+NAMESPACES['gco'] = 'http://www.isotc211.org/2005/gco'
+NAMESPACES['gml'] = 'http://www.opengis.net/gml/3.2'
+CODELISTS = 'http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml'
+STANDARD_NAME    = 'ISO 19115-2 Geographic Information - Metadata - Part 2: Extensions for Imagery and Gridded Data'
+STANDARD_VERSION = 'ISO 19115-2:2009(E)'
+# The element wrapping the records of a collection file
+COLLECTION = 'mooringRecords'
+
+
+class isoWriter():
+    """ Writes indented XML elements to the file object f
+    """
+    def __init__(self,f,indent=' '):
+        self.gen = XMLGenerator(f,encoding='utf-8',short_empty_elements=True)
+        self.indent = indent
+        self.depth = 0
+
+    def start_document(self):
+        self.gen.startDocument()
+
+    def end_document(self):
+        self.gen.ignorableWhitespace('\n')
+        self.gen.endDocument()
+
+    def start(self,name,attrs=None):
+        if(self.depth > 0): # The root follows the xml declaration
+            self.gen.ignorableWhitespace('\n' + self.indent * self.depth)
+        self.gen.startElement(name,attrs or {})
+        self.depth += 1
+
+    def end(self,name):
+        self.depth -= 1
+        self.gen.ignorableWhitespace('\n' + self.indent * self.depth)
+        self.gen.endElement(name)
+
+    def element(self,name,text=None,attrs=None):
+        self.gen.ignorableWhitespace('\n' + self.indent * self.depth)
+        self.gen.startElement(name,attrs or {})
+        if(text is not None):
+            self.gen.characters(str(text))
+        self.gen.endElement(name)
+
+    def wrapped(self,name,typename,text):
+        """ E.g. <gmd:title><gco:CharacterString>text</gco:CharacterString></gmd:title>
+        """
+        self.start(name)
+        self.element(typename,text)
+        self.end(name)
+
+    def string(self,name,text):
+        self.wrapped(name,'gco:CharacterString',text)
+
+    def code(self,name,codelist,value):
+        self.start(name)
+        self.element('gmd:' + codelist,value,{'codeList':CODELISTS + '#' + codelist,'codeListValue':value})
+        self.end(name)
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _isodate(value):
+    date = parse_datetime(value)
+    return None if date is None else date.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def write_keywords(w,keywords,typecode):
+    w.start('gmd:descriptiveKeywords')
+    w.start('gmd:MD_Keywords')
+    for keyword in keywords:
+        w.string('gmd:keyword',keyword)
+    w.code('gmd:type','MD_KeywordTypeCode',typecode)
+    w.end('gmd:MD_Keywords')
+    w.end('gmd:descriptiveKeywords')
+
+
+def write_extent(w,mooring,ident,depths):
+    """ Writes the position, the deployment period and the depth range of a mooring
+    """
+    lon = parse_float(mooring.get('lon',''))
+    lat = parse_float(mooring.get('lat',''))
+    begin = _isodate(mooring.get('deployed',''))
+    end   = _isodate(mooring.get('recovered',''))
+    w.start('gmd:extent')
+    w.start('gmd:EX_Extent')
+    if((lon is not None) and (lat is not None)):
+        w.start('gmd:geographicElement')
+        w.start('gmd:EX_GeographicBoundingBox')
+        for name,value in [('westBoundLongitude',lon),('eastBoundLongitude',lon),('southBoundLatitude',lat),('northBoundLatitude',lat)]:
+            w.wrapped('gmd:' + name,'gco:Decimal',value)
+        w.end('gmd:EX_GeographicBoundingBox')
+        w.end('gmd:geographicElement')
+    if((begin is not None) or (end is not None)):
+        w.start('gmd:temporalElement')
+        w.start('gmd:EX_TemporalExtent')
+        w.start('gmd:extent')
+        w.start('gml:TimePeriod',{'gml:id':'period_' + ident})
+        w.element('gml:beginPosition',begin,None if begin is not None else {'indeterminatePosition':'unknown'})
+        w.element('gml:endPosition',end,None if end is not None else {'indeterminatePosition':'unknown'})
+        w.end('gml:TimePeriod')
+        w.end('gmd:extent')
+        w.end('gmd:EX_TemporalExtent')
+        w.end('gmd:temporalElement')
+    if(len(depths) > 0):
+        w.start('gmd:verticalElement')
+        w.start('gmd:EX_VerticalExtent')
+        w.wrapped('gmd:minimumValue','gco:Real',min(depths))
+        w.wrapped('gmd:maximumValue','gco:Real',max(depths))
+        w.element('gmd:verticalCRS',attrs={'gco:nilReason':'unknown'})
+        w.end('gmd:EX_VerticalExtent')
+        w.end('gmd:verticalElement')
+    w.end('gmd:EX_Extent')
+    w.end('gmd:extent')
+
+
+def write_instrument(w,device,mooring_depth):
+    w.start('gmi:instrument')
+    w.start('gmi:MI_Instrument')
+    w.start('gmi:citation')
+    w.start('gmd:CI_Citation')
+    w.string('gmd:title',_text(device.get('name','')))
+    w.element('gmd:date',attrs={'gco:nilReason':'unknown'})
+    w.end('gmd:CI_Citation')
+    w.end('gmi:citation')
+    w.start('gmi:identifier')
+    w.start('gmd:MD_Identifier')
+    w.string('gmd:code',_text(device.get('Serial Number','')))
+    w.end('gmd:MD_Identifier')
+    w.end('gmi:identifier')
+    w.string('gmi:type',_text(device.get('name','')))
+    description = []
+    ddepth,mab = device_depth(device.get('location',''),mooring_depth)
+    if(ddepth is not None):
+        description.append('Depth {:.1f} m'.format(ddepth))
+    if(mab is not None):
+        description.append('{:.1f} m above bottom'.format(mab))
+    parameter = device.get('parameter',[])
+    if(isinstance(parameter,list) and (len(parameter) > 0)):
+        description.append('Parameter ' + ', '.join(str(p) for p in parameter))
+    for key in ('company','label'):
+        if(_text(device.get(key,'')) != ''):
+            description.append(_text(device[key]))
+    w.string('gmi:description','; '.join(description))
+    w.end('gmi:MI_Instrument')
+    w.end('gmi:instrument')
+
+
+def write_record(w,mooring,namespaces=True):
+    """ Writes the gmi:MI_Metadata record of a mooring dictionary with
+    the isoWriter w, the namespaces are declared at the record if
+    namespaces is True
+    """
+    ident = mooring_identity(mooring)[:16]
+    name  = _text(mooring.get('name',''))
+    depth = parse_float(mooring.get('depth',''))
+    devices = [d for d in mooring.get('devices',[]) if isinstance(d,dict)]
+    depths = [] if depth is None else [depth]
+    parameters = []
+    for device in devices:
+        ddepth,mab = device_depth(device.get('location',''),depth)
+        if(ddepth is not None):
+            depths.append(ddepth)
+        parameter = device.get('parameter',[])
+        for par in parameter if isinstance(parameter,list) else []:
+            if(str(par) not in parameters):
+                parameters.append(str(par))
+
+    attrs = {'xmlns:' + k:v for k,v in NAMESPACES.items()} if namespaces else {}
+    w.start('gmi:MI_Metadata',attrs)
+    w.string('gmd:fileIdentifier','mooria-' + ident)
+    w.string('gmd:language','eng')
+    w.code('gmd:hierarchyLevel','MD_ScopeCode','dataset')
+    w.wrapped('gmd:dateStamp','gco:DateTime',datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'))
+    w.string('gmd:metadataStandardName',STANDARD_NAME)
+    w.string('gmd:metadataStandardVersion',STANDARD_VERSION)
+    # Identification
+    w.start('gmd:identificationInfo')
+    w.start('gmd:MD_DataIdentification')
+    w.start('gmd:citation')
+    w.start('gmd:CI_Citation')
+    w.string('gmd:title','Mooring ' + name)
+    deployed = _isodate(mooring.get('deployed',''))
+    if(deployed is None):
+        w.element('gmd:date',attrs={'gco:nilReason':'unknown'})
+    else:
+        w.start('gmd:date')
+        w.start('gmd:CI_Date')
+        w.wrapped('gmd:date','gco:DateTime',deployed)
+        w.code('gmd:dateType','CI_DateTypeCode','creation')
+        w.end('gmd:CI_Date')
+        w.end('gmd:date')
+    w.end('gmd:CI_Citation')
+    w.end('gmd:citation')
+    abstract = 'Mooring {:s} with {:d} devices'.format(name,len(devices))
+    if(depth is not None):
+        abstract += ' at {:.1f} m water depth'.format(depth)
+    if(_text(mooring.get('comment','')) != ''):
+        abstract += '. ' + _text(mooring['comment'])
+    w.string('gmd:abstract',abstract)
+    if(len(parameters) > 0):
+        write_keywords(w,parameters,'theme')
+    projects = [_text(mooring.get(k,'')) for k in ('campaign','longtermseries') if _text(mooring.get(k,'')) != '']
+    if(len(projects) > 0):
+        write_keywords(w,projects,'project')
+    w.string('gmd:language','eng')
+    write_extent(w,mooring,ident,depths)
+    w.end('gmd:MD_DataIdentification')
+    w.end('gmd:identificationInfo')
+    # The mooring as platform with its devices
+    w.start('gmi:acquisitionInformation')
+    w.start('gmi:MI_AcquisitionInformation')
+    w.start('gmi:platform')
+    w.start('gmi:MI_Platform')
+    w.start('gmi:identifier')
+    w.start('gmd:MD_Identifier')
+    w.string('gmd:code',name)
+    w.end('gmd:MD_Identifier')
+    w.end('gmi:identifier')
+    w.string('gmi:description','Mooring')
+    for device in devices:
+        write_instrument(w,device,depth)
+    w.end('gmi:MI_Platform')
+    w.end('gmi:platform')
+    w.end('gmi:MI_AcquisitionInformation')
+    w.end('gmi:acquisitionInformation')
+    w.end('gmi:MI_Metadata')
+
+
+def write_iso19115(moorings,filename):
+    """ Writes the records of all moorings into one file, moorings can
+    be any iterable (e.g. iter_moorings()), returns the number of records
+    """
+    n = 0
+    with open_file(filename,'w',encoding='utf-8') as f:
+        w = isoWriter(f)
+        w.start_document()
+        w.start(COLLECTION,{'xmlns:' + k:v for k,v in NAMESPACES.items()})
+        for mooring in moorings:
+            write_record(w,mooring,namespaces=False)
+            n += 1
+        w.end(COLLECTION)
+        w.end_document()
+
+    return n
+
+
+def write_record_file(mooring,filename):
+    with open_file(filename,'w',encoding='utf-8') as f:
+        w = isoWriter(f)
+        w.start_document()
+        write_record(w,mooring)
+        w.end_document()
+
+    return filename
+
+
+def write_iso19115_files(moorings,directory,nprocs=None):
+    """ Writes the record of every mooring into its own file in directory
+    with nprocs processes (default: number of CPUs). At most a few
+    moorings per process are queued, such that moorings can be an
+    iterable reading a large archive. Returns the filenames
+    """
+    os.makedirs(directory,exist_ok=True)
+    jobs = ((mooring,os.path.join(directory,mooring_filename(mooring,'.xml'))) for mooring in moorings)
+    if(nprocs == 1):
+        return [write_record_file(mooring,filename) for mooring,filename in jobs]
+
+    filenames = []
+    maxqueue = 4 * (nprocs or os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nprocs) as executor:
+        pending = []
+        for mooring,filename in jobs:
+            pending.append(executor.submit(write_record_file,mooring,filename))
+            if(len(pending) >= maxqueue):
+                filenames.append(pending.pop(0).result())
+        filenames.extend(future.result() for future in pending)
+
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exports the metadata of moorings as ISO 19115-2 XML')
+    parser.add_argument('paths',nargs='+',help='Mooring files or directories')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-o','--output',help='Write all records into this file')
+    group.add_argument('-d','--directory',help='Write every record into its own file in this directory')
+    parser.add_argument('-j','--nprocs',type=int,default=None,help='Number of processes for --directory, default number of CPUs')
+    args = parser.parse_args()
+    if(args.output is not None):
+        n = write_iso19115(iter_moorings(args.paths),args.output)
+    else:
+        n = len(write_iso19115_files(iter_moorings(args.paths),args.directory,nprocs=args.nprocs))
+    print('{:d} records written'.format(n))
+
+
+if __name__ == '__main__':
+    main()
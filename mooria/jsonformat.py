@@ -0,0 +1,98 @@
+""" Versioned JSON mooring files
+
+An alternative to the yaml mooring files for the exchange between
+programs. The file is the dictionary of mainWidget.create_mooring_dict()
+with the fields 'format' and 'version' of the file format added. It is
+parsed with the json module only, without the type resolution of yaml.
+Files of older versions are migrated to the current version when read,
+yaml files have no version and are migrated from version 0::
+
+    export_json(data,'archive.json',compact=True)
+    data = read_json_file('archive.json')
+
+A change of the format increases FORMAT_VERSION and registers a
+migration from the previous version with @migration(previous_version).
+
+"""
+import json
+
+from .compression import open_file, strip_compression
+
+FORMAT = 'mooria'
+FORMAT_VERSION = 1
+# Version: function migrating the data of this version to the next one
+MIGRATIONS = {}
+
+
+def migration(version):
+    """ Decorator registering a function, which migrates mooring data of
+    version to version + 1 and returns it
+    """
+    def register(func):
+        MIGRATIONS[version] = func
+        return func
+
+    return register
+
+
+@migration(0)
+def _migrate_0(data):
+    """ Unversioned files, e.g. yaml files of older mooria versions, might miss fields
+    """
+    from .validate import normalize_mooring_dict
+    return normalize_mooring_dict(data)
+
+
+def migrate(data):
+    """ Migrates mooring data of any older version to FORMAT_VERSION,
+    data without a version is version 0. Raises ValueError for data of
+    a newer version
+    """
+    version = data.get('version',0)
+    if((not isinstance(version,int)) or (version > FORMAT_VERSION)):
+        raise ValueError('file format version {:s} not supported, the newest is {:d}'.format(repr(version),FORMAT_VERSION))
+    while(version < FORMAT_VERSION):
+        data = MIGRATIONS[version](data)
+        version += 1
+        data['version'] = version
+
+    data['format'] = FORMAT
+    return data
+
+
+def is_json_file(filename):
+    return strip_compression(str(filename)).lower().endswith('.json')
+
+
+def dumps_json(data,compact=False):
+    """ Returns the mooring data as versioned JSON string, compact
+    without any whitespace
+    """
+    doc = {'format':FORMAT,'version':FORMAT_VERSION}
+    doc.update((k,v) for k,v in data.items() if k not in ('format','version'))
+    if(compact):
+        return json.dumps(doc,default=str,ensure_ascii=False,separators=(',',':'))
+    return json.dumps(doc,default=str,ensure_ascii=False,indent=1)
+
+
+def export_json(data,filename,compact=False):
+    """ Writes the mooring data as versioned JSON file
+    """
+    with open_file(filename,'w',encoding='utf-8') as f:
+        f.write(dumps_json(data,compact))
+
+
+def loads_json(s):
+    """ Parses a versioned JSON string and migrates it to the current version
+    """
+    data = json.loads(s)
+    if((not isinstance(data,dict)) or (data.get('format',None) != FORMAT)):
+        raise ValueError('not a mooria JSON file')
+    return migrate(data)
+
+
+def read_json_file(filename):
+    """ Reads a versioned JSON mooring file and migrates it to the current version
+    """
+    with open_file(filename,'r',encoding='utf-8') as f:
+        return loads_json(f.read())
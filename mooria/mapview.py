@@ -0,0 +1,162 @@
+""" Map of mooring positions
+
+All positions are drawn as one scatter collection. Only the positions
+within the axis limits are shown, found with the grid index of
+spatial.py, and if there are more than max_points of them, the view is
+divided into max_points cells and only one position per cell is drawn.
+Zooming in shows more positions, the map stays fluid with many
+thousands of historical positions. Clicks are picked with the grid
+index as well::
+
+    mmap = mooringMap(fig)
+    mmap.set_positions(lon,lat,campaigns)
+    i = mmap.pick(lon,lat) # Index of the nearest position or None
+
+"""
+import numpy as np
+
+from .spatial import gridIndex
+
+# Maximum number of points drawn
+MAX_POINTS = 5000
+# Click tolerance [pixel]
+PICK_PIXELS = 6
+# Maximum number of groups in the legend
+LEGEND_MAX = 15
+
+
+class mooringMap():
+    """ A map of positions in the matplotlib figure fig, coloured by
+    groups (e.g. the campaign of the moorings)
+    """
+    def __init__(self,fig,max_points=MAX_POINTS):
+        self.fig = fig
+        self.max_points = max_points
+        self.ax = fig.add_axes([.1,.1,.65,.8])
+        self.index = gridIndex()
+        self.lon = np.zeros(0)
+        self.lat = np.zeros(0)
+        self.group_index = np.zeros(0,dtype=np.int64)
+        self.groups = []
+        self.shown = np.zeros(0,dtype=np.int64)
+        self.limits = None
+        self.scatter = self.ax.scatter([],[],s=16,edgecolors='k',linewidths=0.3)
+        self.ax.set_xlabel('Longitude')
+        self.ax.set_ylabel('Latitude')
+        self.ax.callbacks.connect('xlim_changed',self._on_limits)
+        self.ax.callbacks.connect('ylim_changed',self._on_limits)
+
+    def set_positions(self,lon,lat,groups=None,zoom=True):
+        """ Sets the positions (degrees, NaN for unknown) and their groups
+        (strings), with zoom the map is zoomed to all positions, otherwise
+        the axis limits are kept
+        """
+        self.lon = np.asarray(lon,dtype=float)
+        self.lat = np.asarray(lat,dtype=float)
+        if(groups is None):
+            groups = [''] * len(self.lon)
+        self.groups,self.group_index = np.unique(np.asarray(groups,dtype=str),return_inverse=True)
+        self.groups = list(self.groups)
+        self.index = gridIndex(self.lon,self.lat,cellsize=self._cellsize())
+        cmap = self._colormap()
+        self.colors = cmap(np.arange(len(self.groups)) % cmap.N)
+        self._update_legend()
+        self.limits = None
+        valid = np.isfinite(self.lon) & np.isfinite(self.lat)
+        if(zoom and np.any(valid)):
+            lonmin,lonmax = np.min(self.lon[valid]),np.max(self.lon[valid])
+            latmin,latmax = np.min(self.lat[valid]),np.max(self.lat[valid])
+            dlon = max((lonmax - lonmin) * 0.05,0.1)
+            dlat = max((latmax - latmin) * 0.05,0.1)
+            self.ax.set_aspect(1/np.cos(np.deg2rad(np.clip((latmin + latmax)/2,-80,80))),adjustable='box')
+            self.ax.set_xlim([lonmin - dlon,lonmax + dlon])
+            self.ax.set_ylim([latmin - dlat,latmax + dlat])
+        self.update_view()
+
+    def _cellsize(self):
+        """ Cells of the grid index with some tens of positions on average
+        """
+        valid = np.isfinite(self.lon) & np.isfinite(self.lat)
+        if(np.sum(valid) < 2):
+            return 1.0
+        area = np.ptp(self.lon[valid]) * np.ptp(self.lat[valid])
+        return float(np.clip(np.sqrt(area * 30/np.sum(valid)),0.01,10.0))
+
+    def _colormap(self):
+        import matplotlib
+        return matplotlib.colormaps['tab20'] if hasattr(matplotlib,'colormaps') else matplotlib.cm.get_cmap('tab20')
+
+    def _update_legend(self):
+        from matplotlib.lines import Line2D
+        legend = self.ax.get_legend()
+        if(legend is not None):
+            legend.remove()
+        if((len(self.groups) < 2) and (''.join(self.groups) == '')):
+            return
+        handles = []
+        for i,group in enumerate(self.groups[:LEGEND_MAX]):
+            handles.append(Line2D([],[],ls='',marker='o',color=self.colors[i],markeredgecolor='k',markeredgewidth=0.3,label=group or '(none)'))
+        if(len(self.groups) > LEGEND_MAX):
+            handles.append(Line2D([],[],ls='',label='{:d} more'.format(len(self.groups) - LEGEND_MAX)))
+        self.ax.legend(handles=handles,loc='upper left',bbox_to_anchor=(1.02,1),fontsize='small',frameon=False)
+
+    def _on_limits(self,ax):
+        self.update_view()
+
+    def visible(self):
+        """ Indices of the positions within the axis limits
+        """
+        lonmin,lonmax = sorted(self.ax.get_xlim())
+        latmin,latmax = sorted(self.ax.get_ylim())
+        return self.index.query_bbox(lonmin,latmin,lonmax,latmax)
+
+    def decimate(self,indices):
+        """ Returns the indices, if there are more than max_points of them
+        only one per cell of a grid of max_points cells over the axes
+        """
+        if(len(indices) <= self.max_points):
+            return indices
+        bbox = self.ax.get_window_extent()
+        ratio = max(bbox.width,1)/max(bbox.height,1)
+        ncols = max(int(np.sqrt(self.max_points * ratio)),1)
+        nrows = max(int(self.max_points/ncols),1)
+        lonmin,lonmax = sorted(self.ax.get_xlim())
+        latmin,latmax = sorted(self.ax.get_ylim())
+        ix = np.clip(((self.lon[indices] - lonmin)/(lonmax - lonmin) * ncols).astype(np.int64),0,ncols - 1)
+        iy = np.clip(((self.lat[indices] - latmin)/(latmax - latmin) * nrows).astype(np.int64),0,nrows - 1)
+        cell = iy * ncols + ix
+        unique,first = np.unique(cell,return_index=True)
+        return indices[np.sort(first)]
+
+    def update_view(self):
+        """ Draws the decimated positions within the axis limits, only if the limits changed
+        """
+        limits = (tuple(self.ax.get_xlim()),tuple(self.ax.get_ylim()),len(self.lon))
+        if(limits == self.limits):
+            return
+        self.limits = limits
+        self.shown = self.decimate(self.visible())
+        self.scatter.set_offsets(np.column_stack((self.lon[self.shown],self.lat[self.shown])))
+        if(len(self.shown) > 0):
+            self.scatter.set_facecolors(self.colors[self.group_index[self.shown]])
+        self.fig.canvas.draw_idle()
+
+    def pick(self,lon,lat):
+        """ Returns the index of the nearest position within PICK_PIXELS
+        of the clicked position lon,lat, None if there is none
+        """
+        if((lon is None) or (lat is None) or (len(self.lon) == 0)):
+            return None
+        trans = self.ax.transData
+        px,py = trans.transform((lon,lat))
+        lon0,lat0 = trans.inverted().transform((px - PICK_PIXELS,py - PICK_PIXELS))
+        lon1,lat1 = trans.inverted().transform((px + PICK_PIXELS,py + PICK_PIXELS))
+        cand = self.index.query_bbox(min(lon0,lon1),min(lat0,lat1),max(lon0,lon1),max(lat0,lat1))
+        if(len(cand) == 0):
+            return None
+        pos = trans.transform(np.column_stack((self.lon[cand],self.lat[cand])))
+        dist = np.hypot(pos[:,0] - px,pos[:,1] - py)
+        i = np.argmin(dist)
+        if(dist[i] > PICK_PIXELS):
+            return None
+        return int(cand[i])
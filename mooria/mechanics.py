@@ -0,0 +1,239 @@
+""" Static mooring mechanics
+
+Computes tension, inclination and knockdown of the devices of a
+single point mooring in a current. The mooring is described by its
+devices (point elements with net buoyancy and drag) and the mooring
+line between them (with weight and drag per meter). The catalog
+fields used are 'buoyancy' and 'weight' in kg (in water) and
+'drag_area', the drag coefficient times the frontal area in m^2.
+
+The solver sums the forces of all elements above a line segment to
+get its tension and inclination, integrates the segments from the
+anchor upwards to get the positions and repeats this with the
+currents at the new positions until the positions converge. All
+segments and any number of current scenarios are computed at once
+with numpy arrays::
+
+    elements = mooring_elements(mooring_dict)
+    zprof = [0,100,500]                     # Depth of the current profile [m]
+    uprof = [[0.5,0.3,0.1],[1.0,0.6,0.2]]   # One current profile per scenario [m/s]
+    result = solve_static(elements,zprof,uprof)
+
+"""
+import numpy as np
+
+from .utils import parse_float, device_depth
+
+G   = 9.81   # Gravity [m/s^2]
+RHO = 1025.0 # Density of sea water [kg/m^3]
+# Properties of the mooring line, a 8 mm jacketed wire rope
+LINE_WEIGHT   = 2.0   # Weight in water [N/m]
+LINE_DIAMETER = 0.008 # [m]
+LINE_CD       = 1.2   # Drag coefficient of a cylinder
+# Surface currents of the default scenarios [m/s]
+SURFACE_SPEEDS = np.arange(0,1.51,0.25)
+
+
+def mooring_elements(mooring_dict,line_weight=LINE_WEIGHT,line_diameter=LINE_DIAMETER,line_cd=LINE_CD):
+    """ Creates the elements of a mooring dictionary for solve_static()
+
+    Returns:
+        A dictionary with the mooring 'depth', the device 'names', the
+        nominal 'height' above the bottom, the 'net' buoyancy [N]
+        (positive upwards) and the 'drag_area' [m^2] of the devices
+        from the bottom to the top, the 'length' of the line segments
+        below every device and their 'line_net' buoyancy [N] and
+        'line_drag_area' [m^2]. Devices without a location are listed
+        in 'skipped'
+    """
+    depth = parse_float(mooring_dict.get('depth',''))
+    if(depth is None):
+        raise ValueError('Mooring {:s} has no depth'.format(str(mooring_dict.get('name',''))))
+    devices = []
+    skipped = []
+    for device in mooring_dict.get('devices',[]):
+        ddepth,mab = device_depth(device.get('location',''),depth)
+        if(mab is None):
+            skipped.append(str(device.get('name','')))
+            continue
+        buoyancy  = parse_float(device.get('buoyancy',''))
+        weight    = parse_float(device.get('weight',''))
+        drag_area = parse_float(device.get('drag_area',''))
+        net = ((0.0 if buoyancy is None else buoyancy) - (0.0 if weight is None else weight)) * G
+        devices.append((max(mab,0.0),net,0.0 if drag_area is None else drag_area,str(device.get('name',''))))
+
+    devices.sort(key=lambda d: d[0])
+    elements = {}
+    elements['depth']     = depth
+    elements['names']     = [d[3] for d in devices]
+    elements['height']    = np.array([d[0] for d in devices],dtype=float)
+    elements['net']       = np.array([d[1] for d in devices],dtype=float)
+    elements['drag_area'] = np.array([d[2] for d in devices],dtype=float)
+    elements['length']    = np.diff(np.concatenate(([0.0],elements['height'])))
+    elements['line_net']       = -line_weight * elements['length']
+    elements['line_drag_area'] = line_cd * line_diameter * elements['length']
+    elements['skipped']   = skipped
+    return elements
+
+
+def interp_profiles(zprof,uprof,z):
+    """ Interpolates the current profiles uprof (nscenarios,nz) given at
+    the depths zprof (nz, increasing) to the depths z (nscenarios,n),
+    values outside the profile are taken from the closest depth
+    """
+    zprof = np.asarray(zprof,dtype=float)
+    if(len(zprof) == 1):
+        return np.broadcast_to(uprof[:,:1],z.shape).copy()
+    idx = np.clip(np.searchsorted(zprof,z),1,len(zprof) - 1)
+    z0 = zprof[idx - 1]
+    z1 = zprof[idx]
+    w  = np.clip((z - z0)/(z1 - z0),0,1)
+    u0 = np.take_along_axis(uprof,idx - 1,axis=1)
+    u1 = np.take_along_axis(uprof,idx,axis=1)
+    return u0 + w * (u1 - u0)
+
+
+def _revcumsum(a):
+    """ Sum over all elements above (including the element itself)
+    """
+    return np.cumsum(a[:,::-1],axis=1)[:,::-1]
+
+
+def solve_static(elements,zprof,uprof,niter=50,tol=1e-3):
+    """ Solves the static shape of a mooring for current scenarios
+
+    Args:
+        elements: Result of mooring_elements()
+        zprof: Depths of the current profiles [m], increasing
+        uprof: Current speeds [m/s], shape (nscenarios,len(zprof)) or (len(zprof),)
+        niter: Maximum number of iterations
+        tol: The iteration stops if no device moves more than tol [m]
+
+    Returns:
+        A dictionary with arrays of shape (nscenarios,ndevices): the
+        'tension' [N] and 'inclination' [deg from vertical] of the line
+        below every device, the 'depth', 'knockdown' (depth increase)
+        and horizontal 'offset' of the devices [m], the 'anchor_tension',
+        'anchor_horizontal' and 'anchor_vertical' loads [N] (nscenarios),
+        'slack' (nscenarios, True if a segment has no net buoyancy above
+        it), 'iterations' and 'converged'
+    """
+    zprof = np.asarray(zprof,dtype=float)
+    uprof = np.atleast_2d(np.asarray(uprof,dtype=float))
+    order = np.argsort(zprof)
+    zprof = zprof[order]
+    uprof = uprof[:,order]
+    nscen = uprof.shape[0]
+    depth = elements['depth']
+    length = elements['length'][None,:]
+    n = length.shape[1]
+    net_node  = np.broadcast_to(elements['net'][None,:],(nscen,n))
+    net_seg   = np.broadcast_to(elements['line_net'][None,:],(nscen,n))
+    # Vertical force at the top of every segment and at its middle
+    fz_top = _revcumsum(net_node) + np.concatenate((_revcumsum(net_seg)[:,1:],np.zeros((nscen,1))),axis=1)
+    fz_mid = fz_top + net_seg/2
+    fz_bot = fz_top + net_seg
+
+    z = np.broadcast_to(elements['height'][None,:],(nscen,n)).copy() # Height above bottom
+    converged = False
+    for iteration in range(1,niter + 1):
+        zbelow = np.concatenate((np.zeros((nscen,1)),z[:,:-1]),axis=1)
+        u_node = interp_profiles(zprof,uprof,depth - z)
+        u_seg  = interp_profiles(zprof,uprof,depth - (z + zbelow)/2)
+        drag_node = 0.5 * RHO * elements['drag_area'][None,:] * u_node * abs(u_node)
+        drag_seg  = 0.5 * RHO * elements['line_drag_area'][None,:] * u_seg * abs(u_seg)
+        fx_top = _revcumsum(drag_node) + np.concatenate((_revcumsum(drag_seg)[:,1:],np.zeros((nscen,1))),axis=1)
+        fx_mid = fx_top + drag_seg/2
+        # Inclination of the segments, horizontal if slack
+        theta = np.arctan2(fx_mid,np.maximum(fz_mid,0))
+        theta = np.where(fz_mid > 0,theta,np.sign(fx_mid + (fx_mid == 0)) * np.pi/2)
+        znew = np.cumsum(length * np.cos(theta),axis=1)
+        change = abs(znew - z).max() if n > 0 else 0
+        z = znew
+        if(change < tol):
+            converged = True
+            break
+
+    fx_bot = fx_top + drag_seg
+    x = np.cumsum(length * np.sin(theta),axis=1)
+    result = {}
+    result['tension']     = np.hypot(fx_top,np.maximum(fz_top,0))
+    result['inclination'] = np.rad2deg(theta)
+    result['depth']       = depth - z
+    result['knockdown']   = elements['height'][None,:] - z
+    result['offset']      = x
+    if(n > 0):
+        result['anchor_horizontal'] = fx_bot[:,0]
+        result['anchor_vertical']   = fz_bot[:,0]
+    else:
+        result['anchor_horizontal'] = np.zeros(nscen)
+        result['anchor_vertical']   = np.zeros(nscen)
+    result['anchor_tension'] = np.hypot(result['anchor_horizontal'],np.maximum(result['anchor_vertical'],0))
+    result['slack']       = (fz_mid <= 0).any(axis=1)
+    result['iterations']  = iteration
+    result['converged']   = converged
+    return result
+
+
+def linear_scenarios(depth,speeds,bottom_fraction=0.2,nz=21):
+    """ Creates current scenarios decreasing linearly from the surface
+    speeds to bottom_fraction times the surface speed at depth
+
+    Returns:
+        The depths zprof (nz) and the profiles uprof (len(speeds),nz)
+    """
+    zprof = np.linspace(0,depth,nz)
+    shape = 1 - (1 - bottom_fraction) * zprof/depth if depth > 0 else np.ones(nz)
+    uprof = np.asarray(speeds,dtype=float)[:,None] * shape[None,:]
+    return zprof,uprof
+
+
+def mechanics_report(elements,result,speeds=None):
+    """ Creates a text report of the scenario with the largest knockdown
+    of the top device
+    """
+    lines = []
+    if(len(elements['names']) == 0):
+        return 'No devices with location'
+    i = int(np.argmax(result['knockdown'][:,-1]))
+    if(speeds is not None):
+        lines.append('Surface current {:.2f} m/s'.format(speeds[i]))
+    lines.append('Anchor tension {:.0f} N (horizontal {:.0f} N, vertical {:.0f} N)'.format(
+        result['anchor_tension'][i],result['anchor_horizontal'][i],result['anchor_vertical'][i]))
+    if(result['slack'][i]):
+        lines.append('Warning: not enough buoyancy, the mooring line is slack')
+    for k in reversed(range(len(elements['names']))):
+        lines.append('{:s} at {:.1f} m: depth {:.1f} m, knockdown {:.1f} m, tension {:.0f} N, inclination {:.1f} deg'.format(
+            elements['names'][k],elements['depth'] - elements['height'][k],result['depth'][i,k],
+            result['knockdown'][i,k],result['tension'][i,k],result['inclination'][i,k]))
+    if(len(elements['skipped']) > 0):
+        lines.append('Without location: ' + ', '.join(elements['skipped']))
+    if(not result['converged']):
+        lines.append('Warning: not converged after {:d} iterations'.format(result['iterations']))
+
+    return '\n'.join(lines)
+
+
+def plot_mechanics(elements,result,speeds=None,fig=None):
+    """ Plots the shape of the mooring for every scenario into the
+    matplotlib figure fig, returns the figure
+    """
+    from matplotlib.figure import Figure
+    if(fig is None):
+        fig = Figure()
+    ax = fig.add_subplot(111)
+    depth = elements['depth']
+    nscen = result['depth'].shape[0]
+    for i in range(nscen):
+        x = np.concatenate(([0],result['offset'][i]))
+        z = np.concatenate(([depth],result['depth'][i]))
+        label = None if speeds is None else '{:.2f} m/s'.format(speeds[i])
+        ax.plot(x,z,'o-',ms=3,label=label)
+    ax.axhline(depth,color='grey',lw=4)
+    ax.axhline(0,color='b',lw=2)
+    ax.set_ylim(depth * 1.05,-depth * 0.05)
+    ax.set_xlabel('Horizontal offset [m]')
+    ax.set_ylabel('Depth [m]')
+    if((speeds is not None) and (nscen <= 20)):
+        ax.legend(fontsize='small',title='Surface current')
+    return fig
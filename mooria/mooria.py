@@ -5,43 +5,89 @@ import argparse
 import time
 import locale
 import yaml
-import pkg_resources
 import datetime
-import geojson
+import concurrent.futures
 import numpy as np
 
 # Get the version
-version_file = pkg_resources.resource_filename('mooria','VERSION')
+version_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),'VERSION')
 
 with open(version_file) as version_f:
    version = version_f.read().strip()
 
 version_f.close()
-# Get all builtin devices
-dev_files = pkg_resources.resource_listdir('mooria','devices')
-devices = {}
-for fname in dev_files:
-    fname_full = pkg_resources.resource_filename('mooria','devices/' + fname)
-    print(fname,fname_full)    
-    if(fname_full.endswith('.yaml')):
-       f = open(fname_full,'r')
-       devtmp = yaml.safe_load(f)
-       f.close()
-       devices.update(devtmp)
-
-
-print(devices)
+# Get all builtin, site and user devices
+from .catalog import catalogIndex, deviceDict, get_catalog, is_hardware, instrument_names, CATALOG_FIELDS
+from .validate import validate_mooring_dict, normalize_mooring_dict
+from .series import analyze_series, timeline_report, plot_series_timeline
+from .inventory import build_inventory, find_double_bookings, conflict_report
+from .fileio import read_mooring_files, known_moorings, describe_duplicate
+from .compression import open_file
+from .jsonformat import is_json_file, read_json_file, export_json
+from .datafiles import data_status, dataCache, resolve_paths
+from .sniff import sniff_files, merge_infos, device_fields_from_info
+from .coverage import collect_instruments, coverage_matrix, campaign_coverage, save_coverage, plot_coverage
+from .adcp import campaign_adcp_coverage, plot_campaign_adcp_coverage, adcp_report
+from .mechanics import SURFACE_SPEEDS, mooring_elements, linear_scenarios, solve_static, mechanics_report, plot_mechanics
+from .mooringplot import mooringPlot
+from .mapview import mooringMap
+from .iso19115 import write_iso19115, write_iso19115_files
+from .export import export_yaml, export_geojson, export_csv, export_plots
+from .cache import get_cache
+from .bulkedit import select_devices, apply_changes, bulkEditError
+from .utils import parse_location
+device_catalog = get_catalog()
+devices = device_catalog.devices
 
 try:
     from PyQt5 import QtCore, QtGui, QtWidgets
+    from PyQt5.sip import isdeleted
 except:
     from qtpy import QtCore, QtGui, QtWidgets
+    from sip import isdeleted
+
+
+# matplotlib is imported when the first plot is created, that makes the startup faster
+def Figure(*args,**kwargs):
+    from matplotlib.figure import Figure
+    return Figure(*args,**kwargs)
+
+def FigureCanvas(*args,**kwargs):
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+    return FigureCanvasQTAgg(*args,**kwargs)
+
+def NavigationToolbar(*args,**kwargs):
+    from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
+    return NavigationToolbar2QT(*args,**kwargs)
+
+def session_filename():
+    return os.path.join(os.path.expanduser('~'),'.mooria','session.yaml')
+
+
+def save_session(filename):
+    """ Remembers the last loaded or saved mooring file
+    """
+    try:
+        os.makedirs(os.path.dirname(session_filename()),exist_ok=True)
+        with open(session_filename(),'w') as f:
+            yaml.dump({'last_file':os.path.abspath(filename)},f,default_flow_style=False)
+    except Exception as e:
+        print('Could not save session',e)
 
 
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
-from matplotlib.figure import Figure
+def last_session_file():
+    """ Returns the mooring file of the last session or None
+    """
+    try:
+        with open(session_filename()) as f:
+            return yaml.safe_load(f)['last_file']
+    except Exception:
+        return None
+
+
+# Number of moorings with widgets, the least recently used are torn down
+# to their data and created again when edited
+MAX_MOORING_TABS = 8
 
 #https://gis.stackexchange.com/questions/208881/qtableview-qtablewidget-alternative-for-floats
 # Need this, otherwise sorting is done as strings and not as numbers
@@ -57,31 +103,239 @@ class QCustomTableWidgetItem (QtWidgets.QTableWidgetItem):
         else:
             return QtWidgets.QTableWidgetItem.__lt__(self, other)
 
+class deviceCatalogFilter(QtCore.QAbstractTableModel):
+    """ Filtered view of the shared device catalog model, every mooring
+    tab has its own filter. The rows to show are given as row numbers
+    of the catalog model, found with a catalogIndex. Only the list of
+    visible rows is stored, the data is taken from the catalog model
+    when the view asks for it, such that filtering is independent of
+    the size of the catalog
+    """
+    def __init__(self,model):
+        super(deviceCatalogFilter, self).__init__()
+        self.model = model
+        self.rows  = list(range(model.rowCount()))
+        self.sort_column = None
+        self.sort_order  = QtCore.Qt.AscendingOrder
+
+    def set_rows(self,rows):
+        """ Sets the rows of the catalog model to show, None shows all rows
+        """
+        self.beginResetModel()
+        if(rows is None):
+            rows = range(self.model.rowCount())
+        self.rows = sorted(rows)
+        self._sort_rows()
+        self.endResetModel()
+
+    def source_row(self,index):
+        """ Returns the row in the catalog model of index
+        """
+        return self.rows[index.row()]
+
+    def _sort_rows(self):
+        if(self.sort_column is None):
+            return
+        col = self.sort_column
+        self.rows.sort(key=lambda r: self.model.item(r,col).text().lower(),
+                       reverse=(self.sort_order == QtCore.Qt.DescendingOrder))
+
+    def sort(self,column,order=QtCore.Qt.AscendingOrder):
+        self.beginResetModel()
+        self.sort_column = column
+        self.sort_order  = order
+        self._sort_rows()
+        self.endResetModel()
+
+    def rowCount(self,parent=QtCore.QModelIndex()):
+        if(parent.isValid()):
+            return 0
+        return len(self.rows)
+
+    def columnCount(self,parent=QtCore.QModelIndex()):
+        if(parent.isValid()):
+            return 0
+        return self.model.columnCount()
+
+    def data(self,index,role=QtCore.Qt.DisplayRole):
+        if(not index.isValid()):
+            return None
+        item = self.model.item(self.rows[index.row()],index.column())
+        if(item is None):
+            return None
+        return item.data(role)
+
+    def headerData(self,section,orientation,role=QtCore.Qt.DisplayRole):
+        if(orientation == QtCore.Qt.Horizontal):
+            return self.model.headerData(section,orientation,role)
+        if(role == QtCore.Qt.DisplayRole):
+            return section + 1
+        return None
+
 class mainWidget(QtWidgets.QWidget):
     def __init__(self,logging_level=logging.INFO,within_qgis = False):
         QtWidgets.QWidget.__init__(self)        
         self.moorings = []
-        device_name = list(devices.keys())[0]
-        device = devices[device_name]        
-
+        self.plot_windows = [] # The open analysis windows, deleted when closed
+        self.basedir  = os.getcwd() # Relative data filenames are relative to this directory
+        self.catalog = self.create_catalog_model() # The device catalog shared by all moorings
+        self.create_catalog_watcher()
         self.allmoorings = self.create_allmoorings_widget()
         self.loadsave = self.create_loadsave_widget()                
+        self.mapview = self.create_map_widget()
+        # The map is drawn again when shown after the moorings table changed
+        self.allmoorings['table'].cellChanged.connect(self._map_cell_changed)
+        self.allmoorings['table'].model().rowsInserted.connect(self._map_stale)
+        self.allmoorings['table'].model().rowsRemoved.connect(self._map_stale)
         # Tabs
         self.tabs = QtWidgets.QTabWidget()
         self.tabs.setTabsClosable(True)
         self.tabs.tabCloseRequested.connect(self.remove_tab)
+        self.tabs.currentChanged.connect(self._tab_changed)
         self.tabs.addTab(self.allmoorings['widget'],'Moorings')        
         self.tabs.addTab(self.loadsave['widget'],'Load/Save')
+        self.tabs.addTab(self.mapview['widget'],'Map')
         tabbar = self.tabs.tabBar()
         tabbar.setTabButton(0, QtWidgets.QTabBar.RightSide,None) # Make them not closable
         tabbar.setTabButton(1, QtWidgets.QTabBar.RightSide,None) # Make them not closable
+        tabbar.setTabButton(2, QtWidgets.QTabBar.RightSide,None) # Make them not closable
 
         self.layout = QtWidgets.QGridLayout(self)
         self.layout.addWidget(self.tabs,2,0,1,2)
 
-        self.add_new_mooring(name='Test',depth=100) # device and device_name have to be removed, thats for the moment only
-        mooring_dict = self.create_mooring_dict()
-        self.plot_mooring_dict(mooring_dict['moorings'][0],dpi=300)
+    def create_catalog_model(self):
+        """ Creates the model of the device catalog, which is shared by the
+        device tables of all moorings, and its search index
+        """
+        catalog = {}
+        catalog['headers'] = ['Name','Company','Parameter']
+        catalog['model']   = QtGui.QStandardItemModel()
+        catalog['index']   = catalogIndex()
+        catalog['rows']    = {} # Device name to row in the model
+        self.catalog = catalog
+        self.update_catalog_model()
+        return catalog
+
+    def update_catalog_model(self):
+        """ Fills the catalog model and the search index with the devices
+        """
+        catalog = self.catalog
+        model = catalog['model']
+        model.clear()
+        model.setHorizontalHeaderLabels(catalog['headers'])
+        catalog['rows'] = {}
+        # The instruments first, then the mooring hardware
+        names = instrument_names(devices)
+        names += [dev for dev in devices if dev not in names]
+        for row,dev in enumerate(names):
+            device_dict = devices[dev]
+            parameter = device_dict.get('parameter',[])
+            if(isinstance(parameter,(list,tuple))):
+                parameter = ', '.join([str(par) for par in parameter])
+            if(is_hardware(dev,devices)):
+                parameter = 'Mooring hardware'
+            items = [QtGui.QStandardItem(dev),
+                     QtGui.QStandardItem(str(device_dict.get('company',''))),
+                     QtGui.QStandardItem(str(parameter))]
+            for item in items:
+                item.setEditable(False)
+            items[0].setData(dev,QtCore.Qt.UserRole)
+            model.appendRow(items)
+            catalog['rows'][dev] = row
+
+        catalog['index'].build(devices)
+        # Apply the search of the moorings to the new catalog
+        for mooring in self.moorings:
+            try:
+                self.filter_catalog(mooring,mooring['devsearch'].text())
+            except Exception as e:
+                print('Could not update catalog of mooring',e)
+
+    def create_catalog_watcher(self):
+        """ Watches the directories and files of the device catalog and
+        reloads changed files
+        """
+        self.catalog['watcher'] = QtCore.QFileSystemWatcher()
+        self.catalog['watcher'].directoryChanged.connect(self._catalog_path_changed)
+        self.catalog['watcher'].fileChanged.connect(self._catalog_path_changed)
+        # Files are often written in several steps, collect the changes before reloading
+        self.catalog['timer'] = QtCore.QTimer()
+        self.catalog['timer'].setSingleShot(True)
+        self.catalog['timer'].setInterval(500)
+        self.catalog['timer'].timeout.connect(self.reload_catalog)
+        self.update_catalog_watcher()
+
+    def update_catalog_watcher(self):
+        """ Adds all catalog directories and files to the watcher, editors
+        often replace files, which removes them from the watcher
+        """
+        watcher = self.catalog['watcher']
+        watched = set(watcher.directories()) | set(watcher.files())
+        paths = [d for d in device_catalog.directories if os.path.isdir(d)]
+        paths += list(device_catalog.files.keys())
+        paths = [p for p in paths if p not in watched]
+        if(len(paths) > 0):
+            watcher.addPaths(paths)
+
+    def _catalog_path_changed(self,path):
+        self.catalog['timer'].start()
+
+    def reload_catalog(self):
+        """ Rereads the changed files of the device catalog and updates the
+        catalog of all moorings
+        """
+        changed = device_catalog.rescan()
+        self.update_catalog_watcher()
+        if(len(changed) == 0):
+            return
+
+        self.show_status('Device catalog changed: ' + ', '.join(sorted(changed)))
+        for mooring in self.moorings:
+            # The widgets of changed devices are recreated when clicked
+            for name in changed:
+                device = mooring['catalog_devices'].pop(name,None)
+                if(device is not None):
+                    self.release_device_widget(mooring,device)
+
+        self.update_catalog_model()
+
+    def filter_catalog(self,mooring,text):
+        """ Shows only the catalog devices matching text in the device table of the mooring
+        """
+        names = self.catalog['index'].search(text)
+        if(names is None):
+            rows = None
+        else:
+            rows = set(self.catalog['rows'][name] for name in names)
+
+        mooring['devfilter'].set_rows(rows)
+
+    def get_catalog_device(self,mooring,device_name):
+        """ Returns the device of the catalog in the mooring, the device
+        widget is created when needed. Only the last shown catalog device
+        is kept, such that a mooring holds the widgets of its deployed
+        devices only
+        """
+        try:
+            device = mooring['catalog_devices'][device_name]
+        except KeyError:
+            for name in list(mooring['catalog_devices'].keys()):
+                self.release_device_widget(mooring,mooring['catalog_devices'].pop(name))
+            device = self.create_device_widget(mooring,device_name,devices[device_name])
+            mooring['catalog_devices'][device_name] = device
+
+        return device
+
+    def release_device_widget(self,mooring,device):
+        """ Removes a device, which is not part of the mooring (anymore), and frees its widgets
+        """
+        for i,dev in enumerate(mooring['devices']):
+            if(dev is device):
+                mooring['devices'].pop(i)
+                break
+        if(mooring['devwidget'] is device['widget']):
+            self.update_device_widget(mooring,self.create_empty_device_widget())
+        device['widget'].deleteLater()
 
     def create_loadsave_widget(self):
         mooring = {}
@@ -95,12 +349,111 @@ class mainWidget(QtWidgets.QWidget):
         mooring['csv'].clicked.connect(self.save_csv)
         mooring['geojson']    = QtWidgets.QPushButton('Export as geojson')
         mooring['geojson'].clicked.connect(self.save_geojson)        
+        mooring['plots']    = QtWidgets.QPushButton('Export plots')
+        mooring['plots'].setToolTip('A png plot of every mooring')
+        mooring['plots'].clicked.connect(self.save_plots)
+        mooring['iso']    = QtWidgets.QPushButton('Export as ISO 19115 XML')
+        mooring['iso'].setToolTip('All moorings with their devices as ISO 19115-2 records in one file')
+        mooring['iso'].clicked.connect(self.save_iso19115)
+        mooring['isodir']    = QtWidgets.QPushButton('Export as ISO 19115 XML files')
+        mooring['isodir'].setToolTip('Every mooring as ISO 19115-2 record in its own file')
+        mooring['isodir'].clicked.connect(self.save_iso19115_files)
+        mooring['importfiles']    = QtWidgets.QPushButton('Import files')
+        mooring['importfiles'].setToolTip('Add the moorings of several files, duplicate moorings are skipped')
+        mooring['importfiles'].clicked.connect(self.import_files)
+        mooring['importdir']    = QtWidgets.QPushButton('Import directory')
+        mooring['importdir'].setToolTip('Add the moorings of all files in a directory and its subdirectories, duplicate moorings are skipped')
+        mooring['importdir'].clicked.connect(self.import_directory)
         mooring['layout'].addWidget(mooring['load'])
+        mooring['layout'].addWidget(mooring['importfiles'])
+        mooring['layout'].addWidget(mooring['importdir'])
         mooring['layout'].addWidget(mooring['save'])
         mooring['layout'].addWidget(mooring['csv'])
         mooring['layout'].addWidget(mooring['geojson'])        
+        mooring['layout'].addWidget(mooring['plots'])
+        mooring['layout'].addWidget(mooring['iso'])
+        mooring['layout'].addWidget(mooring['isodir'])
         mooring['layout'].addStretch()
         return mooring
+
+    def create_map_widget(self):
+        """ The map of all moorings, the figure is created when the tab is shown the first time
+        """
+        mapview = {}
+        mapview['widget'] = QtWidgets.QWidget()
+        mapview['layout'] = QtWidgets.QVBoxLayout(mapview['widget'])
+        mapview['colorby'] = QtWidgets.QComboBox()
+        mapview['colorby'].addItems(['Campaign','Long term series'])
+        mapview['colorby'].currentIndexChanged.connect(self.update_map)
+        selectLayout = QtWidgets.QHBoxLayout()
+        selectLayout.addWidget(QtWidgets.QLabel('Colour by'))
+        selectLayout.addWidget(mapview['colorby'])
+        selectLayout.addStretch()
+        mapview['layout'].addLayout(selectLayout)
+        mapview['map'] = None
+        mapview['stale'] = True
+        return mapview
+
+    def _map_stale(self,*args):
+        self.mapview['stale'] = True
+
+    def _map_cell_changed(self,row,column):
+        """ Only the position and the grouping columns change the map
+        """
+        if(self.allmoorings['header_labels'][column] in ('Longitude','Latitude','Campaign','Long term series')):
+            self.mapview['stale'] = True
+
+    def update_map(self):
+        """ Draws the positions of all moorings of the moorings table into the map
+        """
+        mapview = self.mapview
+        first = mapview['map'] is None
+        if(first):
+            fig = Figure(dpi=72)
+            canvas = FigureCanvas(fig)
+            mapview['toolbar'] = NavigationToolbar(canvas, mapview['widget'])
+            mapview['layout'].addWidget(canvas)
+            mapview['layout'].addWidget(mapview['toolbar'])
+            mapview['canvas'] = canvas
+            mapview['map'] = mooringMap(fig)
+            canvas.mpl_connect('button_press_event',self._map_clicked)
+
+        table = self.allmoorings['table']
+        headers = self.allmoorings['headers']
+        group = headers[mapview['colorby'].currentText()]
+        nrows = table.rowCount()
+        lon = np.full(nrows,np.nan)
+        lat = np.full(nrows,np.nan)
+        groups = []
+        for i in range(nrows):
+            for arr,head in [(lon,'Longitude'),(lat,'Latitude')]:
+                item = table.item(i,headers[head])
+                try:
+                    arr[i] = float(item.text())
+                except (AttributeError,ValueError):
+                    pass
+            item = table.item(i,group)
+            groups.append('' if item is None else item.text().strip())
+
+        mapview['map'].set_positions(lon,lat,groups,zoom=first) # Keep the view of the user
+        mapview['canvas'].draw_idle()
+        mapview['stale'] = False
+
+    def _map_clicked(self,event):
+        """ Opens the tab of the mooring clicked on in the map
+        """
+        mapview = self.mapview
+        if((event.inaxes is not mapview['map'].ax) or mapview['toolbar'].mode or mapview['stale']):
+            return
+        row = mapview['map'].pick(event.xdata,event.ydata)
+        if(row is None):
+            return
+        item = self.allmoorings['table'].item(row,self.allmoorings['headers']['Name'])
+        mooring = getattr(item,'mooring',None)
+        if(mooring is None):
+            mooring = self.open_mooring(row)
+        self.tabs.setCurrentWidget(mooring['widget'])
+
     def create_allmoorings_widget(self):
         mooring = {}
         mooring['widget']     = QtWidgets.QWidget()
@@ -119,14 +472,38 @@ class mainWidget(QtWidgets.QWidget):
         mooring['remmoor'].clicked.connect(self.rem_mooring)
         mooring['resize']    = QtWidgets.QPushButton('Resize to fit')
         mooring['resize'].clicked.connect(self._resize_to_fit)                        
+        mooring['series']    = QtWidgets.QPushButton('Series')
+        mooring['series'].setToolTip('Coverage, gaps and overlaps of the long term series')
+        mooring['series'].clicked.connect(self.show_series)
+        mooring['serials']    = QtWidgets.QPushButton('Check serials')
+        mooring['serials'].setToolTip('Find instruments booked into overlapping deployments')
+        mooring['serials'].clicked.connect(self.check_serials)
+        mooring['scandata']    = QtWidgets.QPushButton('Scan data')
+        mooring['scandata'].setToolTip('Check and checksum the raw and processed data files of the devices')
+        mooring['scandata'].clicked.connect(self.scan_data)
+        mooring['coverage']    = QtWidgets.QPushButton('Coverage')
+        mooring['coverage'].setToolTip('Number of instruments per depth, time and parameter')
+        mooring['coverage'].clicked.connect(self.show_coverage)
+        mooring['adcpcoverage']    = QtWidgets.QPushButton('ADCP coverage')
+        mooring['adcpcoverage'].setToolTip('Water column covered by the ADCPs of all moorings')
+        mooring['adcpcoverage'].clicked.connect(self.show_adcp_coverage)
+        mooring['bulkedit']    = QtWidgets.QPushButton('Bulk edit')
+        mooring['bulkedit'].setToolTip('Change fields of all devices matching a query')
+        mooring['bulkedit'].clicked.connect(self.show_bulk_edit)
         # Layout
-        mooring['layout'].addWidget(mooring['table'],0,0,1,3)
+        mooring['layout'].addWidget(mooring['table'],0,0,1,6)
         mooring['layout'].addWidget(mooring['addmoor'],1,0)
         mooring['layout'].addWidget(mooring['remmoor'],2,0)
         mooring['layout'].addWidget(mooring['edmoor'],1,1)
         mooring['layout'].addWidget(mooring['resize'],2,1)        
         mooring['layout'].addWidget(mooring['addrmoor'],1,2)
         mooring['layout'].addWidget(mooring['adpimoor'],2,2)                
+        mooring['layout'].addWidget(mooring['series'],1,3)
+        mooring['layout'].addWidget(mooring['serials'],2,3)
+        mooring['layout'].addWidget(mooring['scandata'],1,4)
+        mooring['layout'].addWidget(mooring['coverage'],2,4)
+        mooring['layout'].addWidget(mooring['adcpcoverage'],1,5)
+        mooring['layout'].addWidget(mooring['bulkedit'],2,5)
 
 
         # Creates the mooring table
@@ -141,6 +518,7 @@ class mainWidget(QtWidgets.QWidget):
         mooring['headers']['Latitude']  = 6
         mooring['headers']['Campaign']  = 7        
         mooring['headers']['Comment']   = 8
+        mooring['headers']['Data']      = 9 # Status of the data files of the devices
         table.setColumnCount(len(mooring['headers']))
         hlabels = list(mooring['headers'])
         mooring['header_labels'] = hlabels
@@ -158,8 +536,22 @@ class mainWidget(QtWidgets.QWidget):
         mooring['name']         = mooring_name
         mooring['widget']       = QtWidgets.QWidget()
         mooring['layout']       = QtWidgets.QGridLayout(mooring['widget'])
-        mooring['devtable']     = QtWidgets.QTableWidget() # Table with all available devices to choose from
-        mooring['devtable'].cellClicked.connect(self._table_cell_was_clicked)
+        # Table with all available devices to choose from, a filtered view of the shared catalog model
+        mooring['devfilter']    = deviceCatalogFilter(self.catalog['model'])
+        mooring['devtable']     = QtWidgets.QTableView()
+        mooring['devtable'].setModel(mooring['devfilter'])
+        mooring['devtable'].setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        mooring['devtable'].setSortingEnabled(True)
+        mooring['devtable'].clicked.connect(self._catalog_cell_was_clicked)
+        mooring['devsearch']    = QtWidgets.QLineEdit() # Search as you type in the catalog
+        mooring['devsearch'].setPlaceholderText('Search name, company, parameter')
+        mooring['devsearch'].textChanged.connect(self._catalog_search_changed)
+        mooring['devsearch'].mooring = mooring
+        mooring['catalog_devices'] = {} # The device widgets of the catalog, created when clicked
+        devtablewidget = QtWidgets.QWidget()
+        devtablelayout = QtWidgets.QVBoxLayout(devtablewidget)
+        devtablelayout.addWidget(mooring['devsearch'])
+        devtablelayout.addWidget(mooring['devtable'])
         mooring['devwidget']    = QtWidgets.QWidget() # Special widget to enter parameters for that device, this is a dummy
         # Putting the widget into a scrollWidget
         mooring['scrollwidget'] = QtWidgets.QScrollArea()
@@ -218,37 +610,46 @@ class mainWidget(QtWidgets.QWidget):
         moortablelayout.addWidget(mooring['moorbasicbutton'],0,0)                
         moortablelayout.addWidget(mooring['moortable'],1,0)
         moortablelayout.addWidget(mooring['moorplotbutton'],2,0)        
+        # Read the headers of the raw data files
+        mooring['moorheadersbutton']            = QtWidgets.QPushButton('Read data file headers')
+        mooring['moorheadersbutton'].setToolTip('Fill in serial numbers, sampling intervals etc. from the headers of the raw data files')
+        mooring['moorheadersbutton'].clicked.connect(self.read_headers_of_mooring)
+        mooring['moorheadersbutton'].mooring    = mooring
+        moortablelayout.addWidget(mooring['moorheadersbutton'],3,0)
+        # Static mechanics of the mooring
+        mooring['moormechbutton']               = QtWidgets.QPushButton('Mechanics')
+        mooring['moormechbutton'].setToolTip('Tension, inclination and knockdown of the devices in currents')
+        mooring['moormechbutton'].clicked.connect(self.show_mechanics)
+        mooring['moormechbutton'].mooring       = mooring
+        moortablelayout.addWidget(mooring['moormechbutton'],4,0)
+        # Plot of the mooring, updated when devices or the depth change
+        mooring['plotfig']    = Figure(dpi=72)
+        mooring['plotcanvas'] = FigureCanvas(mooring['plotfig'])
+        mooring['plotcanvas'].setMinimumHeight(150)
+        mooring['plot']       = mooringPlot(mooring['plotfig'])
+        mooring['plotstale']  = True
+        leftsplitter = QtWidgets.QSplitter(QtCore.Qt.Vertical)
+        leftsplitter.addWidget(moortablewidget)
+        leftsplitter.addWidget(mooring['plotcanvas'])
         
         splitter = QtWidgets.QSplitter(QtCore.Qt.Horizontal)
-        splitter.addWidget(moortablewidget)
+        splitter.addWidget(leftsplitter)
         #splitter.addWidget(mooring['devwidget'])
         splitter.addWidget(mooring['scrollwidget'])
-        splitter.addWidget(mooring['devtable'])
+        splitter.addWidget(devtablewidget)
         mooring['splitter'] = splitter
         mooring['layout'].addWidget(splitter)
         #mooring['layout'].addWidget(mooring['moortable'],0,0)
         #mooring['layout'].addWidget(mooring['devwidget'],0,1)
         #mooring['layout'].addWidget(mooring['devtable'],0,2)
         
-        # Fill the devices table
+        # The devices table
         mooring['devtable'].mooring = mooring # Self reference for easy use later      
-        table = mooring['devtable']
-        table.setColumnCount(1)
-        table.setHorizontalHeaderLabels(['Name'])
-        nrows = len(devices)
-        for row,dev in enumerate(devices):
-            item = QtWidgets.QTableWidgetItem( dev )
-            # Add the device dictionary to the item, easy for referencing later
-            item.device_dict = devices[dev]
-            item.device_name = dev
-            item.device = self.create_device_widget(mooring, item.device_name, item.device_dict)            
-            table.insertRow(row)
-            table.setItem(row,0,item)
-
-
-        # Adding a test device        
-        self.update_device_widget(mooring, item.device)
-        table.resizeColumnsToContents()
+        mooring['devtable'].horizontalHeader().setStretchLastSection(True) # Resizing to contents would query the whole catalog
+        # Show the first device of the catalog
+        if(len(devices) > 0):
+            device = self.get_catalog_device(mooring,list(devices.keys())[0])
+            self.update_device_widget(mooring, device)
 
         # Create a blank mooring table
         table = mooring['moortable']
@@ -331,7 +732,8 @@ class mainWidget(QtWidgets.QWidget):
     def update_device_widget(self,mooring,device_new):
         """ updates the device widget with a new one
         """
-        mooring['devwidget'].hide()
+        devwidget_old = mooring['devwidget']
+        devwidget_old.hide()
         mooring['devwidget'] = device_new['widget']        
         w = mooring['widget'].frameGeometry().width()
         h = mooring['widget'].frameGeometry().height()
@@ -339,6 +741,11 @@ class mainWidget(QtWidgets.QWidget):
         ## Putting the widget into a scrollWidget
         mooring['scrollwidget'].takeWidget()        
         mooring['scrollwidget'].setWidget(mooring['devwidget'])
+        # Free the old widget, if it is not the one of a device or the basic data
+        keep = (devwidget_old is mooring['devwidget']) or (devwidget_old is mooring['moorbasicwidget'])
+        keep = keep or any(dev['widget'] is devwidget_old for dev in mooring['devices'])
+        if(not keep):
+            devwidget_old.deleteLater()
         mooring['devwidget'].show()
         mooring['splitter'].setSizes([splitter_width, splitter_width,splitter_width])
     
@@ -348,7 +755,15 @@ class mainWidget(QtWidgets.QWidget):
         device = {}
         device['widget']    = QtWidgets.QWidget() # Special widget to enter parameters for that device        
         device['name'] = device_name
-        device['device_dict'] = device_dict.copy()
+        # The catalog entry is shared as template, the device stores only its own fields
+        template = devices.get(device_name,{})
+        if(isinstance(device_dict,deviceDict)):
+            device['device_dict'] = device_dict.copy()
+        elif((device_dict is template) or (len(template) == 0)):
+            device['device_dict'] = deviceDict(device_dict)
+        else: # E.g. a device of a mooring file
+            device['device_dict'] = deviceDict(template,device_dict)
+        template = device['device_dict'].template
         device['device_widgets'] = {} # A dictionary with the same form as device_dict but with the responsible widgets in it
         # Name of the device and add button
         mooring['devices'].append(device)        
@@ -359,7 +774,7 @@ class mainWidget(QtWidgets.QWidget):
         device['add'].mooring  = mooring # This is a self reference to get the mooring by looking at the sender
         device['add'].device   = device  # This is a self reference to get the device by looking at the sender
         #device['widget_layout'].addWidget(device['add'])                            
-        device['add'].clicked.connect(self.add_device_to_mooring)
+        device['add'].clicked.connect(self.add_device_to_mooring_wrapper)
         
         device['widget_layout'].addRow(lab,device['add'])
         # Label
@@ -367,7 +782,7 @@ class mainWidget(QtWidgets.QWidget):
         lab.setToolTip('A custom name or description of the device')  
         labed = QtWidgets.QLineEdit()
         if('label' in device['device_dict']):
-            sered.setText(str(device['device_dict']['label']))
+            labed.setText(str(device['device_dict']['label']))
         else:
             device['device_dict']['label'] = ''
 
@@ -380,8 +795,8 @@ class mainWidget(QtWidgets.QWidget):
             sered.setText(str(device['device_dict']['Serial Number']))
         else:
             device['device_dict']['Serial Number'] = ''
-            device['device_widgets']['Serial Number'] = sered
-            
+
+        device['device_widgets']['Serial Number'] = sered
         device['widget_layout'].addRow(lab,sered)
         # Depth
         lab = QtWidgets.QLabel('Location')
@@ -393,7 +808,12 @@ class mainWidget(QtWidgets.QWidget):
         locref.addItems(['Depth','Above bottom'])
         layout = QtWidgets.QHBoxLayout()
         if('location' in device['device_dict']):
-            sered.setText(str(device['device_dict']['location']))
+            location = str(device['device_dict']['location']).strip()
+            value,ref = parse_location(location)
+            if(location.lower().endswith(ref.lower())):
+                location = location[:len(location)-len(ref)].strip()
+            loced.setText(location)
+            locref.setCurrentIndex(max(locref.findText(ref),0))
         else:
             device['device_dict']['location'] = ''
 
@@ -403,70 +823,203 @@ class mainWidget(QtWidgets.QWidget):
         device['widget_layout'].addRow(lab,layout)
 
         # Add raw data files
-        if('raw_data' in device['device_dict']):
-            sered.setText(str(device['device_dict']['raw_data']))
-        else:
+        if('raw_data' not in device['device_dict']):
             device['device_dict']['raw_data'] = ''
 
         lab = QtWidgets.QLabel('Raw data')
-        dataed = QtWidgets.QLineEdit()
+        dataed = QtWidgets.QLineEdit(str(device['device_dict']['raw_data']))
         dataref = QtWidgets.QPushButton('File(s)')
+        dataref.setToolTip('Choose the raw data files, the metadata in their headers is filled in')
+        dataref.clicked.connect(self.choose_data_files)
+        dataref.lineedit = dataed
+        dataref.mooring  = mooring
+        dataref.device   = device
+        dataref.sniff    = True # Read the headers of the files
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(dataed)
         layout.addWidget(dataref)                
         device['widget_layout'].addRow(lab,layout)
         device['device_widgets']['raw_data'] = dataed
         # Add processed data files
-        if('processed_data' in device['device_dict']):
-            sered.setText(str(device['device_dict']['processed_data']))
-        else:
+        if('processed_data' not in device['device_dict']):
             device['device_dict']['processed_data'] = ''
 
         lab = QtWidgets.QLabel('Processed data')
-        dataed = QtWidgets.QLineEdit()
+        dataed = QtWidgets.QLineEdit(str(device['device_dict']['processed_data']))
         dataref = QtWidgets.QPushButton('File(s)')
+        dataref.clicked.connect(self.choose_data_files)
+        dataref.lineedit = dataed
+        dataref.mooring  = mooring
+        dataref.device   = device
+        dataref.sniff    = False
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(dataed)
         layout.addWidget(dataref)                
         device['widget_layout'].addRow(lab,layout)
         device['device_widgets']['processed_data'] = dataed        
-        # All other dicts without special treatment
-        for i,k in enumerate(device_dict.keys()):
+        # First and last sample, typically read from the headers of the raw data
+        for k,labtext in [('first_sample','First sample'),('last_sample','Last sample')]:
+            lab = QtWidgets.QLabel(labtext)
+            sampleed = QtWidgets.QLineEdit()
+            if(k in device['device_dict']):
+                sampleed.setText(str(device['device_dict'][k]))
+            else:
+                device['device_dict'][k] = ''
+
+            device['device_widgets'][k] = sampleed
+            device['widget_layout'].addRow(lab,sampleed)
+        # All other dicts without special treatment, the choices (options,
+        # parameters) come from the template, the values from the device
+        for i,k in enumerate(device['device_dict'].keys()):
+            if((k in device['device_widgets']) or (k in CATALOG_FIELDS)):
+                continue
+            value = device['device_dict'][k]
+            choices = template.get(k,value)
             if(k.lower() == 'parameter'):
                 lab2 = QtWidgets.QLabel('Parameter')
                 device['widget_layout'].addRow(lab2)
                 device['device_widgets']['parameter'] = {}                
-                for par in device_dict[k]:
+                for par in choices:
                     lab2 = QtWidgets.QLabel(par)
                     parcheck = QtWidgets.QCheckBox()
-                    parcheck.setCheckState(True)
                     parcheck.setTristate(False)
+                    parcheck.setChecked(par in value)
                     device['device_widgets']['parameter'][par] = parcheck 
                     device['widget_layout'].addRow(lab2,parcheck)
             else:
-                try:
-                    device_dict[k]['options']
-                    HAS_OPTION = True
-                except:
-                    HAS_OPTION = False
-
-                print(device_dict[k],HAS_OPTION)
+                HAS_OPTION = isinstance(choices,dict) and ('options' in choices)
                 if(HAS_OPTION):
                     optcombo = QtWidgets.QComboBox()
-                    for op in device_dict[k]['options']:
+                    for op in choices['options']:
                         optcombo.addItem(str(op))
+                    if(not isinstance(value,dict)): # A chosen option
+                        optcombo.setCurrentIndex(max(optcombo.findText(str(value)),0))
 
                     lab2 = QtWidgets.QLabel(k)
                     device['device_widgets'][k] = optcombo
                     device['widget_layout'].addRow(lab2,optcombo)
                 else:
                     lab2 = QtWidgets.QLabel(k)
-                    lineed = QtWidgets.QLineEdit(str(device_dict[k]))
+                    lineed = QtWidgets.QLineEdit(str(value))
                     device['device_widgets'][k] = lineed
                     device['widget_layout'].addRow(lab2,lineed)                    
 
         return device
 
+    def set_device_field(self,device,key,value):
+        """ Sets the widget of the device field key to value, returns
+        False if the field does not exist or value is not a valid option
+        """
+        widget = device['device_widgets'].get(key,None)
+        if(widget is None):
+            return False
+        if(isinstance(widget,list)): # Location, value and reference system
+            if(isinstance(value,(list,tuple))):
+                value,ref = value
+            else:
+                value,ref = parse_location(value)
+            widget[0].setText('' if value is None else str(value))
+            index = widget[1].findText(ref)
+            if(index >= 0):
+                widget[1].setCurrentIndex(index)
+        elif(isinstance(widget,dict)): # Parameter, a checkbox per parameter
+            if(not all(str(par) in widget for par in value)):
+                return False
+            for par in widget:
+                widget[par].setChecked(par in [str(p) for p in value])
+        elif(isinstance(widget,QtWidgets.QComboBox)):
+            index = widget.findText(str(value))
+            if(index < 0):
+                return False
+            widget.setCurrentIndex(index)
+        elif(isinstance(widget,QtWidgets.QLineEdit)):
+            widget.setText(str(value))
+        else:
+            return False
+
+        return True
+
+    def add_device_field(self,device,key,value):
+        """ Adds the field key, which is not in the catalog entry of the device, as line edit
+        """
+        device['device_dict'][key] = value
+        lineed = QtWidgets.QLineEdit(str(value))
+        device['device_widgets'][key] = lineed
+        device['widget_layout'].addRow(QtWidgets.QLabel(key),lineed)
+
+    def choose_data_files(self):
+        """ Lets the user choose data files of a device, the headers of
+        raw data files are read to fill in the device metadata
+        """
+        button = self.sender()
+        filenames,extension = QtWidgets.QFileDialog.getOpenFileNames(self,"Choose data files",self.basedir,"All Files (*)")
+        if(len(filenames) == 0):
+            return
+        # Relative to the directory of the mooring file, if possible
+        paths = []
+        for f in filenames:
+            try:
+                rel = os.path.relpath(f,self.basedir)
+            except ValueError: # Different drive
+                rel = f
+            paths.append(f if rel.startswith('..') else rel)
+
+        button.lineedit.setText('; '.join(paths))
+        if(button.sniff):
+            infos = sniff_files(filenames)
+            self.fill_device_from_headers(button.mooring,button.device,infos.values())
+
+    def fill_device_from_headers(self,mooring,device,infos):
+        """ Fills the device fields with the header information of its
+        raw data files, returns the names of the fields filled
+        """
+        info = merge_infos(infos)
+        if(('device' in info) and (info['device'] != device['name'])):
+            print('Data files of {:s} look like {:s} files'.format(device['name'],info['device']))
+        filled = []
+        for k,v in device_fields_from_info(device['device_dict'],info).items():
+            if(k not in device['device_widgets']): # Not in the catalog entry of the device
+                self.add_device_field(device,k,v)
+                filled.append(k)
+            elif(self.set_device_field(device,k,v)):
+                filled.append(k)
+
+        if(len(filled) > 0):
+            self.update_mooring_table(mooring)
+        return filled
+
+    def read_headers_of_mooring(self):
+        """ Reads the headers of the raw data files of all devices of a
+        mooring in parallel and fills in the device metadata
+        """
+        mooring = self.sender().mooring
+        table = mooring['moortable']
+        mooring_devices = []
+        filenames = []
+        for row in range(table.rowCount()):
+            item = table.item(row,mooring['moortable_headers']['Device'])
+            device = getattr(item,'device',None)
+            if(device is None): # The bottom
+                continue
+            files = resolve_paths(device['device_widgets']['raw_data'].text(),self.basedir)
+            mooring_devices.append((device,files))
+            filenames.extend(files)
+
+        infos = sniff_files([f for f in set(filenames) if os.path.isfile(f)])
+        nfilled = 0
+        for device,files in mooring_devices:
+            if(len(self.fill_device_from_headers(mooring,device,[infos.get(f,None) for f in files])) > 0):
+                nfilled += 1
+
+        msg = QtWidgets.QMessageBox()
+        msg.setIcon(QtWidgets.QMessageBox.Information)
+        msg.setText('Read {:d} files, filled in the metadata of {:d} of {:d} devices'.format(
+            len(infos),nfilled,len(mooring_devices)))
+        errors = ['{:s}: {:s}'.format(f,info['error']) for f,info in infos.items() if (info is not None) and ('error' in info)]
+        unknown = [f for f,info in infos.items() if info is None]
+        if(len(errors) + len(unknown) > 0):
+            msg.setDetailedText('\n'.join(errors + ['Unknown format: ' + f for f in unknown]))
+        retval = msg.exec_()
 
     def create_empty_device_widget(self):
         """  Creates a device with all necessary widgets into the mooring dict
@@ -483,6 +1036,8 @@ class mainWidget(QtWidgets.QWidget):
         """
         devdict = {}
         for i,k in enumerate(device['device_dict'].keys()):
+            if(k in CATALOG_FIELDS):
+                continue
             d = device['device_widgets'][k]
             #print('D:',d)
             #print(i,k)
@@ -527,9 +1082,10 @@ class mainWidget(QtWidgets.QWidget):
             if(dev == device):
                 print('Found device! Will remove it',i)
                 dtable.removeRow(i)
-                device_blank = self.create_empty_device_widget()
-                self.update_device_widget(mooring, device_blank)                
+                self.release_device_widget(mooring,device)
+                self.update_mooring_plot(mooring)
                 # TODO, could save the removed devices
+                break
 
     def sort_devices_in_mooring(self):
         """
@@ -553,14 +1109,17 @@ class mainWidget(QtWidgets.QWidget):
         if True:
             # Calculate depth/MAB of all devices listed
             rows = table.rowCount()        
-            for row in range(rows-1): # The last one is the bottom
+            for row in range(rows):
                 devitem = table.item(row,mooring['moortable_headers']['Device'])
                 print('row',row,devitem.text())
-                devtmp  = devitem.device
+                devtmp  = getattr(devitem,'device',None)
+                if(devtmp is None): # The bottom
+                    table.setItem(row,mooring['moortable_headers']['Depth'],QCustomTableWidgetItem(depth))
+                    continue
                 try:
                     depthtmp = float(devtmp['device_widgets']['location'][0].text())
                 except Exception as e:
-                    depthtmp = np.NaN
+                    depthtmp = np.nan
 
                 # Check if we have depth or MAB
                 refsystem = devtmp['device_widgets']['location'][1].currentText()
@@ -583,17 +1142,31 @@ class mainWidget(QtWidgets.QWidget):
 
         table.setSortingEnabled(True)
         table.sortByColumn(0,0)
+        self.update_mooring_plot(mooring)
+
+    def update_mooring_plot(self,mooring):
+        """ Updates the plot pane of the mooring, a hidden plot is updated when its tab is shown
+        """
+        if(not mooring['plotcanvas'].isVisible()):
+            mooring['plotstale'] = True
+            return
+        mooring_dict = {'name':mooring['name'],'depth':mooring['depth'],'devices':self.get_devices_of_mooring(mooring)}
+        mooring['plot'].update(mooring_dict)
+        mooring['plotstale'] = False
                 
-    def add_device_to_mooring(self):
-        print('Add')
+    def add_device_to_mooring_wrapper(self):
         # The mooring and device are references for convenience in create_device_widget
-        mooring      = self.sender().mooring
-        device       = self.sender().device
+        self.add_device_to_mooring(self.sender().mooring,self.sender().device)
+
+    def add_device_to_mooring(self,mooring,device):
+        """ Adds the device to the mooring table of mooring
+        """
+        print('Add')
         depth        = mooring['depth']
         #device_orig = self.sender().device        
         #device_dict = self.create_dict_from_device(device_orig)
         #device      = self.create_device_widget(mooring,device_dict['name'],device_dict)
-        print(self.sender().mooring['name'])
+        print(mooring['name'])
         table = mooring['moortable']
         table.setSortingEnabled(False)        
         # Add new device (later a sorting will be done)
@@ -606,25 +1179,15 @@ class mainWidget(QtWidgets.QWidget):
 
         # Change the add button
         device['add'].setText('Remove from mooring')
-        device['add'].clicked.disconnect(self.add_device_to_mooring)
+        device['add'].clicked.disconnect(self.add_device_to_mooring_wrapper)
         device['add'].clicked.connect(self.rem_device_to_mooring)
-        # Check if the device is referenced in the devtable, if so replace it with None
-        dtable = mooring['devtable']
-        for i in range(dtable.rowCount()):
-            print(i)
-            try:
-                dev = dtable.item(i,0).device
-            except:
-                dev = None
-
-            # Found a device, will replace it with None
-            if(dev == device):
+        # Check if the device is referenced in the catalog, if so remove it, a new one is created when clicked again
+        for name,dev in list(mooring['catalog_devices'].items()):
+            # Found a device, will replace it with a blank one
+            if(dev is device):
                 print('Found device! Will replace it')
-                #device_blank = self.create_device_widget(mooring,device['name'],device['device_dict'].copy()) # Create a blank device to replace the original one                
+                mooring['catalog_devices'].pop(name)
                 device_blank = self.create_empty_device_widget()                                                
-                item = dtable.takeItem(i,0)
-                item.device = None
-                dtable.setItem(i,0,item)
                 self.update_device_widget(mooring, device_blank)        
                 
         self.update_mooring_table(mooring)
@@ -645,45 +1208,100 @@ class mainWidget(QtWidgets.QWidget):
     def plot_mooring(self):
         """
         """
-        # This is a bit clumsy, we first create a dict of all mooring
-        # and search then for the correct one 
-        mooring_plot = self.sender().mooring
-        mooring_dict_all = self.create_mooring_dict()
-        table = self.allmoorings['table']        
-        nrows = table.rowCount()
-        ncols = table.columnCount()
+        mooring = self.sender().mooring
+        mooring_dict = self.get_mooring_dict(mooring)
+        if(mooring_dict is None):
+            return
+        print('Plotting mooring')
+        # A mooring has one plot window, which is closed with the mooring
+        self.close_plot_window(mooring)
+        mooring['plotwidget'] = self.plot_mooring_dict(mooring_dict)
 
-        for i in range(nrows):
-            mooring_dict = {}
-            # Devices
-            if True:
-                try:
-                   mooring = table.item(i,self.allmoorings['headers']['Name']).mooring
-                   HAS_MOORING = True
-                except Exception as e:
-                   HAS_MOORING = False
-                   print('mooring save',e)
+    def close_plot_window(self,mooring):
+        """ Closes the plot window of the mooring, if open
+        """
+        figwidget = mooring.pop('plotwidget',None)
+        if((figwidget is not None) and (not isdeleted(figwidget))):
+            figwidget.close()
 
-                if HAS_MOORING:
-                   print('Has mooring')
-                   if(mooring_plot == mooring):
-                       print('Plotting mooring')
-                       mooring_dict = mooring_dict_all['moorings'][i]
-                       self.plot_mooring_dict(mooring_dict)
 
+    def get_mooring_dict(self,mooring):
+        """ Returns the dictionary of the mooring widget mooring or None
+        """
+        mooring_dict_all = self.create_mooring_dict()
+        table = self.allmoorings['table']
+        for i in range(table.rowCount()):
+            item = table.item(i,self.allmoorings['headers']['Name'])
+            if(getattr(item,'mooring',None) is mooring):
+                return mooring_dict_all['moorings'][i]
+
+        return None
+
+    def show_mechanics(self):
+        """ Computes tension, inclination and knockdown of the devices of
+        a mooring for currents decreasing linearly from the surface speed
+        to 20% of it at the bottom
+        """
+        mooring_dict = self.get_mooring_dict(self.sender().mooring)
+        if(mooring_dict is None):
+            return
+        speeds = SURFACE_SPEEDS
+        try:
+            elements = mooring_elements(mooring_dict)
+        except ValueError as e:
+            msg = QtWidgets.QMessageBox()
+            msg.setIcon(QtWidgets.QMessageBox.Warning)
+            msg.setInformativeText(str(e))
+            retval = msg.exec_()
+            return
+        zprof,uprof = linear_scenarios(elements['depth'],speeds)
+        result = solve_static(elements,zprof,uprof)
+        figwidget = self.create_plot_window('Mechanics of ' + str(mooring_dict['name']),(8,8),mechanics_report(elements,result,speeds))
+        plot_mechanics(elements,result,speeds,figwidget.fig)
+        figwidget.canvas.draw()
+        figwidget.show()
+
+    def create_plot_window(self,title,size=None,report=None,controls=None):
+        """ Creates a window with a matplotlib figure, its toolbar and
+        optionally a layout of controls above and a read only text report
+        below the figure. The window is kept in plot_windows until it is
+        closed, then it is deleted. The figure and the canvas are the
+        attributes fig and canvas of the returned window
+        """
+        fig       = Figure()
+        if(size is not None):
+            fig.set_size_inches(size[0],size[1])
+        figwidget = QtWidgets.QWidget()
+        figwidget.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        figwidget.setWindowTitle(title)
+        canvas    = FigureCanvas(fig)
+        canvas.setParent(figwidget)
+        figwidget.fig = fig
+        figwidget.canvas = canvas
+        plotLayout = QtWidgets.QVBoxLayout()
+        figwidget.setLayout(plotLayout)
+        if(controls is not None):
+            plotLayout.addLayout(controls)
+        plotLayout.addWidget(canvas)
+        mpl_toolbar = NavigationToolbar(canvas, figwidget)
+        plotLayout.addWidget(mpl_toolbar)
+        if(report is not None):
+            figwidget.report = QtWidgets.QPlainTextEdit(report)
+            figwidget.report.setReadOnly(True)
+            plotLayout.addWidget(figwidget.report)
+        self.plot_windows.append(figwidget)
+        figwidget.destroyed.connect(lambda obj=None,w=figwidget: self.plot_windows.remove(w))
+        return figwidget
 
     def plot_mooring_dict(self,mooring_dict,dpi=300):
-        """ Plots a mooring dictionary using matplotlib
+        """ Plots a mooring dictionary using matplotlib, returns the
+        window, which is deleted when closed
         """
         name  = mooring_dict['name']
-        depth = float(mooring_dict['depth'])
-        surface = 0
-        if(depth < surface):
-            surface = depth - 10
-            
         fig       = Figure(dpi=dpi)
         fig.set_size_inches(10,10)
         figwidget = QtWidgets.QWidget()
+        figwidget.setAttribute(QtCore.Qt.WA_DeleteOnClose)
         figwidget.setWindowTitle(name)
         canvas    = FigureCanvas(fig)
         canvas.setParent(figwidget)
@@ -694,20 +1312,280 @@ class mainWidget(QtWidgets.QWidget):
         mpl_toolbar = NavigationToolbar(canvas, figwidget)
         plotLayout.addWidget(mpl_toolbar)
 
-        # Plot the mooring
-        ax = fig.add_axes([.1,.1,.8,.8])
-        ax.plot([-.5,.5],[depth,depth],'-',color='grey',lw=4)
-        ax.plot([-.5,.5],[surface,surface],'-',color='b',lw=4)
-        YL = surface - depth
-        print([-1,1],[depth-YL/10,surface+YL/10])
-        ax.set_xlim([-1,1])
-        ax.set_ylim([depth-YL/10,surface+YL/10])
-        ax.set_ylabel('Depth [m]')
-        
+        # Plot the mooring, with the profiled ranges and side lobe zones of the ADCPs
+        mooringPlot(fig,animated=False).update(mooring_dict)
         canvas.draw()        
         figwidget.show()        
+        return figwidget
         
 
+    def show_series(self):
+        """ Shows a timeline and a report of coverage, gaps and overlaps of
+        all long term series
+        """
+        data = self.create_mooring_dict(with_devices=False)
+        results = analyze_series(data)
+        figwidget = self.create_plot_window('Long term series',(10,max(3,len(results)/3)),timeline_report(results))
+        plot_series_timeline(results,figwidget.fig)
+        figwidget.canvas.draw()
+        figwidget.show()
+
+    def show_coverage(self):
+        """ Shows the number of instruments per depth and time as heatmap,
+        for every campaign and parameter
+        """
+        data = self.create_mooring_dict()
+        coverage = {'All campaigns':coverage_matrix(collect_instruments(data))}
+        coverage.update(campaign_coverage(data))
+        selectLayout = QtWidgets.QHBoxLayout()
+        figwidget = self.create_plot_window('Coverage',controls=selectLayout)
+        figwidget.coverage = coverage
+        figwidget.campaign_combo = QtWidgets.QComboBox()
+        figwidget.campaign_combo.addItems(list(coverage.keys()))
+        figwidget.parameter_combo = QtWidgets.QComboBox()
+        figwidget.parameter_combo.addItems(['All parameters'] + coverage['All campaigns']['parameters'])
+        savebutton = QtWidgets.QPushButton('Save')
+        savebutton.setToolTip('Save the coverage matrix as compressed numpy file')
+        savebutton.clicked.connect(self._save_coverage)
+        savebutton.figwidget = figwidget
+        for w in [figwidget.campaign_combo,figwidget.parameter_combo]:
+            w.figwidget = figwidget
+            w.currentIndexChanged.connect(self._plot_coverage)
+        selectLayout.addWidget(figwidget.campaign_combo)
+        selectLayout.addWidget(figwidget.parameter_combo)
+        selectLayout.addWidget(savebutton)
+        self._plot_coverage(figwidget=figwidget)
+        figwidget.show()
+
+    def _plot_coverage(self,index=None,figwidget=None):
+        if(figwidget is None):
+            figwidget = self.sender().figwidget
+        result = figwidget.coverage[figwidget.campaign_combo.currentText()]
+        parameter = figwidget.parameter_combo.currentText()
+        if(parameter not in result['parameters']):
+            parameter = None
+        figwidget.fig.clf()
+        plot_coverage(result,parameter,figwidget.fig)
+        figwidget.canvas.draw()
+
+    def _save_coverage(self):
+        figwidget = self.sender().figwidget
+        filename,extension  = QtWidgets.QFileDialog.getSaveFileName(self,"Choose file for coverage matrix","","Numpy Files (*.npz);;All Files (*)")
+        if(len(filename) == 0):
+            return
+        save_coverage(filename,figwidget.coverage[figwidget.campaign_combo.currentText()])
+
+    def show_adcp_coverage(self):
+        """ Shows the water column covered by valid ADCP bins for all moorings
+        """
+        data = self.create_mooring_dict()
+        result = campaign_adcp_coverage(data)
+        figwidget = self.create_plot_window('ADCP coverage',(10,8),adcp_report(result))
+        plot_campaign_adcp_coverage(result,figwidget.fig)
+        figwidget.canvas.draw()
+        figwidget.show()
+
+    def check_serials(self):
+        """ Checks if instruments are booked into overlapping deployments
+        """
+        data = self.create_mooring_dict()
+        inventory = build_inventory(data)
+        conflicts = find_double_bookings(inventory)
+        msg = QtWidgets.QMessageBox()
+        if(len(conflicts) == 0):
+            msg.setIcon(QtWidgets.QMessageBox.Information)
+            msg.setText('No double bookings of the {:d} instruments found'.format(len(inventory)))
+        else:
+            msg.setIcon(QtWidgets.QMessageBox.Warning)
+            msg.setText('{:d} double bookings of instruments found'.format(len(conflicts)))
+            msg.setDetailedText(conflict_report(conflicts))
+        retval = msg.exec_()
+
+    def show_bulk_edit(self):
+        """ Shows a window to change fields of all devices matching a query
+        """
+        widget = QtWidgets.QWidget()
+        widget.setWindowTitle('Bulk edit of devices')
+        layout = QtWidgets.QFormLayout(widget)
+        widget.query = {}
+        widget.query['name'] = QtWidgets.QComboBox()
+        widget.query['name'].addItems([''] + sorted(instrument_names(devices)))
+        layout.addRow(QtWidgets.QLabel('Device'),widget.query['name'])
+        widget.query['company'] = QtWidgets.QLineEdit()
+        widget.query['company'].setToolTip('Part of the company name')
+        layout.addRow(QtWidgets.QLabel('Company'),widget.query['company'])
+        widget.query['parameter'] = QtWidgets.QLineEdit()
+        layout.addRow(QtWidgets.QLabel('Parameter'),widget.query['parameter'])
+        campaigns = set()
+        table = self.allmoorings['table']
+        for i in range(table.rowCount()):
+            item = table.item(i,self.allmoorings['headers']['Campaign'])
+            if((item is not None) and (len(item.text().strip()) > 0)):
+                campaigns.add(item.text().strip())
+        widget.query['campaign'] = QtWidgets.QComboBox()
+        widget.query['campaign'].addItems([''] + sorted(campaigns))
+        layout.addRow(QtWidgets.QLabel('Campaign'),widget.query['campaign'])
+        widget.query['depth_min'] = QtWidgets.QLineEdit()
+        layout.addRow(QtWidgets.QLabel('Minimum depth [m]'),widget.query['depth_min'])
+        widget.query['depth_max'] = QtWidgets.QLineEdit()
+        layout.addRow(QtWidgets.QLabel('Maximum depth [m]'),widget.query['depth_max'])
+        # The changes, field and value
+        fields = set(['label','Serial Number','location','raw_data','processed_data','first_sample','last_sample','parameter'])
+        for name in devices:
+            fields.update(k for k in devices[name] if k not in ['name','company'] + CATALOG_FIELDS)
+        widget.changes = []
+        for i in range(3):
+            fieldcombo = QtWidgets.QComboBox()
+            fieldcombo.setEditable(True)
+            fieldcombo.addItems([''] + sorted(fields))
+            valueed = QtWidgets.QLineEdit()
+            valueed.setToolTip('The new value, parameters separated by commas')
+            hlayout = QtWidgets.QHBoxLayout()
+            hlayout.addWidget(fieldcombo)
+            hlayout.addWidget(valueed)
+            layout.addRow(QtWidgets.QLabel('Set field'),hlayout)
+            widget.changes.append((fieldcombo,valueed))
+        previewbutton = QtWidgets.QPushButton('Preview')
+        previewbutton.setToolTip('Show the matching devices')
+        previewbutton.clicked.connect(self._bulk_edit_preview)
+        previewbutton.bulkwidget = widget
+        applybutton = QtWidgets.QPushButton('Apply')
+        applybutton.clicked.connect(self._bulk_edit_apply)
+        applybutton.bulkwidget = widget
+        hlayout = QtWidgets.QHBoxLayout()
+        hlayout.addWidget(previewbutton)
+        hlayout.addWidget(applybutton)
+        layout.addRow(hlayout)
+        widget.report = QtWidgets.QPlainTextEdit()
+        widget.report.setReadOnly(True)
+        layout.addRow(widget.report)
+        widget.show()
+        self._bulkedit_widget = widget
+
+    def _bulk_edit_query(self,widget):
+        """ The query of the bulk edit window, empty fields match everything
+        """
+        query = {}
+        for k,w in widget.query.items():
+            value = w.currentText() if isinstance(w,QtWidgets.QComboBox) else w.text()
+            query[k] = value.strip() if len(value.strip()) > 0 else None
+
+        return query
+
+    def _bulk_edit_preview(self):
+        widget = self.sender().bulkwidget
+        data = self.create_mooring_dict()
+        selection = select_devices(data,**self._bulk_edit_query(widget))
+        lines = ['{:d} devices match'.format(len(selection))]
+        for i,j in selection:
+            mooring = data['moorings'][i]
+            device = mooring['devices'][j]
+            lines.append('{:s}: {:s} {:s} at {:s}'.format(mooring['name'],str(device.get('name','')),str(device.get('Serial Number','')),str(device.get('location',''))))
+        widget.report.setPlainText('\n'.join(lines))
+
+    def _bulk_edit_apply(self):
+        """ Applies the changes of the bulk edit window to all matching
+        devices, the mooring tables and plots are updated once at the end
+        """
+        widget = self.sender().bulkwidget
+        changes = {}
+        for fieldcombo,valueed in widget.changes:
+            field = fieldcombo.currentText().strip()
+            if(len(field) == 0):
+                continue
+            value = valueed.text().strip()
+            if(field == 'parameter'):
+                value = [p.strip() for p in value.split(',') if len(p.strip()) > 0]
+            changes[field] = value
+        if(len(changes) == 0):
+            widget.report.setPlainText('No field to change')
+            return
+        data = self.create_mooring_dict()
+        selection = select_devices(data,**self._bulk_edit_query(widget))
+        try:
+            log = apply_changes(data,selection,changes)
+        except bulkEditError as e:
+            lines = ['Nothing changed, the changes would cause {:d} errors:'.format(len(e.errors))]
+            for err in e.errors:
+                mooring = data['moorings'][int(err['path'][9:err['path'].index(']')])]
+                lines.append('{:s}: {:s} {:s}'.format(mooring['name'],err['path'],err['message']))
+            widget.report.setPlainText('\n'.join(lines))
+            return
+
+        # Write the changes back into the moorings table and the open moorings
+        table = self.allmoorings['table']
+        mooring_changes = {}
+        for change in log:
+            mooring_changes.setdefault(change['mooring'],[]).append(change)
+        updated = []
+        failed = []
+        for i,mchanges in mooring_changes.items():
+            item = table.item(i,self.allmoorings['headers']['Name'])
+            mooring = getattr(item,'mooring',None)
+            if(mooring is None):
+                item.devices = data['moorings'][i]['devices']
+                continue
+            tdevices = self.get_table_devices(mooring)
+            for change in mchanges:
+                device = tdevices[change['device']]
+                if(change['field'] not in device['device_widgets']):
+                    self.add_device_field(device,change['field'],change['new'])
+                elif(not self.set_device_field(device,change['field'],change['new'])):
+                    failed.append('{:s}: could not set {:s} of device {:d} ({:s})'.format(mooring['name'],change['field'],change['device'],device['name']))
+            updated.append(mooring)
+        # The tables and plots of the open moorings are updated after all changes
+        for mooring in updated:
+            self.update_mooring_table(mooring)
+
+        lines = ['{:d} devices matched, {:d} fields in {:d} moorings changed'.format(len(selection),len(log) - len(failed),len(mooring_changes))]
+        if(len(failed) > 0):
+            lines.append('{:d} fields of open moorings could not be changed:'.format(len(failed)))
+            lines.extend(failed)
+        widget.report.setPlainText('\n'.join(lines))
+
+    def scan_data(self):
+        """ Scans the data files of all devices in a background thread and
+        shows the status in the Data column
+        """
+        if(self.allmoorings.get('scan',None) is not None):
+            self.show_status('The data scan is still running')
+            return
+        data = self.create_mooring_dict()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.allmoorings['scan'] = executor.submit(data_status,data,self.basedir,dataCache())
+        executor.shutdown(wait=False)
+        self.allmoorings['scandata'].setEnabled(False)
+        self.allmoorings['scantimer'] = QtCore.QTimer()
+        self.allmoorings['scantimer'].timeout.connect(self._scan_data_poll)
+        self.allmoorings['scantimer'].start(200)
+
+    def _scan_data_poll(self):
+        future = self.allmoorings['scan']
+        if(not future.done()):
+            return
+        self.allmoorings['scantimer'].stop()
+        self.allmoorings['scan'] = None
+        self.allmoorings['scandata'].setEnabled(True)
+        try:
+            status = future.result()
+        except Exception as e:
+            msg = QtWidgets.QMessageBox()
+            msg.setIcon(QtWidgets.QMessageBox.Warning)
+            msg.setInformativeText('Data scan failed (' + str(e) + ')')
+            retval = msg.exec_()
+            return
+
+        table = self.allmoorings['table']
+        for row,mstatus in enumerate(status):
+            # The table might have changed during the scan
+            item = table.item(row,self.allmoorings['headers']['Name'])
+            if((row >= table.rowCount()) or (item is None) or (item.text() != mstatus['name'])):
+                continue
+            item = QtWidgets.QTableWidgetItem(mstatus['summary'])
+            if(len(mstatus['missing']) > 0):
+                item.setToolTip('Missing files:\n' + '\n'.join(mstatus['missing']))
+            table.setItem(row,self.allmoorings['headers']['Data'],item)
+
     def create_mooring_dict(self,with_devices=True):
         """Function that creates from all available information a dictionary
 
@@ -755,52 +1633,59 @@ class mainWidget(QtWidgets.QWidget):
                 mooring_dict['campaign'] = table.item(i,self.allmoorings['headers']['Campaign']).text()
             except:
                 mooring_dict['campaign'] = ''
+            try:                
+                mooring_dict['data'] = table.item(i,self.allmoorings['headers']['Data']).text()
+            except:
+                mooring_dict['data'] = ''
 
             # Devices
             if(with_devices):
-                mooring_dict['devices'] = []
-                try:
-                   mooring = table.item(i,self.allmoorings['headers']['Name']).mooring
-                   HAS_MOORING = True
-                except Exception as e:
-                   HAS_MOORING = False
-                   print('mooring save',e)
-
-                if HAS_MOORING:
-                   print('Has mooring')
-                   dtable = mooring['moortable']
-                   # Loop over all devices and make a dict of them
-                   for i in range(dtable.rowCount()):
-                       try:
-                           dev = dtable.item(i,mooring['moortable_headers']['Device']).device
-                       except Exception as e:
-                           print('Device exception:',str(e))
-                           dev = None
-
-                       if dev is not None: 
-                           devdict = self.create_dict_from_device(dev)
-                           mooring_dict['devices'].append(devdict)
+                item = table.item(i,self.allmoorings['headers']['Name'])
+                mooring = getattr(item,'mooring',None)
+                if(mooring is not None):
+                    mooring_dict['devices'] = self.get_devices_of_mooring(mooring)
+                else: # Not edited yet or torn down, the devices are stored at the item
+                    mooring_dict['devices'] = [dict(dev) for dev in getattr(item,'devices',[])]
 
             print(mooring_dict)
             data['moorings'].append(mooring_dict)
 
         return data
 
+    def get_table_devices(self,mooring):
+        """ Returns the devices in the mooring table of mooring in the order of the table
+        """
+        devices = []
+        dtable = mooring['moortable']
+        for i in range(dtable.rowCount()):
+            dev = getattr(dtable.item(i,mooring['moortable_headers']['Device']),'device',None)
+            if dev is not None: 
+                devices.append(dev)
+
+        return devices
+
+    def get_devices_of_mooring(self,mooring):
+        """ Returns the dictionaries of all devices in the mooring table of mooring
+        """
+        return [self.create_dict_from_device(dev) for dev in self.get_table_devices(mooring)]
+
     def load_mooring_dict(self,data):
         table = self.allmoorings['table']        
         nrows = table.rowCount()
         ncols = table.columnCount()        
+        normalize_mooring_dict(data) # Older files might miss some fields
         for mooring in data['moorings']:
             table.insertRow(0)
-            item = QtWidgets.QTableWidgetItem( mooring['name'] )            
+            item = QtWidgets.QTableWidgetItem( str(mooring['name']) )            
+            item.devices = mooring.get('devices',[]) # The device widgets are created when edited
             table.setItem(0,self.allmoorings['headers']['Name'],item)
-            item = QtWidgets.QTableWidgetItem( mooring['longtermseries'] )            
+            item = QtWidgets.QTableWidgetItem( str(mooring['longtermseries']) )            
             table.setItem(0,self.allmoorings['headers']['Long term series'],item)
-            item = QtWidgets.QTableWidgetItem( mooring['depth'] )            
+            item = QtWidgets.QTableWidgetItem( str(mooring['depth']) )            
             table.setItem(0,self.allmoorings['headers']['Depth'],item)                        
-            item = QtWidgets.QTableWidgetItem( mooring['deployed'] )            
+            item = QtWidgets.QTableWidgetItem( str(mooring['deployed']) )            
             table.setItem(0,self.allmoorings['headers']['Deployed'],item)
-            item = QtWidgets.QTableWidgetItem( mooring['recovered'] )            
+            item = QtWidgets.QTableWidgetItem( str(mooring['recovered']) )            
             table.setItem(0,self.allmoorings['headers']['Recovered'],item)
             
             try:
@@ -817,13 +1702,15 @@ class mainWidget(QtWidgets.QWidget):
             table.setItem(0,self.allmoorings['headers']['Longitude'],item)
             item = QtWidgets.QTableWidgetItem( latstr )
             table.setItem(0,self.allmoorings['headers']['Latitude'],item)            
-            item = QtWidgets.QTableWidgetItem( mooring['comment'] )            
+            item = QtWidgets.QTableWidgetItem( str(mooring['comment']) )            
             table.setItem(0,self.allmoorings['headers']['Comment'],item)
             try:
-                item = QtWidgets.QTableWidgetItem( mooring['campaign'] )            
+                item = QtWidgets.QTableWidgetItem( str(mooring['campaign']) )            
                 table.setItem(0,self.allmoorings['headers']['Campaign'],item)
             except:
                 pass
+            item = QtWidgets.QTableWidgetItem( str(mooring['data']) )            
+            table.setItem(0,self.allmoorings['headers']['Data'],item)
 
     def add_new_mooring(self,name=None,depth=None):
         """ Adds a new mooring
@@ -840,12 +1727,82 @@ class mainWidget(QtWidgets.QWidget):
             table.setItem(nrows,self.allmoorings['headers']['Depth'],item)
 
 
-        mooring = self.create_mooring_widget(name,depth=depth) 
+        self.open_mooring(nrows)
+
+    def open_mooring(self,row):
+        """ Creates the widgets and the tab of the mooring in row of the
+        moorings table, the devices are created from the dictionaries
+        stored at the name item
+        """
+        table = self.allmoorings['table']
+        item = table.item(row,self.allmoorings['headers']['Name'])
+        name = item.text()
+        try:
+            depth = float(table.item(row,self.allmoorings['headers']['Depth']).text())
+        except Exception as e:
+            print('Depth edit',e)
+            depth = 0 # Not given yet, the table cell stays empty
+
+        mooring = self.create_mooring_widget(name,depth=depth)
+        self.populate_mooring_devices(mooring,getattr(item,'devices',[]))
         self.tabs.addTab(mooring['widget'],name)
         self.moorings.append(mooring)
-        item = table.takeItem(nrows,self.allmoorings['headers']['Name'])
+        item = table.takeItem(row,self.allmoorings['headers']['Name'])
         item.mooring = mooring
-        table.setItem(nrows,self.allmoorings['headers']['Name'],item)
+        item.devices = [] # The widgets hold the devices now
+        table.setItem(row,self.allmoorings['headers']['Name'],item)
+        # Keep the number of moorings with widgets bounded
+        while(len(self.moorings) > MAX_MOORING_TABS):
+            self.teardown_mooring(self.moorings[0])
+
+        return mooring
+
+    def populate_mooring_devices(self,mooring,device_dicts):
+        """ Creates the device widgets of the device dictionaries and adds them to the mooring
+        """
+        for device_dict in device_dicts:
+            device = self.create_device_widget(mooring,device_dict.get('name',''),device_dict)
+            self.add_device_to_mooring(mooring,device)
+
+    def teardown_mooring(self,mooring):
+        """ Tears the widgets of the mooring down to its data, the device
+        dictionaries are stored at the name item of the moorings table
+        and open_mooring() creates the widgets again
+        """
+        table = self.allmoorings['table']
+        for row in range(table.rowCount()):
+            item = table.item(row,self.allmoorings['headers']['Name'])
+            if(getattr(item,'mooring',None) is mooring):
+                item.devices = self.get_devices_of_mooring(mooring)
+                item.mooring = None
+                break
+
+        index = self.tabs.indexOf(mooring['widget'])
+        if(index >= 0):
+            self.tabs.removeTab(index)
+        self.close_plot_window(mooring)
+        for device in mooring['devices']:
+            device['widget'].deleteLater()
+        mooring['devices'] = []
+        mooring['catalog_devices'].clear()
+        mooring['widget'].deleteLater()
+        self.moorings = [m for m in self.moorings if m is not mooring]
+
+    def _tab_changed(self,index):
+        """ Moves the mooring of the shown tab to the end of the list of the least recently used moorings
+        """
+        widget = self.tabs.widget(index)
+        if((widget is self.mapview['widget']) and self.mapview['stale']):
+            # Draw after the tab is shown, the canvas has its size then
+            QtCore.QTimer.singleShot(0,self.update_map)
+            return
+        for i,mooring in enumerate(self.moorings):
+            if(mooring['widget'] is widget):
+                self.moorings.append(self.moorings.pop(i))
+                if(mooring['plotstale']):
+                    # Update after the tab is shown, the canvas is visible then
+                    QtCore.QTimer.singleShot(0,lambda: self.update_mooring_plot(mooring))
+                break
 
     def add_mooring(self):
         table = self.allmoorings['table']
@@ -872,6 +1829,7 @@ class mainWidget(QtWidgets.QWidget):
                     pass
                 if(HAS_MOORING and (w == item.mooring['widget'])):
                     self.remove_tab(i)                    
+                    break
             
             table.removeRow(row)
 
@@ -899,20 +1857,9 @@ class mainWidget(QtWidgets.QWidget):
                     msg.setInformativeText('Name the mooring first')
                     retval = msg.exec_()
                     return
-                name = table.item(row,self.allmoorings['headers']['Name']).text()
-                try:
-                    depth = float(table.item(row,self.allmoorings['headers']['Depth']).text())
-                except Exception as e:
-                    print('Depth edit',e)
-                    depth = ''
-                    
-                mooring = self.create_mooring_widget(name,depth=depth) 
-                self.tabs.addTab(mooring['widget'],name)
-                self.moorings.append(mooring)
-                item = table.takeItem(row,self.allmoorings['headers']['Name'])
-                item.mooring = mooring
-                table.setItem(row,self.allmoorings['headers']['Name'],item)
-                
+                tmp = self.open_mooring(row)
+
+            self.tabs.setCurrentWidget(tmp['widget'])
             break
 
 
@@ -971,12 +1918,10 @@ class mainWidget(QtWidgets.QWidget):
                 except Exception as e:
                     print('No mooring',e)
                     
-                if(HAS_MOORING): # Enter the new depth
-                    rowcnt  = item.mooring['moortable'].rowCount()
-                    botitem = item.mooring['moortable'].takeItem(rowcnt,item.mooring['moortable_headers']['Depth'])
-                    botitem_new = QtWidgets.QTableWidgetItem( '{:3.3f}'.format(depth) )
-                    print('Setting depth',rowcnt)
-                    item.mooring['moortable'].setItem(rowcnt-1,item.mooring['moortable_headers']['Depth'],botitem_new)
+                if(HAS_MOORING): # Enter the new depth, the devices given as MAB move with the bottom
+                    print('Setting depth',depth)
+                    item.mooring['depth'] = depth
+                    self.update_mooring_table(item.mooring)
                     
             else:
                 table.setItem(row,column,item_new)            
@@ -1068,7 +2013,6 @@ class mainWidget(QtWidgets.QWidget):
         table = self.sender()
         item = table.item(row, column)
         mooring = table.mooring
-        DEVTABLE=False
         if(item == None):
             return
         if(table == mooring['moortable']):
@@ -1082,50 +2026,112 @@ class mainWidget(QtWidgets.QWidget):
 
             else:
                 return
-                    
-        elif(table == mooring['devtable']):
-            print('devtable')
-            device_dict = item.device_dict
-            device_name = item.device_name
-            print(item.device_dict)            
-            DEVTABLE=True
-            
-        #print(item.text())
-        if(DEVTABLE):
-            try:
-                device = item.device # can be a device dict or None
-            except:
-                device = None
 
-            if device == None:
-                device = self.create_device_widget(mooring,device_name,device_dict)
-                item.device = device
-                table.setItem(row,column,item)
-            
-            self.update_device_widget(mooring,device)        
+    def _catalog_cell_was_clicked(self, index):
+        """ Function for the table displaying all catalog devices
+        """
+        table = self.sender()
+        mooring = table.mooring
+        row = mooring['devfilter'].source_row(index)
+        item = self.catalog['model'].item(row,0)
+        if(item == None):
+            return
+
+        device_name = item.data(QtCore.Qt.UserRole)
+        device = self.get_catalog_device(mooring,device_name)
+        self.update_device_widget(mooring,device)
+
+    def _catalog_search_changed(self, text):
+        self.filter_catalog(self.sender().mooring,text)
 
     def load(self):
         filename,extension  = QtWidgets.QFileDialog.getOpenFileName(self,"Choose file for summary","","All Files (*)")
+        if(len(filename) == 0):
+            return
+        self.load_file(filename)
 
+    def load_file(self,filename):
+        """ Loads the moorings of a mooring file, returns True if loaded
+        """
         # Opening the yaml file
         try:
-            stream = open(filename, 'r')
-            data_yaml = yaml.safe_load(stream)
+            if(is_json_file(filename)): # The fast path without yaml
+                data_yaml = read_json_file(filename)
+            else:
+                with open_file(filename, 'r') as stream:
+                    data_yaml = yaml.safe_load(stream)
         except Exception as e:
             msg = QtWidgets.QMessageBox()
             msg.setIcon(QtWidgets.QMessageBox.Warning)
             msg.setInformativeText('No valid or not existing yaml file (' + str(e) + ')')
             retval = msg.exec_()            
-            return
-        
+            return False
+
+        self.basedir = os.path.dirname(os.path.abspath(filename))
+        errors = [e for e in validate_mooring_dict(data_yaml) if e['level'] == 'error']
+        if(len(errors) > 0):
+            msg = QtWidgets.QMessageBox()
+            msg.setIcon(QtWidgets.QMessageBox.Warning)
+            msg.setText('The file contains {:d} errors'.format(len(errors)))
+            msg.setInformativeText('Load it anyway?')
+            msg.setDetailedText('\n'.join([e['path'] + ': ' + e['message'] for e in errors]))
+            msg.setStandardButtons(QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
+            retval = msg.exec_()
+            if((retval != QtWidgets.QMessageBox.Yes) or (not isinstance(data_yaml,dict)) or (not isinstance(data_yaml.get('moorings',None),list))):
+                return False
+
         self.load_mooring_dict(data_yaml)
+        save_session(filename)
         print('Load')
+        return True
+
+    def import_files(self):
+        filenames,extension  = QtWidgets.QFileDialog.getOpenFileNames(self,"Choose mooring files to import","","Mooring files (*.yaml *.yml *.json *.yaml.gz *.yaml.xz *.yaml.zst *.json.gz *.json.xz *.json.zst);;All Files (*)")
+        if(len(filenames) > 0):
+            self.import_moorings(filenames)
+
+    def import_directory(self):
+        dirname = QtWidgets.QFileDialog.getExistingDirectory(self,"Choose directory with mooring files to import")
+        if(len(dirname) > 0):
+            self.import_moorings([dirname])
+
+    def import_moorings(self,paths):
+        """ Reads the mooring files and directories in paths in parallel
+        and adds their moorings, moorings with the same name, position and
+        deployment as one in the table or an earlier file are skipped
+        """
+        known = known_moorings(self.create_mooring_dict()['moorings'],'moorings table')
+        collection,report = read_mooring_files(paths,known=known)
+        self.load_mooring_dict(collection)
+        details = []
+        for filename,err in report['errors'].items():
+            details.append('{:s}: could not read file: {:s}'.format(filename,err))
+        for dup in report['duplicates']:
+            details.append(describe_duplicate(dup))
+        msg = QtWidgets.QMessageBox()
+        msg.setIcon(QtWidgets.QMessageBox.Information if len(report['errors']) == 0 else QtWidgets.QMessageBox.Warning)
+        msg.setText('Imported {:d} moorings of {:d} files'.format(report['moorings'],report['files']))
+        msg.setInformativeText('{:d} duplicates skipped, {:d} files not readable'.format(len(report['duplicates']),len(report['errors'])))
+        if(len(details) > 0):
+            msg.setDetailedText('\n'.join(details))
+        retval = msg.exec_()
 
     def save(self):
         print('Save')
         data = self.create_mooring_dict()
-        filename,extension  = QtWidgets.QFileDialog.getSaveFileName(self,"Choose file for summary","","All Files (*)")
+        filename,extension  = QtWidgets.QFileDialog.getSaveFileName(self,"Choose file for summary","","YAML (*.yaml);;JSON (*.json);;Compact JSON (*.json);;All Files (*)")
+        if(len(filename) == 0):
+            return
+        self.basedir = os.path.dirname(os.path.abspath(filename))
+        if('JSON' in extension and not is_json_file(filename)):
+            filename += '.json'
+        if(is_json_file(filename)):
+            print('Create JSON summary in file:' + filename)
+            export_json(data,filename,compact=extension.startswith('Compact'))
+            save_session(filename)
+            return
         self.save_yaml_summary(data,filename)
+        save_session(filename if '.yaml' in filename else filename + '.yaml')
 
     def save_yaml_summary(self,summary,filename):
         """ Save a yaml summary
@@ -1134,8 +2140,63 @@ class mainWidget(QtWidgets.QWidget):
             filename += '.yaml'
         
         print('Create yaml summary in file:' + filename)
-        with open(filename, 'w') as outfile:
-            yaml.dump(summary, outfile, default_flow_style=False)
+        export_yaml(summary,filename,cache=get_cache())
+
+    def save_plots(self):
+        dirname = QtWidgets.QFileDialog.getExistingDirectory(self,"Choose directory for the plots")
+        if(len(dirname) == 0):
+            return
+        try:
+            filenames = export_plots(self.create_mooring_dict(),dirname,cache=get_cache())
+        except Exception as e:
+            self.show_message('Could not write the plots into ' + dirname,e)
+            return
+        self.show_message('Wrote {:d} plots into {:s}'.format(len(filenames),dirname))
+
+    def save_iso19115(self):
+        filename,extension  = QtWidgets.QFileDialog.getSaveFileName(self,"Choose file for the ISO 19115 records","","XML Files (*.xml);;All Files (*)")
+        if(len(filename) == 0):
+            return
+        if(not filename.lower().endswith('.xml')):
+            filename += '.xml'
+        try:
+            n = write_iso19115(self.create_mooring_dict()['moorings'],filename)
+        except Exception as e:
+            self.show_message('Could not write the ISO 19115 records into ' + filename,e)
+            return
+        self.show_message('Wrote {:d} ISO 19115 records into {:s}'.format(n,filename))
+
+    def save_iso19115_files(self):
+        dirname = QtWidgets.QFileDialog.getExistingDirectory(self,"Choose directory for the ISO 19115 records")
+        if(len(dirname) == 0):
+            return
+        try:
+            filenames = write_iso19115_files(self.create_mooring_dict()['moorings'],dirname)
+        except Exception as e:
+            self.show_message('Could not write the ISO 19115 records into ' + dirname,e)
+            return
+        self.show_message('Wrote {:d} ISO 19115 records into {:s}'.format(len(filenames),dirname))
+
+    def show_message(self,text,error=None):
+        """ Shows the result of an action in a message box, as warning
+        with the error if one is given
+        """
+        msg = QtWidgets.QMessageBox()
+        msg.setIcon(QtWidgets.QMessageBox.Information if error is None else QtWidgets.QMessageBox.Warning)
+        msg.setText(text)
+        if(error is not None):
+            msg.setInformativeText(str(error))
+        retval = msg.exec_()
+
+    def show_status(self,text,timeout=10000):
+        """ Shows text in the status bar of the main window, printed if
+        the widget is not in a main window (e.g. within QGIS)
+        """
+        window = self.window()
+        if(isinstance(window,QtWidgets.QMainWindow)):
+            window.statusBar().showMessage(text,timeout)
+        else:
+            print(text)
 
     def save_geojson(self):
         data = self.create_mooring_dict(with_devices = False) # Only the metainformation, not the devices of the mooring
@@ -1149,40 +2210,7 @@ class mainWidget(QtWidgets.QWidget):
             filename += '.geojson'
 
         print('Create geojson summary in file:' + filename)
-        crs = { "type": "name", "properties": { "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } } # Reference coordinate system
-
-        #['date','lon','lat','station','campaign','file','comment']
-        if True:
-            try:
-                properties = summary['moorings'][0].keys()
-            except:
-                properties = []
-
-
-        if(len(properties) > 0):
-            features = []
-            for i,d in enumerate(summary['moorings']):
-                csv_line = ''
-                try:
-                    lon = float(d['lon'])
-                    lat = float(d['lat'])
-                except Exception as e:
-                    print('No valid positions in mooring:' + d['name'] +  ' will not export it.' )
-                    continue
-                p = geojson.Point((lon, lat))
-                prop = {}
-                for o in properties:
-                    prop[o] = d[o]
-
-                feature = geojson.Feature(geometry=p, properties=prop)
-                features.append(feature)
-
-            featurecol = geojson.FeatureCollection(features,name='moorings',crs=crs)
-            with open(filename, 'w') as outfile:
-                geojson.dump(featurecol, outfile)
-
-            outfile.close()
-
+        export_geojson(summary,filename)
 
     def save_csv(self,delimiter=';'):
         filename,extension  = QtWidgets.QFileDialog.getSaveFileName(self,"Choose file for csv summary","","All Files (*)")
@@ -1190,38 +2218,31 @@ class mainWidget(QtWidgets.QWidget):
         
     def create_csv(self,filename,delimiter=';',header=None):
         if(header == None):
-            header = ['Name','Depth','Longitude','Latitude','Deployed','Recovered']
+            header = ['Name','Depth','Longitude','Latitude','Deployed','Recovered','Data']
 
         if ('.csv' not in filename):
             filename += '.csv'
 
         print('Opening',filename)
-        f = open(filename,'w')
         table = self.allmoorings['table']        
-        nrows = table.rowCount()
-        ncols = table.columnCount()
-        header = ['Name','Depth','Longitude','Latitude','Deployed','Recovered']
-        # Write the header
-        lstr = ''        
-        for head in header:
-            lstr += head + delimiter
-
-        lstr = lstr[:lstr.rfind(delimiter)] + '\n' # Get rid of the last delimiter
-        f.write(lstr)        
-        # Write the data
-        for i in range(nrows):
-            lstr = ''
+        rows = []
+        for i in range(table.rowCount()):
+            row = []
             for head in header:
-                lstr += table.item(i,self.allmoorings['headers'][head]).text() + delimiter
-                
-            lstr = lstr[:lstr.rfind(delimiter)] + '\n' # Get rid of the last delimiter
-            f.write(lstr)
+                item = table.item(i,self.allmoorings['headers'][head])
+                row.append('' if item is None else item.text())
+            rows.append(row)
 
-        f.close()
+        export_csv(rows,filename,delimiter=delimiter,header=header)
 
     def remove_tab(self,index):
         print('Remove tab',index)
         widget = self.tabs.widget(index)
+        for mooring in self.moorings:
+            if(mooring['widget'] is widget):
+                self.teardown_mooring(mooring)
+                return
+
         if widget is not None:
             widget.hide()
         self.tabs.removeTab(index)
@@ -1254,17 +2275,30 @@ class mooriaMainWindow(QtWidgets.QMainWindow):
 
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
+    # Subcommands without the GUI
+    if((len(sys.argv) > 1) and (sys.argv[1] == 'serve')):
+        from .server import main as serve_main
+        serve_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(prog='mooria',description='Mooring assistant, tool to design and create metadata for marine moorings')
+    parser.add_argument('filename',nargs='?',default=None,help='Mooring file to open')
+    parser.add_argument('--last-session',action='store_true',help='Open the mooring file of the last session')
+    args,qtargs = parser.parse_known_args() # The remaining arguments are for Qt
+    filename = args.filename
+    if((filename is None) and args.last_session):
+        filename = last_session_file()
+        if(filename is None):
+            print('No last session found')
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qtargs)
     window = mooriaMainWindow()
-
-    screen = app.primaryScreen()
-    print('Screen: %s' % screen.name())
-    size = screen.size()
-    print('Size: %d x %d' % (size.width(), size.height()))
-    rect = screen.availableGeometry()
-    print('Available: %d x %d' % (rect.width(), rect.height()))
+    rect = app.primaryScreen().availableGeometry()
     w = int(rect.width() * 3/4)
     h = int(rect.height() * 2/3)
     window.resize(w, h)
     window.show()
+    # Load after the window is shown
+    if(filename is not None):
+        QtCore.QTimer.singleShot(0,lambda: window.mainwidget.load_file(filename))
     sys.exit(app.exec_())
@@ -0,0 +1,122 @@
+""" Plot of a single mooring
+
+The devices, the mooring line and the ADCP ranges are drawn as animated
+artists on top of a cached background (axes, bottom and surface). If
+devices change, only these artists are redrawn and blitted onto the
+canvas; the whole figure is only drawn again when the depth of the
+mooring and with it the axis limits change::
+
+    plot = mooringPlot(fig)
+    plot.update(mooring_dict) # Call again whenever the mooring changed
+
+"""
+import numpy as np
+
+from .utils import parse_float, device_depth
+from .adcp import mooring_adcp_coverage, plot_adcp_coverage
+
+
+class mooringPlot():
+    """ A plot of a mooring dictionary in the matplotlib figure fig,
+    with animated=False it is a plain plot, e.g. for saving
+    """
+    def __init__(self,fig,animated=True):
+        self.fig = fig
+        self.animated = animated
+        self.ax = fig.add_axes([.1,.1,.8,.8])
+        self.depth = None
+        self.background = None
+        ax = self.ax
+        self.bottom, = ax.plot([-.5,.5],[np.nan,np.nan],'-',color='grey',lw=4)
+        self.surface, = ax.plot([-.5,.5],[np.nan,np.nan],'-',color='b',lw=4)
+        self.line, = ax.plot([],[],'-',color='k',lw=1,animated=animated)
+        self.markers, = ax.plot([],[],'o',color='tab:orange',ms=6,animated=animated)
+        self.labels = []
+        self.adcp_artists = []
+        ax.set_xlim([-1,1])
+        ax.set_xticks([])
+        ax.set_ylabel('Depth [m]')
+        if(animated):
+            fig.canvas.mpl_connect('draw_event',self._on_draw)
+
+    def _animated_artists(self):
+        return [self.line,self.markers] + self.labels + self.adcp_artists
+
+    def _on_draw(self,event):
+        """ Caches the background after a full draw and draws the animated artists on it
+        """
+        canvas = self.fig.canvas
+        self.background = canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._animated_artists():
+            self.ax.draw_artist(artist)
+
+    def _set_depth(self,depth):
+        """ Moves bottom and surface and sets the axis limits, returns
+        True if they changed
+        """
+        if(depth == self.depth):
+            return False
+        self.depth = depth
+        surface = 0
+        if(depth < surface):
+            surface = depth - 10
+        self.bottom.set_ydata([depth,depth])
+        self.surface.set_ydata([surface,surface])
+        YL = surface - depth
+        if(YL == 0):
+            YL = -10
+        self.ax.set_ylim([depth - YL/10,surface + YL/10])
+        return True
+
+    def update(self,mooring_dict):
+        """ Updates the plot with the devices and the depth of mooring_dict
+        """
+        ax = self.ax
+        depth = parse_float(mooring_dict.get('depth',''))
+        names = []
+        ddepths = []
+        for device in mooring_dict.get('devices',[]):
+            ddepth,mab = device_depth(device.get('location',''),depth)
+            if(ddepth is not None):
+                names.append(str(device.get('name','')))
+                ddepths.append(ddepth)
+
+        self.bottom.set_visible(depth is not None)
+        if(depth is None): # Scale to the devices
+            depth = max(ddepths) if len(ddepths) > 0 else 0.0
+        limits_changed = self._set_depth(depth)
+        # Devices and the line from the bottom to the top device
+        self.markers.set_data(np.zeros(len(ddepths)),ddepths)
+        if(len(ddepths) > 0):
+            self.line.set_data([0,0],[depth,min(ddepths)])
+        else:
+            self.line.set_data([],[])
+        # The labels are reused
+        while(len(self.labels) > len(names)):
+            self.labels.pop().remove()
+        while(len(self.labels) < len(names)):
+            self.labels.append(ax.text(0,0,'',va='center',fontsize='small',animated=self.animated))
+        for label,name,ddepth in zip(self.labels,names,ddepths):
+            label.set_position((0.05,ddepth))
+            label.set_text(' ' + name)
+        # The ADCP ranges are drawn again
+        for artist in self.adcp_artists:
+            artist.remove()
+        adcps,coverage = mooring_adcp_coverage(mooring_dict)
+        children = set(ax.get_children())
+        if(len(adcps['depth']) > 0):
+            plot_adcp_coverage(ax,adcps,coverage,x=-0.5)
+        self.adcp_artists = [a for a in ax.get_children() if a not in children]
+        for artist in self.adcp_artists:
+            artist.set_animated(self.animated)
+
+        if(not self.animated):
+            return
+        canvas = self.fig.canvas
+        if(limits_changed or (self.background is None)):
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            for artist in self._animated_artists():
+                ax.draw_artist(artist)
+            canvas.blit(self.fig.bbox)
@@ -0,0 +1,173 @@
+""" Long term series analysis
+
+Moorings belonging to a long term series of consecutive deployments
+share the same 'longtermseries' entry. This module groups the moorings
+by series and computes the temporal coverage, gaps and overlaps of the
+deployments of every series.
+
+"""
+import numpy as np
+
+from .utils import parse_datetime
+
+DAY = np.timedelta64(86400,'s')
+
+
+def group_series(data):
+    """ Groups the moorings of a collection by their long term series
+
+    Returns:
+        A dictionary of series name: {'names','start','end'} with the
+        mooring names and the deployment and recovery times as numpy
+        datetime64 arrays. Moorings without valid dates are listed in
+        'undated'
+    """
+    groups = {}
+    for mooring in data.get('moorings',[]):
+        series = str(mooring.get('longtermseries','')).strip()
+        if(series == ''):
+            continue
+        try:
+            group = groups[series]
+        except KeyError:
+            group = {'names':[],'start':[],'end':[],'undated':[]}
+            groups[series] = group
+        deployed  = parse_datetime(mooring.get('deployed',''))
+        recovered = parse_datetime(mooring.get('recovered',''))
+        name = str(mooring.get('name',''))
+        if((deployed is None) or (recovered is None) or (recovered < deployed)):
+            group['undated'].append(name)
+            continue
+        group['names'].append(name)
+        group['start'].append(deployed)
+        group['end'].append(recovered)
+
+    for series in groups:
+        group = groups[series]
+        group['start'] = np.array(group['start'],dtype='datetime64[s]')
+        group['end']   = np.array(group['end'],dtype='datetime64[s]')
+
+    return groups
+
+
+def analyze_intervals(start,end):
+    """ Computes coverage, gaps and overlaps of the time intervals
+    [start,end) given as datetime64 arrays
+
+    Returns:
+        A dictionary with the sorting 'order' of the intervals, the
+        'start' and 'end' of the whole series, the 'span', the
+        'covered' time (as timedelta64), the 'coverage' as fraction
+        of the span, the 'gaps' and 'overlaps' as arrays of shape (n,2)
+        with the start and end of every gap or overlap
+    """
+    result = {}
+    n = len(start)
+    order = np.argsort(start,kind='stable')
+    start = start[order]
+    end   = end[order]
+    result['order'] = order
+    if(n == 0):
+        empty = np.empty((0,2),dtype='datetime64[s]')
+        result.update({'start':None,'end':None,'span':np.timedelta64(0,'s'),'covered':np.timedelta64(0,'s'),
+                       'coverage':np.nan,'gaps':empty,'overlaps':empty})
+        return result
+
+    # The latest recovery of all deployments before
+    endmax = np.maximum.accumulate(end)
+    # A gap starts at the latest recovery and ends at the next deployment
+    isgap = start[1:] > endmax[:-1]
+    gaps = np.column_stack((endmax[:-1][isgap],start[1:][isgap]))
+    # An overlap starts at the deployment and ends at the earlier recovery
+    overlap_end = np.minimum(endmax[:-1],end[1:])
+    isoverlap = overlap_end > start[1:]
+    overlaps = np.column_stack((start[1:][isoverlap],overlap_end[isoverlap]))
+    span = endmax[-1] - start[0]
+    covered = span - (gaps[:,1] - gaps[:,0]).sum()
+    result['start']    = start[0]
+    result['end']      = endmax[-1]
+    result['span']     = span
+    result['covered']  = covered
+    result['coverage'] = covered/span if span > np.timedelta64(0,'s') else np.nan
+    result['gaps']     = gaps
+    result['overlaps'] = overlaps
+    return result
+
+
+def analyze_series(data):
+    """ Analyzes all long term series of a mooring collection
+
+    Returns:
+        A dictionary of series name: result of analyze_intervals with the
+        additional keys 'names' (the mooring names sorted by deployment),
+        'deployments' (shape (n,2), sorted) and 'undated'
+    """
+    results = {}
+    groups = group_series(data)
+    for series in sorted(groups):
+        group = groups[series]
+        result = analyze_intervals(group['start'],group['end'])
+        order = result['order']
+        result['names']       = [group['names'][i] for i in order]
+        result['deployments'] = np.column_stack((group['start'][order],group['end'][order]))
+        result['undated']     = group['undated']
+        results[series] = result
+
+    return results
+
+
+def timeline_report(results):
+    """ Creates a text report of the results of analyze_series
+    """
+    def days(td):
+        return td/DAY
+
+    lines = []
+    for series,r in results.items():
+        lines.append('Series {:s}: {:d} deployments'.format(series,len(r['names'])))
+        if(r['start'] is None):
+            lines.append('  no dated deployments')
+        else:
+            lines.append('  {:s} - {:s}, {:.1f} days, covered {:.1f} days ({:.1f}%)'.format(
+                str(r['start']),str(r['end']),days(r['span']),days(r['covered']),100 * r['coverage']))
+            lines.append('  {:d} gaps, {:.1f} days total'.format(len(r['gaps']),days((r['gaps'][:,1]-r['gaps'][:,0]).sum())))
+            for g in r['gaps']:
+                lines.append('    gap     {:s} - {:s} ({:.1f} days)'.format(str(g[0]),str(g[1]),days(g[1]-g[0])))
+            lines.append('  {:d} overlaps, {:.1f} days total'.format(len(r['overlaps']),days((r['overlaps'][:,1]-r['overlaps'][:,0]).sum())))
+            for o in r['overlaps']:
+                lines.append('    overlap {:s} - {:s} ({:.1f} days)'.format(str(o[0]),str(o[1]),days(o[1]-o[0])))
+        if(len(r['undated']) > 0):
+            lines.append('  without valid dates: ' + ', '.join(r['undated']))
+
+    return '\n'.join(lines)
+
+
+def plot_series_timeline(results,fig=None):
+    """ Plots the deployments, gaps and overlaps of all series as a
+    timeline into the matplotlib figure fig, returns the figure
+    """
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+    if(fig is None):
+        fig = Figure()
+    ax = fig.add_axes([.15,.1,.8,.85])
+    names = list(results.keys())
+    def to_num(t):
+        return mdates.date2num(t.astype('datetime64[s]').astype('O')) if len(t) > 0 else np.array([])
+
+    for i,series in enumerate(names):
+        r = results[series]
+        for key,color,height in [('deployments','tab:blue',.6),('gaps','tab:red',.6),('overlaps','tab:orange',.3)]:
+            intervals = r[key]
+            if(len(intervals) == 0):
+                continue
+            t0 = to_num(intervals[:,0])
+            t1 = to_num(intervals[:,1])
+            ax.broken_barh(list(zip(t0,t1-t0)),(i-height/2,height),facecolors=color)
+
+    ax.set_yticks(range(len(names)))
+    ax.set_yticklabels(names)
+    ax.set_ylim(-1,len(names))
+    ax.xaxis_date()
+    ax.set_xlabel('Date')
+    return fig
@@ -0,0 +1,384 @@
+""" Local HTTP JSON API over mooring files
+
+Serves the moorings, devices and the device catalog of mooring files
+or directories of mooring files to local clients (QGIS, scripts,
+notebooks)::
+
+    mooria serve archive/ cruise.yaml --port 8765
+
+The files are parsed once and kept in memory, they are reloaded when
+their modification time or size changes. All requests are GET
+requests, the answers are JSON:
+
+/moorings
+    The moorings without their devices. Query parameters: offset,
+    limit, name (substring), campaign, series, bbox
+    (lonmin,latmin,lonmax,latmax), near (lon,lat,radius in km), start
+    and end (deployments overlapping the time span) and format=ndjson
+    to stream all matches as newline delimited JSON
+/moorings/<id>
+    A mooring with its devices, id is the 'id' of the mooring list
+/devices
+    The devices of all moorings. Query parameters: offset, limit,
+    name, serial, parameter, campaign and format=ndjson
+/catalog, /catalog/<name>
+    The device catalog
+/files
+    The loaded files
+
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import urllib.parse
+import numpy as np
+
+from .catalog import get_catalog
+from .fileio import read_mooring_file
+from .spatial import gridIndex
+from .utils import parse_datetime, parse_float
+from .validate import list_mooring_files
+
+logger = logging.getLogger('mooria.server')
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT     = 10000
+STREAM_CHUNK  = 200 # Items per chunk of streamed answers
+STATUS = {200:'OK',400:'Bad Request',404:'Not Found',405:'Method Not Allowed',500:'Internal Server Error'}
+
+
+class requestError(Exception):
+    def __init__(self,status,message):
+        Exception.__init__(self,message)
+        self.status = status
+
+
+def parse_time(value):
+    """ Parses a time of a query, the mooring date formats and ISO dates
+    """
+    t = parse_datetime(value)
+    if(t is not None):
+        return np.datetime64(t,'s')
+    try:
+        return np.datetime64(value,'s')
+    except ValueError:
+        raise requestError(400,'invalid time {:s}'.format(repr(value)))
+
+
+def parse_numbers(value,n,name):
+    try:
+        numbers = [float(v) for v in value.split(',')]
+    except ValueError:
+        numbers = []
+    if(len(numbers) != n):
+        raise requestError(400,'{:s} needs {:d} comma separated numbers'.format(name,n))
+    return numbers
+
+
+class collectionCache():
+    """ The moorings of files and directories, files are reloaded when
+    changed, at most every interval seconds the files are checked. The
+    queries are answered by the mooringCollection in 'collection',
+    which is replaced as a whole when files changed
+    """
+    def __init__(self,paths,interval=1.0):
+        self.paths = paths
+        self.interval = interval
+        self.files = {}  # filename: {'mtime','size','data','error'}
+        self.checked = None
+        self.collection = mooringCollection(self.files)
+
+    def refresh(self):
+        """ Reloads changed, new and removed files, returns True if
+        anything changed
+        """
+        now = time.monotonic()
+        if((self.checked is not None) and (now - self.checked < self.interval)):
+            return False
+        self.checked = now
+        filenames = []
+        for path in self.paths:
+            if(os.path.exists(path)):
+                filenames.extend(list_mooring_files(path))
+
+        changed = False
+        for filename in list(self.files.keys()):
+            if(filename not in filenames):
+                self.files.pop(filename)
+                changed = True
+        for filename in filenames:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            entry = self.files.get(filename,None)
+            if((entry is not None) and (entry['mtime'] == st.st_mtime) and (entry['size'] == st.st_size)):
+                continue
+            entry = {'mtime':st.st_mtime,'size':st.st_size,'data':None,'error':None}
+            try:
+                entry['data'] = read_mooring_file(filename)
+            except Exception as e:
+                entry['error'] = str(e)
+                logger.warning('Could not read {:s}: {:s}'.format(filename,str(e)))
+            self.files[filename] = entry
+            changed = True
+
+        if(get_catalog().rescan()):
+            changed = True
+        if(changed):
+            self.collection = mooringCollection(self.files)
+        return changed
+
+
+class mooringCollection():
+    """ The moorings of the loaded files with the lists and arrays used
+    for the queries
+    """
+    def __init__(self,files):
+        self.files = {f:dict(e) for f,e in files.items()}
+        self.moorings = []
+        self.mooring_files = []
+        for filename in sorted(self.files):
+            data = self.files[filename]['data']
+            if(data is None):
+                continue
+            for mooring in data['moorings']:
+                if(isinstance(mooring,dict)):
+                    self.moorings.append(mooring)
+                    self.mooring_files.append(filename)
+
+        def field(m,k):
+            return str(m.get(k,'')).strip()
+
+        n = len(self.moorings)
+        self.names     = np.array([field(m,'name').lower() for m in self.moorings],dtype=object)
+        self.campaigns = np.array([field(m,'campaign') for m in self.moorings],dtype=object)
+        self.series    = np.array([field(m,'longtermseries') for m in self.moorings],dtype=object)
+        lon = [parse_float(m.get('lon','')) for m in self.moorings]
+        lat = [parse_float(m.get('lat','')) for m in self.moorings]
+        self.lon = np.array([np.nan if v is None else v for v in lon],dtype=float)
+        self.lat = np.array([np.nan if v is None else v for v in lat],dtype=float)
+        start = [parse_datetime(m.get('deployed','')) for m in self.moorings]
+        end   = [parse_datetime(m.get('recovered','')) for m in self.moorings]
+        self.start = np.array(['NaT' if t is None else t for t in start],dtype='datetime64[s]')
+        self.end   = np.array(['NaT' if t is None else t for t in end],dtype='datetime64[s]')
+        self.index = gridIndex(self.lon,self.lat)
+        # All devices, as (mooring id, device index)
+        self.devices = []
+        for i,mooring in enumerate(self.moorings):
+            for j,device in enumerate(mooring.get('devices',[]) or []):
+                if(isinstance(device,dict)):
+                    self.devices.append((i,j))
+        logger.info('{:d} moorings with {:d} devices in {:d} files'.format(n,len(self.devices),len(self.files)))
+
+    def mooring_summary(self,i):
+        mooring = self.moorings[i]
+        summary = {k:v for k,v in mooring.items() if k != 'devices'}
+        summary['id'] = int(i)
+        summary['ndevices'] = len(mooring.get('devices',[]) or [])
+        summary['file'] = self.mooring_files[i]
+        return summary
+
+    def query_moorings(self,query):
+        """ Returns the ids of the moorings matching the query parameters
+        """
+        mask = np.ones(len(self.moorings),dtype=bool)
+        order = None
+        if('bbox' in query):
+            lonmin,latmin,lonmax,latmax = parse_numbers(query['bbox'],4,'bbox')
+            inside = np.zeros(len(mask),dtype=bool)
+            inside[self.index.query_bbox(lonmin,latmin,lonmax,latmax)] = True
+            mask &= inside
+        if('near' in query):
+            lon,lat,radius = parse_numbers(query['near'],3,'near')
+            ids,dist = self.index.query_radius(lon,lat,radius)
+            inside = np.zeros(len(mask),dtype=bool)
+            inside[ids] = True
+            mask &= inside
+            order = ids # Sorted by distance
+        if('name' in query):
+            name = query['name'].lower()
+            mask &= np.array([name in n for n in self.names],dtype=bool)
+        if('campaign' in query):
+            mask &= (self.campaigns == query['campaign'])
+        if('series' in query):
+            mask &= (self.series == query['series'])
+        if('start' in query): # Recovered after start
+            mask &= (self.end >= parse_time(query['start']))
+        if('end' in query): # Deployed before end
+            mask &= (self.start <= parse_time(query['end']))
+
+        if(order is None):
+            return np.nonzero(mask)[0]
+        return order[mask[order]]
+
+    def query_devices(self,query):
+        """ Returns the (mooring id, device index) of the devices matching the query
+        """
+        devices = self.devices
+        if('campaign' in query):
+            devices = [d for d in devices if self.campaigns[d[0]] == query['campaign']]
+        for k,field in [('name','name'),('serial','Serial Number')]:
+            if(k in query):
+                devices = [d for d in devices if str(self.moorings[d[0]]['devices'][d[1]].get(field,'')) == query[k]]
+        if('parameter' in query):
+            devices = [d for d in devices if query['parameter'] in (self.moorings[d[0]]['devices'][d[1]].get('parameter',[]) or [])]
+        return devices
+
+    def device_entry(self,d):
+        i,j = d
+        entry = dict(self.moorings[i]['devices'][j])
+        entry['mooring'] = str(self.moorings[i].get('name',''))
+        entry['mooring_id'] = i
+        return entry
+
+
+def to_json(obj):
+    return json.dumps(obj,default=str)
+
+
+class mooriaServer():
+    """ Asyncio HTTP server answering the queries of the collection cache
+    """
+    def __init__(self,cache):
+        self.cache = cache
+        self.lock = None
+
+    async def refresh(self):
+        # Only one reload at a time, parsing runs in a thread
+        if(self.lock is None):
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            await asyncio.get_running_loop().run_in_executor(None,self.cache.refresh)
+
+    async def send(self,writer,status,body,content_type='application/json',head=False):
+        data = body.encode('utf-8')
+        header = 'HTTP/1.1 {:d} {:s}\r\n'.format(status,STATUS.get(status,''))
+        header += 'Content-Type: {:s}\r\nContent-Length: {:d}\r\n'.format(content_type,len(data))
+        header += 'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n'
+        writer.write(header.encode('latin-1'))
+        if(not head):
+            writer.write(data)
+        await writer.drain()
+
+    async def stream(self,writer,items,convert,head=False):
+        """ Sends items as newline delimited JSON with chunked transfer encoding
+        """
+        header = 'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n'
+        header += 'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n'
+        writer.write(header.encode('latin-1'))
+        if(not head):
+            for i in range(0,len(items),STREAM_CHUNK):
+                chunk = ''.join(to_json(convert(item)) + '\n' for item in items[i:i+STREAM_CHUNK]).encode('utf-8')
+                writer.write('{:x}\r\n'.format(len(chunk)).encode('latin-1') + chunk + b'\r\n')
+                await writer.drain()
+            writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def send_list(self,writer,query,items,convert,head=False):
+        """ Sends a page of items or streams all of them
+        """
+        if(query.get('format','json') == 'ndjson'):
+            await self.stream(writer,items,convert,head)
+            return
+        try:
+            offset = max(int(query.get('offset',0)),0)
+            limit = min(max(int(query.get('limit',DEFAULT_LIMIT)),0),MAX_LIMIT)
+        except ValueError:
+            raise requestError(400,'offset and limit have to be integers')
+        page = {'total':len(items),'offset':offset,'limit':limit}
+        page['items'] = [convert(item) for item in items[offset:offset+limit]]
+        await self.send(writer,200,to_json(page),head=head)
+
+    async def route(self,writer,path,query,head):
+        cache = self.cache.collection # Stays the same during the request
+        parts = [p for p in path.split('/') if len(p) > 0]
+        if(parts == ['moorings']):
+            await self.send_list(writer,query,cache.query_moorings(query),cache.mooring_summary,head)
+        elif((len(parts) == 2) and (parts[0] == 'moorings')):
+            try:
+                i = int(parts[1])
+                if(i < 0): # Not counted from the end
+                    raise IndexError(i)
+                mooring = cache.moorings[i]
+            except (ValueError,IndexError):
+                raise requestError(404,'no mooring {:s}'.format(parts[1]))
+            mooring = dict(mooring,id=i,file=cache.mooring_files[i])
+            await self.send(writer,200,to_json(mooring),head=head)
+        elif(parts == ['devices']):
+            await self.send_list(writer,query,cache.query_devices(query),cache.device_entry,head)
+        elif(parts == ['catalog']):
+            await self.send(writer,200,to_json(get_catalog().devices),head=head)
+        elif((len(parts) == 2) and (parts[0] == 'catalog')):
+            devices = get_catalog().devices
+            if(parts[1] not in devices):
+                raise requestError(404,'no device {:s} in catalog'.format(parts[1]))
+            await self.send(writer,200,to_json(devices[parts[1]]),head=head)
+        elif(parts == ['files']):
+            files = [{'file':f,'mtime':e['mtime'],'size':e['size'],'error':e['error'],
+                      'moorings':0 if e['data'] is None else len(e['data']['moorings'])} for f,e in sorted(cache.files.items())]
+            await self.send(writer,200,to_json(files),head=head)
+        else:
+            raise requestError(404,'unknown path {:s}'.format(path))
+
+    async def handle(self,reader,writer):
+        try:
+            line = await reader.readline()
+            try:
+                method,target,version = line.decode('latin-1').split()
+            except ValueError:
+                return
+            while True: # Headers are not used
+                header = await reader.readline()
+                if(header in (b'\r\n',b'\n',b'')):
+                    break
+            try:
+                if(method not in ('GET','HEAD')):
+                    raise requestError(405,'only GET requests are supported')
+                url = urllib.parse.urlsplit(target)
+                query = {k:v[-1] for k,v in urllib.parse.parse_qs(url.query).items()}
+                urlpath = urllib.parse.unquote(url.path)
+                await self.refresh()
+                await self.route(writer,urlpath,query,method == 'HEAD')
+            except requestError as e:
+                await self.send(writer,e.status,to_json({'error':str(e)}))
+            except Exception as e:
+                logger.exception('Error answering {:s}'.format(target))
+                await self.send(writer,500,to_json({'error':str(e)}))
+        except (ConnectionError,asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self,host,port):
+        server = await asyncio.start_server(self.handle,host,port)
+        addresses = ', '.join(str(s.getsockname()) for s in server.sockets)
+        print('Serving {:d} moorings on {:s}'.format(len(self.cache.collection.moorings),addresses))
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='mooria serve',description='Serves mooring files as JSON API')
+    parser.add_argument('paths',nargs='+',help='Mooring files or directories with mooring files')
+    parser.add_argument('--host',default='127.0.0.1',help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port',type=int,default=8765,help='Port (default: %(default)s)')
+    parser.add_argument('--interval',type=float,default=1.0,help='Check the files for changes at most every INTERVAL seconds')
+    parser.add_argument('--verbose','-v',action='store_true')
+    args = parser.parse_args(argv)
+    logging.basicConfig(stream=sys.stderr,level=logging.INFO if args.verbose else logging.WARNING)
+    cache = collectionCache(args.paths,args.interval)
+    cache.refresh()
+    try:
+        asyncio.run(mooriaServer(cache).serve(args.host,args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
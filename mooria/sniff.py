@@ -0,0 +1,482 @@
+""" Header readers for instrument data files
+
+Reads the metadata of raw data files of the catalog instruments
+without reading the whole file. Only the first and last kilobytes of
+a file are read (or memory mapped for binary files), such that files
+of several GB are handled quickly. Supported are
+
+- Sea-Bird Scientific Microcat/Seacat: .cnv, .asc, .cap (text headers)
+- Teledyne RDI Workhorse: PD0 binary files (.000, .pd0, ...)
+- Nortek Aquadopp/Vector: .hdr files, written by the Nortek software
+  (a .hdr file next to a binary file is used as well)
+- PME miniDOT: .txt files
+
+sniff_file() returns a dictionary with the fields found, using the
+names of the device fields: 'Serial Number', 'sampling_interval' (in
+seconds), 'frequency' (kHz), 'orientation', 'first_sample',
+'last_sample' and additionally the name of the catalog 'device'.
+Whole directories of data files are read in parallel with::
+
+    mooria-sniff cruise_data/ -j 16 --json headers.json
+
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import mmap
+import struct
+import datetime
+import concurrent.futures
+
+from .utils import DATEFORMATS
+
+# Number of bytes read at the start and at the end of text files
+HEADSIZE = 65536
+TAILSIZE = 8192
+DATEFMT = DATEFORMATS[0]
+EPOCH = datetime.datetime(1970,1,1)
+
+
+def read_head(filename,size=HEADSIZE):
+    with open(filename,'rb') as f:
+        return f.read(size)
+
+
+def read_tail(filename,size=TAILSIZE):
+    with open(filename,'rb') as f:
+        f.seek(0,os.SEEK_END)
+        fsize = f.tell()
+        f.seek(max(0,fsize - size))
+        return f.read(size)
+
+
+def text_lines(data):
+    return data.decode('latin-1').splitlines()
+
+
+def format_interval(seconds):
+    """ Formats a sampling interval in seconds without unnecessary digits
+    """
+    return '{:g}'.format(round(seconds,6))
+
+
+def parse_date(text,formats):
+    text = text.strip()
+    for fmt in formats:
+        try:
+            return datetime.datetime.strptime(text,fmt)
+        except ValueError:
+            pass
+    return None
+
+
+#
+# Sea-Bird Scientific
+#
+SBE_SERIAL   = [re.compile(r"SerialNumber\s*=\s*'?0*(\d+)",re.I),
+                re.compile(r'SERIAL\s+NO\.?\s*[:=]?\s*0*(\d+)',re.I),
+                re.compile(r'Temperature\s+SN\s*=\s*0*(\d+)',re.I)]
+SBE_INTERVAL = [re.compile(r'#\s*interval\s*=\s*seconds:\s*([\d.]+)',re.I),
+                re.compile(r'sample\s+interval\s*=\s*([\d.]+)\s*sec',re.I),
+                re.compile(r'<SampleInterval>\s*([\d.]+)\s*<',re.I)]
+SBE_START    = re.compile(r'#\s*start_time\s*=\s*(\w{3} \d{1,2} \d{4} \d{2}:\d{2}:\d{2})',re.I)
+SBE_NVALUES  = re.compile(r'#\s*nvalues\s*=\s*(\d+)',re.I)
+SBE_DATALINE = re.compile(r'(\d{1,2} \w{3} \d{4}),?\s+(\d{2}:\d{2}:\d{2})')
+
+
+def is_seabird(head,filename):
+    return (b'Sea-Bird' in head) or (b'* SBE' in head) or (b'*END*' in head) or (b'SeacatPlus' in head)
+
+
+def sniff_seabird(filename):
+    head = read_head(filename)
+    text = head.decode('latin-1')
+    info = {}
+    if(('SBE37' in text) or ('SBE 37' in text)):
+        info['device'] = 'Microcat'
+    elif(('SBE16' in text) or ('SBE 16' in text) or ('SeacatPlus' in text)):
+        info['device'] = 'Seacat'
+    for regex in SBE_SERIAL:
+        m = regex.search(text)
+        if(m is not None):
+            info['Serial Number'] = m.group(1)
+            break
+    interval = None
+    for regex in SBE_INTERVAL:
+        m = regex.search(text)
+        if(m is not None):
+            interval = float(m.group(1))
+            info['sampling_interval'] = format_interval(interval)
+            break
+
+    m = SBE_START.search(text)
+    if(m is not None):
+        start = parse_date(m.group(1),['%b %d %Y %H:%M:%S'])
+        if(start is not None):
+            info['first_sample'] = start.strftime(DATEFMT)
+            m = SBE_NVALUES.search(text)
+            if((m is not None) and (interval is not None)):
+                last = start + datetime.timedelta(seconds=interval * (int(m.group(1)) - 1))
+                info['last_sample'] = last.strftime(DATEFMT)
+
+    # Text files with a date and time in every data line
+    if('first_sample' not in info):
+        body = text.split('*END*',1)[-1]
+        m = SBE_DATALINE.search(body)
+        if(m is not None):
+            first = parse_date(m.group(1) + ' ' + m.group(2),['%d %b %Y %H:%M:%S'])
+            if(first is not None):
+                info['first_sample'] = first.strftime(DATEFMT)
+    if('last_sample' not in info):
+        for line in reversed(text_lines(read_tail(filename))):
+            m = SBE_DATALINE.search(line)
+            if(m is not None):
+                last = parse_date(m.group(1) + ' ' + m.group(2),['%d %b %Y %H:%M:%S'])
+                if(last is not None):
+                    info['last_sample'] = last.strftime(DATEFMT)
+                break
+
+    return info
+
+
+#
+# Teledyne RDI PD0
+#
+PD0_FREQUENCIES = [75,150,300,600,1200,2400]
+
+
+def pd0_ensemble_at(mm,offset):
+    """ Checks if a valid PD0 ensemble starts at offset, returns its
+    size in bytes (without the checksum) or None
+    """
+    if(offset + 6 > len(mm)):
+        return None
+    if(mm[offset] != 0x7f or mm[offset+1] != 0x7f):
+        return None
+    nbytes = struct.unpack_from('<H',mm,offset+2)[0]
+    if((nbytes < 6) or (offset + nbytes + 2 > len(mm))):
+        return None
+    checksum = struct.unpack_from('<H',mm,offset+nbytes)[0]
+    if((sum(mm[offset:offset+nbytes]) & 0xffff) != checksum):
+        return None
+    return nbytes
+
+
+def pd0_parse_ensemble(mm,offset):
+    """ Parses fixed and variable leader of the ensemble at offset
+    """
+    ntypes = mm[offset+5]
+    offsets = struct.unpack_from('<{:d}H'.format(ntypes),mm,offset+6)
+    info = {}
+    for o in offsets:
+        o += offset
+        leader_id = struct.unpack_from('<H',mm,o)[0]
+        if(leader_id == 0x0000): # Fixed leader
+            sysconfig = struct.unpack_from('<H',mm,o+4)[0]
+            info['frequency']   = PD0_FREQUENCIES[sysconfig & 0x7] if (sysconfig & 0x7) < len(PD0_FREQUENCIES) else None
+            info['orientation'] = 'up' if (sysconfig & 0x80) else 'down'
+            info['beam_angle']  = {0:15,1:20,2:30}.get((sysconfig >> 8) & 0x3,None)
+            serial = struct.unpack_from('<I',mm,o+54)[0]
+            if(serial > 0):
+                info['serial'] = serial
+        elif(leader_id == 0x0080): # Variable leader
+            year,month,day,hour,minute,second,hundredth = struct.unpack_from('<7B',mm,o+4)
+            year += 2000 if year < 80 else 1900
+            try:
+                info['time'] = datetime.datetime(year,month,day,hour,minute,second,hundredth * 10000)
+            except ValueError:
+                pass
+    return info
+
+
+def is_pd0(head,filename):
+    return head[:2] == b'\x7f\x7f'
+
+
+def sniff_pd0(filename):
+    info = {'device':'Workhorse'}
+    with open(filename,'rb') as f:
+        with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as mm:
+            nbytes = pd0_ensemble_at(mm,0)
+            if(nbytes is None):
+                return info
+            first = pd0_parse_ensemble(mm,0)
+            if(first.get('frequency',None) is not None):
+                info['frequency'] = str(first['frequency'])
+            for k in ['orientation','beam_angle']:
+                if(first.get(k,None) is not None):
+                    info[k] = str(first[k])
+            if('serial' in first):
+                info['Serial Number'] = str(first['serial'])
+            if('time' in first):
+                info['first_sample'] = first['time'].strftime(DATEFMT)
+            # Second ensemble for the sampling interval
+            nbytes2 = pd0_ensemble_at(mm,nbytes+2)
+            if(nbytes2 is not None):
+                second = pd0_parse_ensemble(mm,nbytes+2)
+                if(('time' in first) and ('time' in second)):
+                    info['sampling_interval'] = format_interval((second['time'] - first['time']).total_seconds())
+            # Search the last valid ensemble backwards from the end of the file
+            end = len(mm)
+            limit = max(0,len(mm) - 16 * (nbytes + 2))
+            while(end > limit):
+                pos = mm.rfind(b'\x7f\x7f',limit,end)
+                if(pos < 0):
+                    break
+                if(pd0_ensemble_at(mm,pos) is not None):
+                    last = pd0_parse_ensemble(mm,pos)
+                    if('time' in last):
+                        info['last_sample'] = last['time'].strftime(DATEFMT)
+                    break
+                end = pos + 1
+
+    return info
+
+
+#
+# Nortek
+#
+NORTEK_DATEFORMATS = ['%d.%m.%Y %H:%M:%S','%m/%d/%Y %I:%M:%S %p','%m/%d/%Y %H:%M:%S','%Y-%m-%d %H:%M:%S','%d/%m/%Y %H:%M:%S']
+NORTEK_LINE = re.compile(r'^(\S.*?)\s{2,}(\S.*)$')
+# Content of a Nortek .hdr file, Sea-Bird software writes .hdr files as well
+NORTEK_HEADER = re.compile(rb'Nortek|^\s*Serial number\s+(AQD|VEC|AQP|WPR)|^\s*Head frequency|^\s*Time of first measurement',re.I | re.M)
+
+
+def nortek_header_file(filename):
+    """ Returns the .hdr file belonging to a Nortek data file or None
+    """
+    if(filename.lower().endswith('.hdr')):
+        return filename
+    stem = os.path.splitext(filename)[0]
+    for ext in ['.hdr','.HDR']:
+        if(os.path.isfile(stem + ext)):
+            return stem + ext
+    return None
+
+
+def is_nortek(head,filename):
+    hdr = nortek_header_file(filename)
+    if(hdr is None):
+        return False
+    if(hdr != filename):
+        head = read_head(hdr,4096)
+    return NORTEK_HEADER.search(head) is not None
+
+
+def sniff_nortek(filename):
+    hdr = nortek_header_file(filename)
+    info = {}
+    if(hdr is None):
+        return info
+    fields = {}
+    for line in text_lines(read_head(hdr)):
+        m = NORTEK_LINE.match(line.strip())
+        if(m is not None):
+            key = m.group(1).strip().lower()
+            if(key not in fields): # The first occurence is the user setup
+                fields[key] = m.group(2).strip()
+
+    serial = fields.get('serial number',None)
+    if(serial is not None):
+        if(serial.upper().startswith('AQD')):
+            info['device'] = 'Aquadopp'
+        elif(serial.upper().startswith('VEC')):
+            info['device'] = 'Vector'
+        m = re.search(r'(\d+)\s*$',serial)
+        info['Serial Number'] = m.group(1) if m is not None else serial
+    for key in ['measurement/burst interval','profile interval','measurement interval']:
+        if(key in fields):
+            m = re.match(r'([\d.]+)',fields[key])
+            if(m is not None):
+                info['sampling_interval'] = format_interval(float(m.group(1)))
+                break
+    if(('sampling_interval' not in info) and ('sampling rate' in fields)):
+        m = re.match(r'([\d.]+)',fields['sampling rate'])
+        if((m is not None) and (float(m.group(1)) > 0)):
+            info['sampling_interval'] = format_interval(1/float(m.group(1)))
+    if('head frequency' in fields):
+        m = re.match(r'(\d+)',fields['head frequency'])
+        if(m is not None):
+            info['frequency'] = m.group(1)
+    for key in ['orientation','head orientation']:
+        if(key in fields):
+            value = fields[key].lower()
+            if(('up' in value) or ('down' in value)):
+                info['orientation'] = 'up' if 'up' in value else 'down'
+                break
+    for key,field in [('time of first measurement','first_sample'),('time of last measurement','last_sample')]:
+        if(key in fields):
+            date = parse_date(fields[key],NORTEK_DATEFORMATS)
+            if(date is not None):
+                info[field] = date.strftime(DATEFMT)
+
+    return info
+
+
+#
+# PME miniDOT
+#
+PME_SERIAL = re.compile(r'^\s*(7450-\d+)',re.M)
+
+
+def is_pme(head,filename):
+    return (PME_SERIAL.search(head.decode('latin-1')) is not None) or (b'miniDOT' in head) or (b'MiniDOT' in head)
+
+
+def pme_data_time(line):
+    """ Returns the unix time of a data line of a miniDOT file or None
+    """
+    field = line.split(',')[0].strip()
+    try:
+        t = int(field)
+    except ValueError:
+        return None
+    if(t < 100000000): # Not a timestamp
+        return None
+    return t
+
+
+def sniff_pme(filename):
+    info = {'device':'miniDOT'}
+    lines = text_lines(read_head(filename,8192))
+    text = '\n'.join(lines)
+    m = PME_SERIAL.search(text)
+    if(m is not None):
+        info['Serial Number'] = m.group(1)
+    times = []
+    for line in lines:
+        t = pme_data_time(line)
+        if(t is not None):
+            times.append(t)
+            if(len(times) == 2):
+                break
+    if(len(times) > 0):
+        info['first_sample'] = (EPOCH + datetime.timedelta(seconds=times[0])).strftime(DATEFMT)
+    if(len(times) > 1):
+        info['sampling_interval'] = format_interval(times[1] - times[0])
+    for line in reversed(text_lines(read_tail(filename))):
+        t = pme_data_time(line)
+        if(t is not None):
+            info['last_sample'] = (EPOCH + datetime.timedelta(seconds=t)).strftime(DATEFMT)
+            break
+
+    return info
+
+
+# Detection and readers, the first matching reader is used
+READERS = [(is_pd0,sniff_pd0),(is_nortek,sniff_nortek),(is_pme,sniff_pme),(is_seabird,sniff_seabird)]
+
+
+def sniff_file(filename):
+    """ Reads the header of an instrument file, returns a dictionary with
+    the fields found or None if the file format is unknown
+    """
+    head = read_head(filename,4096)
+    for detect,reader in READERS:
+        if(detect(head,filename)):
+            info = reader(filename)
+            info['file'] = filename
+            return info
+
+    return None
+
+
+def _sniff_file_safe(filename):
+    try:
+        return filename,sniff_file(filename)
+    except Exception as e:
+        return filename,{'file':filename,'error':str(e)}
+
+
+def sniff_files(filenames,nthreads=8):
+    """ Reads the headers of several files in parallel, returns a
+    dictionary of filename: result of sniff_file
+    """
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nthreads) as executor:
+        for filename,info in executor.map(_sniff_file_safe,filenames):
+            results[filename] = info
+
+    return results
+
+
+def sniff_directory(directory,nthreads=8):
+    """ Reads the headers of all files in a directory and its subdirectories
+    in parallel, returns a dictionary of filename: info for all known files
+    """
+    filenames = []
+    for root,dirs,files in os.walk(directory):
+        for fname in sorted(files):
+            filenames.append(os.path.join(root,fname))
+
+    results = sniff_files(filenames,nthreads)
+    return {f:info for f,info in results.items() if info is not None}
+
+
+def merge_infos(infos):
+    """ Merges the infos of several files of one device, the earliest
+    first and the latest last sample are used
+    """
+    merged = {}
+    for info in infos:
+        if((info is None) or ('error' in info)):
+            continue
+        for k,v in info.items():
+            if(k == 'first_sample'):
+                merged[k] = min(merged.get(k,v),v)
+            elif(k == 'last_sample'):
+                merged[k] = max(merged.get(k,v),v)
+            elif(k not in merged):
+                merged[k] = v
+    return merged
+
+
+def device_fields_from_info(device_dict,info):
+    """ Returns the device fields that can be filled with info. Fields
+    with options are only filled if the value is one of the options
+    """
+    fields = {}
+    for k in ['Serial Number','sampling_interval','frequency','orientation','beam_angle','first_sample','last_sample']:
+        if(k not in info):
+            continue
+        v = device_dict.get(k,'') if hasattr(device_dict,'get') else ''
+        if(isinstance(v,dict) and ('options' in v)):
+            if(str(info[k]) not in [str(op) for op in v['options']]):
+                continue
+        fields[k] = info[k]
+
+    return fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reads the headers of instrument data files and directories')
+    parser.add_argument('paths',nargs='+',help='Data files or directories, directories are read with their subdirectories')
+    parser.add_argument('-j','--nthreads',type=int,default=8,help='Number of threads')
+    parser.add_argument('--json',help='Write the header information of all files into this json file')
+    args = parser.parse_args()
+    results = {}
+    for path in args.paths:
+        if(os.path.isdir(path)):
+            results.update(sniff_directory(path,args.nthreads))
+        else:
+            results.update(sniff_files([path],args.nthreads))
+
+    nerrors = 0
+    for filename,info in results.items():
+        if(info is None):
+            print('{:s}: unknown file format'.format(filename))
+        elif('error' in info):
+            nerrors += 1
+            print('{:s}: could not read header: {:s}'.format(filename,info['error']))
+        else:
+            print('{:s}: {:s}'.format(filename,', '.join('{:s} {:s}'.format(k,str(v)) for k,v in info.items() if k != 'file')))
+    if(args.json is not None):
+        with open(args.json,'w') as f:
+            json.dump(results,f,indent=1,default=str)
+    sys.exit(1 if nerrors > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
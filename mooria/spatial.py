@@ -0,0 +1,89 @@
+""" Spatial index of mooring positions
+
+A regular longitude/latitude grid, every cell holds the indices of the
+positions within. Box and radius queries only look at the positions in
+the cells overlapping the query.
+
+"""
+import numpy as np
+
+EARTH_RADIUS = 6371.0 # [km]
+
+
+def haversine(lon1,lat1,lon2,lat2):
+    """ Distance in km between positions in degrees, works on numpy arrays
+    """
+    lon1,lat1,lon2,lat2 = map(np.deg2rad,(lon1,lat1,lon2,lat2))
+    a = np.sin((lat2 - lat1)/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1)/2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a,0,1)))
+
+
+class gridIndex():
+    """ Grid index of positions with cells of cellsize degrees, positions
+    without coordinates (NaN) are not indexed
+    """
+    def __init__(self,lon=None,lat=None,cellsize=1.0):
+        self.cellsize = cellsize
+        self.build([] if lon is None else lon,[] if lat is None else lat)
+
+    def _cell(self,lon,lat):
+        ix = np.floor((np.asarray(lon) + 180.0)/self.cellsize).astype(np.int64)
+        iy = np.floor((np.asarray(lat) + 90.0)/self.cellsize).astype(np.int64)
+        return ix,iy
+
+    def build(self,lon,lat):
+        self.lon = np.asarray(lon,dtype=float)
+        self.lat = np.asarray(lat,dtype=float)
+        self.cells = {}
+        valid = np.nonzero(np.isfinite(self.lon) & np.isfinite(self.lat))[0]
+        if(len(valid) == 0):
+            return
+        ix,iy = self._cell(self.lon[valid],self.lat[valid])
+        # Sort by cell and split, instead of appending index by index
+        order = np.lexsort((iy,ix))
+        ix = ix[order]
+        iy = iy[order]
+        idx = valid[order]
+        breaks = np.nonzero((np.diff(ix) != 0) | (np.diff(iy) != 0))[0] + 1
+        for start,end in zip(np.concatenate(([0],breaks)),np.concatenate((breaks,[len(idx)]))):
+            self.cells[(int(ix[start]),int(iy[start]))] = idx[start:end]
+
+    def _candidates(self,lonmin,latmin,lonmax,latmax):
+        ix0,iy0 = self._cell(lonmin,latmin)
+        ix1,iy1 = self._cell(lonmax,latmax)
+        ncells = (ix1 - ix0 + 1) * (iy1 - iy0 + 1)
+        if(ncells > len(self.cells)): # Large query, look at all occupied cells
+            keys = [k for k in self.cells if (ix0 <= k[0] <= ix1) and (iy0 <= k[1] <= iy1)]
+        else:
+            keys = [(i,j) for i in range(ix0,ix1 + 1) for j in range(iy0,iy1 + 1) if (i,j) in self.cells]
+        if(len(keys) == 0):
+            return np.zeros(0,dtype=np.int64)
+        return np.concatenate([self.cells[k] for k in keys])
+
+    def query_bbox(self,lonmin,latmin,lonmax,latmax):
+        """ Returns the sorted indices of the positions within the box
+        """
+        cand = self._candidates(lonmin,latmin,lonmax,latmax)
+        inside = (self.lon[cand] >= lonmin) & (self.lon[cand] <= lonmax) & (self.lat[cand] >= latmin) & (self.lat[cand] <= latmax)
+        return np.sort(cand[inside])
+
+    def query_radius(self,lon,lat,radius):
+        """ Returns the indices of the positions within radius km of
+        lon,lat, sorted by distance, and the distances
+        """
+        dlat = np.rad2deg(radius/EARTH_RADIUS)
+        coslat = np.cos(np.deg2rad(min(abs(lat) + dlat,89.9)))
+        dlon = min(dlat/coslat,180.0)
+        latmin = max(lat - dlat,-90)
+        latmax = min(lat + dlat,90)
+        cand = [self._candidates(max(lon - dlon,-180),latmin,min(lon + dlon,180),latmax)]
+        # Wrap around the dateline
+        if(lon - dlon < -180):
+            cand.append(self._candidates(lon - dlon + 360,latmin,180,latmax))
+        if(lon + dlon > 180):
+            cand.append(self._candidates(-180,latmin,lon + dlon - 360,latmax))
+        cand = np.unique(np.concatenate(cand))
+        dist = haversine(lon,lat,self.lon[cand],self.lat[cand])
+        inside = dist <= radius
+        order = np.argsort(dist[inside],kind='stable')
+        return cand[inside][order],dist[inside][order]
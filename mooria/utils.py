@@ -0,0 +1,72 @@
+""" Helper functions to interpret the fields of mooring and device dictionaries
+"""
+import datetime
+
+# The date formats accepted in the moorings table, the first one is used for saving
+DATEFORMATS = ['%Y-%m-%d %H:%M:%S','%Y-%m-%d %H:%M']
+# The reference systems of the device location
+LOCATION_REFSYSTEMS = ['Depth','Above bottom']
+
+
+def parse_datetime(value):
+    """ Converts a date of the moorings table into a datetime object,
+    returns None if the date is empty or invalid
+    """
+    if(isinstance(value,datetime.datetime)):
+        return value
+    if(isinstance(value,datetime.date)):
+        return datetime.datetime(value.year,value.month,value.day)
+    value = str(value).strip()
+    for fmt in DATEFORMATS:
+        try:
+            return datetime.datetime.strptime(value,fmt)
+        except ValueError:
+            pass
+
+    return None
+
+
+def parse_float(value):
+    """ Converts value to float, returns None for empty or invalid values
+    """
+    try:
+        return float(value)
+    except (TypeError,ValueError):
+        return None
+
+
+def parse_location(location):
+    """ Splits the location of a device, e.g. '12.5 Depth' or
+    '2.0 Above bottom', into the value and the reference system.
+    The value is None if not given or invalid
+
+    """
+    location = str(location).strip()
+    for ref in LOCATION_REFSYSTEMS:
+        if(location.lower().endswith(ref.lower())):
+            value = location[:len(location)-len(ref)].strip()
+            return parse_float(value),ref
+
+    # No reference system, depth is the default of the device widget
+    return parse_float(location),'Depth'
+
+
+def device_depth(location,mooring_depth):
+    """ Returns the depth and the meters above bottom (MAB) of a device
+    with the given location in a mooring of depth mooring_depth, the
+    same way as mainWidget.update_mooring_table() does. Unknown values
+    are returned as None
+
+    """
+    value,ref = parse_location(location)
+    mooring_depth = parse_float(mooring_depth)
+    if(value is None):
+        return None,None
+    if(ref == 'Depth'):
+        depth = value
+        mab = None if mooring_depth is None else mooring_depth - value
+    else:
+        mab = value
+        depth = None if mooring_depth is None else mooring_depth - value
+
+    return depth,mab
@@ -0,0 +1,400 @@
+""" Validation of mooring files
+
+The structure of a mooring file, as written by
+mainWidget.save_yaml_summary(), is described by MOORING_SCHEMA and
+DEVICE_SCHEMA. The schemas are compiled once into lists of check
+functions, the devices are additionally checked against the device
+catalog (known device, parameters and the values of fields with
+options). Whole archives can be validated in parallel::
+
+    mooria-validate archive/ -j 8 --report report.json
+
+Errors are reported as dictionaries with the keys 'file', 'path',
+'level' ('error' or 'warning') and 'message'.
+
+"""
+import os
+import sys
+import json
+import datetime
+import argparse
+import concurrent.futures
+import yaml
+
+from .catalog import get_catalog, catalog_version
+from .diff import hash_dict
+from .utils import parse_datetime, parse_float, LOCATION_REFSYSTEMS
+from .compression import open_file, strip_compression
+from .jsonformat import is_json_file, read_json_file
+
+# Use the fast libyaml loader if available
+SafeLoader = getattr(yaml,'CSafeLoader',yaml.SafeLoader)
+
+# Field types of the schema
+#   str:      a string (numbers are accepted as well, e.g. serial numbers)
+#   number:   a number or a string convertible to a number
+#   datetime: a date in one of the formats of utils.DATEFORMATS
+#   location: a device location, e.g. '12.5 Depth'
+#   list:     a list
+# 'required' fields have to exist, 'empty' allows '' as value, the
+# 'default' is used by normalize_mooring_dict for missing fields
+MOORING_SCHEMA = {}
+MOORING_SCHEMA['name']           = {'type':'str','required':True,'empty':False}
+MOORING_SCHEMA['depth']          = {'type':'number','required':True,'empty':True,'min':0}
+MOORING_SCHEMA['longtermseries'] = {'type':'str','default':''}
+MOORING_SCHEMA['lon']            = {'type':'number','default':'','empty':True,'min':-180,'max':360}
+MOORING_SCHEMA['lat']            = {'type':'number','default':'','empty':True,'min':-90,'max':90}
+MOORING_SCHEMA['deployed']       = {'type':'datetime','default':'','empty':True}
+MOORING_SCHEMA['recovered']      = {'type':'datetime','default':'','empty':True}
+MOORING_SCHEMA['comment']        = {'type':'str','default':''}
+MOORING_SCHEMA['campaign']       = {'type':'str','default':''}
+MOORING_SCHEMA['data']           = {'type':'str','default':''} # Status of the data files
+MOORING_SCHEMA['devices']        = {'type':'list','default':[]}
+
+DEVICE_SCHEMA = {}
+DEVICE_SCHEMA['name']            = {'type':'str','required':True,'empty':False}
+DEVICE_SCHEMA['parameter']       = {'type':'list','default':[]}
+DEVICE_SCHEMA['label']           = {'type':'str','default':''}
+DEVICE_SCHEMA['Serial Number']   = {'type':'str','default':''}
+DEVICE_SCHEMA['location']        = {'type':'location','default':''}
+DEVICE_SCHEMA['raw_data']        = {'type':'str','default':''}
+DEVICE_SCHEMA['processed_data']  = {'type':'str','default':''}
+DEVICE_SCHEMA['first_sample']    = {'type':'datetime','default':'','empty':True}
+DEVICE_SCHEMA['last_sample']     = {'type':'datetime','default':'','empty':True}
+
+
+def error(path,message,level='error'):
+    return {'path':path,'level':level,'message':message}
+
+
+def _is_empty(value):
+    return (value is None) or (isinstance(value,str) and (value.strip() == ''))
+
+
+def _compile_field(key,spec):
+    """ Returns a function checking a single field according to spec
+    """
+    ftype    = spec['type']
+    required = spec.get('required',False)
+    empty    = spec.get('empty',True)
+    vmin     = spec.get('min',None)
+    vmax     = spec.get('max',None)
+
+    def check_str(value):
+        if(isinstance(value,(str,int,float))):
+            return None
+        return 'expected a string, got {:s}'.format(type(value).__name__)
+
+    def check_number(value):
+        v = parse_float(value)
+        if((v is None) or isinstance(value,bool)):
+            return 'expected a number, got {:s}'.format(repr(value))
+        if((vmin is not None) and (v < vmin)):
+            return 'value {:f} smaller than {:f}'.format(v,vmin)
+        if((vmax is not None) and (v > vmax)):
+            return 'value {:f} larger than {:f}'.format(v,vmax)
+        return None
+
+    def check_datetime(value):
+        if(parse_datetime(value) is None):
+            return 'expected a date of the form yyyy-mm-dd HH:MM(:SS), got {:s}'.format(repr(value))
+        return None
+
+    def check_location(value):
+        location = str(value).strip()
+        for ref in LOCATION_REFSYSTEMS:
+            if(location.lower().endswith(ref.lower())):
+                location = location[:len(location)-len(ref)].strip()
+                break
+        if((location != '') and (parse_float(location) is None)):
+            return 'expected a location of the form "12.5 Depth" or "2.0 Above bottom", got {:s}'.format(repr(value))
+        return None
+
+    def check_list(value):
+        if(isinstance(value,list)):
+            return None
+        return 'expected a list, got {:s}'.format(type(value).__name__)
+
+    checks = {'str':check_str,'number':check_number,'datetime':check_datetime,'location':check_location,'list':check_list}
+    check_value = checks[ftype]
+
+    def check(d,path,errors):
+        try:
+            value = d[key]
+        except KeyError:
+            if(required):
+                errors.append(error(path,'missing required field "{:s}"'.format(key)))
+            return
+        if(_is_empty(value)):
+            if(not empty):
+                errors.append(error(path + '.' + key,'field must not be empty'))
+            return
+        msg = check_value(value)
+        if(msg is not None):
+            errors.append(error(path + '.' + key,msg))
+
+    return check
+
+
+def compile_schema(schema):
+    """ Compiles a schema into a function validate(d,path,errors), which
+    appends the errors found in the dictionary d to the list errors
+    """
+    checks = [_compile_field(key,schema[key]) for key in schema]
+    def validate(d,path,errors):
+        if(not isinstance(d,dict)):
+            errors.append(error(path,'expected a dictionary, got {:s}'.format(type(d).__name__)))
+            return False
+        for check in checks:
+            check(d,path,errors)
+        return True
+
+    return validate
+
+
+def compile_device_catalog(devices):
+    """ Compiles the device catalog into a dictionary of functions,
+    one per device, checking a device dictionary against the catalog
+    entry of the device
+    """
+    compiled = {}
+    for name in devices:
+        compiled[name] = _compile_catalog_device(name,devices[name])
+
+    return compiled
+
+
+def _compile_catalog_device(name,device_dict):
+    options = {}
+    parameter = None
+    for k in device_dict:
+        v = device_dict[k]
+        if(k.lower() == 'parameter'):
+            parameter = set(str(p) for p in v)
+        elif(isinstance(v,dict) and ('options' in v)):
+            options[k] = set(str(op) for op in v['options'])
+
+    known = set(device_dict.keys()) | set(DEVICE_SCHEMA.keys())
+    def check(d,path,errors):
+        for k in d:
+            if(k not in known):
+                errors.append(error(path + '.' + k,'field not in catalog entry of device "{:s}"'.format(name),level='warning'))
+        for k in options:
+            if(k in d):
+                value = d[k]
+                if(isinstance(value,dict)): # Not chosen, the options of the catalog
+                    continue
+                if((not _is_empty(value)) and (str(value) not in options[k])):
+                    errors.append(error(path + '.' + k,'value {:s} is not one of the options {:s}'.format(repr(value),str(sorted(options[k])))))
+        if((parameter is not None) and isinstance(d.get('parameter',None),list)):
+            for par in d['parameter']:
+                if(str(par) not in parameter):
+                    errors.append(error(path + '.parameter','parameter {:s} not measured by device "{:s}"'.format(repr(par),name)))
+
+    return check
+
+
+def validate_catalog(devices):
+    """ Checks the entries of a device catalog, returns a list of errors
+    """
+    errors = []
+    for name in devices:
+        path = name
+        d = devices[name]
+        if(not isinstance(d,dict)):
+            errors.append(error(path,'expected a dictionary, got {:s}'.format(type(d).__name__)))
+            continue
+        for k in d:
+            v = d[k]
+            if(k.lower() == 'parameter'):
+                if((not isinstance(v,list)) or (not all(isinstance(p,str) for p in v))):
+                    errors.append(error(path + '.' + k,'expected a list of parameter names'))
+            elif(k == 'hardware'):
+                if(not isinstance(v,bool)):
+                    errors.append(error(path + '.' + k,'expected true or false'))
+            elif(isinstance(v,dict)):
+                if((not 'options' in v) or (not isinstance(v['options'],list)) or (len(v['options']) == 0)):
+                    errors.append(error(path + '.' + k,'expected a non empty list of "options"'))
+            elif(isinstance(v,list)):
+                errors.append(error(path + '.' + k,'lists are only allowed for "parameter", use "options" for choices'))
+
+    return errors
+
+
+# The compiled schemas
+validate_mooring_fields = compile_schema(MOORING_SCHEMA)
+validate_device_fields  = compile_schema(DEVICE_SCHEMA)
+_catalog_validators = {'key':None,'compiled':None}
+
+
+def get_catalog_validators(devices=None):
+    """ Returns the compiled catalog validators, they are compiled again
+    if the catalog has changed. The device catalog of mooria is known by
+    its version, other dictionaries of devices by their content hash
+    """
+    version = catalog_version(devices)
+    if(version is None):
+        key = ('devices',hash_dict(devices))
+    else:
+        key = ('catalog',version)
+        devices = get_catalog().devices
+    if((_catalog_validators['key'] != key) or (_catalog_validators['compiled'] is None)):
+        _catalog_validators['key']      = key
+        _catalog_validators['compiled'] = compile_device_catalog(devices)
+
+    return _catalog_validators['compiled']
+
+
+def validate_mooring_dict(data,devices=None):
+    """ Validates a dictionary as created by mainWidget.create_mooring_dict(),
+    returns a list of errors
+    """
+    errors = []
+    if((not isinstance(data,dict)) or ('moorings' not in data)):
+        errors.append(error('','expected a dictionary with the key "moorings"'))
+        return errors
+    if(not isinstance(data['moorings'],list)):
+        errors.append(error('moorings','expected a list of moorings'))
+        return errors
+
+    catalog_validators = get_catalog_validators(devices)
+    for i,mooring in enumerate(data['moorings']):
+        path = 'moorings[{:d}]'.format(i)
+        if(not validate_mooring_fields(mooring,path,errors)):
+            continue
+        deployed  = parse_datetime(mooring.get('deployed',''))
+        recovered = parse_datetime(mooring.get('recovered',''))
+        if((deployed is not None) and (recovered is not None) and (recovered < deployed)):
+            errors.append(error(path + '.recovered','recovered before deployed'))
+        mdevices = mooring.get('devices',[])
+        if(not isinstance(mdevices,list)):
+            continue
+        for j,device in enumerate(mdevices):
+            dpath = path + '.devices[{:d}]'.format(j)
+            if(not validate_device_fields(device,dpath,errors)):
+                continue
+            name = device.get('name',None)
+            try:
+                check = catalog_validators[name]
+            except (KeyError,TypeError):
+                errors.append(error(dpath + '.name','device {:s} not in device catalog'.format(repr(name)),level='warning'))
+                continue
+            check(device,dpath,errors)
+
+    return errors
+
+
+def normalize_mooring_dict(data):
+    """ Fills missing optional fields of moorings and devices with their
+    defaults, such that older or hand edited files can be loaded. The
+    dictionary is changed in place and returned
+    """
+    for mooring in data.get('moorings',[]):
+        if(not isinstance(mooring,dict)):
+            continue
+        for key,spec in MOORING_SCHEMA.items():
+            if(key not in mooring):
+                mooring[key] = spec.get('default','')
+        for device in mooring.get('devices',[]):
+            if(not isinstance(device,dict)):
+                continue
+            for key,spec in DEVICE_SCHEMA.items():
+                if(key not in device):
+                    device[key] = spec.get('default','')
+
+    return data
+
+
+def validate_file(filename,devices=None):
+    """ Validates a mooring file, returns a list of errors
+    """
+    try:
+        if(is_json_file(filename)):
+            data = read_json_file(filename)
+        else:
+            with open_file(filename,'r') as f:
+                data = yaml.load(f,Loader=SafeLoader)
+    except Exception as e:
+        errors = [error('','could not read file: {:s}'.format(str(e)))]
+    else:
+        errors = validate_mooring_dict(data,devices)
+
+    for e in errors:
+        e['file'] = filename
+
+    return errors
+
+
+def list_mooring_files(path,extensions=('.yaml','.yml','.json')):
+    """ Returns all mooring files in path and its subdirectories,
+    compressed files included
+    """
+    if(os.path.isfile(path)):
+        return [path]
+    filenames = []
+    for root,dirs,files in os.walk(path):
+        dirs.sort()
+        for fname in sorted(files):
+            if(strip_compression(fname).lower().endswith(extensions)):
+                filenames.append(os.path.join(root,fname))
+
+    return filenames
+
+
+def validate_directory(paths,nprocs=None,devices=None):
+    """ Validates all mooring files in the directories or files given in
+    paths with nprocs processes (default: number of CPUs). Returns a
+    report dictionary with the number of files, valid and invalid files
+    and the errors per file
+    """
+    if(isinstance(paths,str)):
+        paths = [paths]
+    filenames = []
+    for path in paths:
+        filenames.extend(list_mooring_files(path))
+
+    if(devices is None):
+        devices = get_catalog().devices
+    devices = dict(devices)
+    results = {}
+    if((nprocs == 1) or (len(filenames) < 2)):
+        for filename in filenames:
+            results[filename] = validate_file(filename,devices)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nprocs) as executor:
+            chunksize = max(1,len(filenames)//(4 * (nprocs or os.cpu_count() or 1)))
+            for filename,errors in zip(filenames,executor.map(validate_file,filenames,[devices]*len(filenames),chunksize=chunksize)):
+                results[filename] = errors
+
+    report = {}
+    report['date']     = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    report['files']    = len(filenames)
+    report['invalid']  = [f for f in filenames if any(e['level'] == 'error' for e in results[f])]
+    report['valid']    = len(filenames) - len(report['invalid'])
+    report['errors']   = {f:results[f] for f in filenames if len(results[f]) > 0}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validates mooring files')
+    parser.add_argument('paths',nargs='+',help='Mooring files or directories')
+    parser.add_argument('-j','--nprocs',type=int,default=None,help='Number of processes, default number of CPUs')
+    parser.add_argument('--report',default=None,help='Write the report as json into this file')
+    parser.add_argument('--warnings',action='store_true',help='Print warnings as well')
+    args = parser.parse_args()
+    report = validate_directory(args.paths,nprocs=args.nprocs)
+    for filename,errors in report['errors'].items():
+        for e in errors:
+            if((e['level'] == 'error') or args.warnings):
+                print('{:s}: {:s}: {:s}: {:s}'.format(filename,e['level'],e['path'],e['message']))
+
+    print('{:d} files, {:d} valid, {:d} invalid'.format(report['files'],report['valid'],len(report['invalid'])))
+    if(args.report is not None):
+        with open(args.report,'w') as f:
+            json.dump(report,f,indent=1)
+
+    sys.exit(1 if len(report['invalid']) > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
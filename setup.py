@@ -22,10 +22,11 @@ setup(name='mooria',
       license='GPLv03',
       packages=find_packages(),
       scripts = [],
-      entry_points={ 'console_scripts': ['mooria=mooria.mooria:main']},      
+      entry_points={ 'console_scripts': ['mooria=mooria.mooria:main','mooria-generate=mooria.generator:main','mooria-validate=mooria.validate:main','mooria-diff=mooria.diff:main','mooria-import=mooria.fileio:main','mooria-iso19115=mooria.iso19115:main','mooria-export=mooria.export:main','mooria-bulkedit=mooria.bulkedit:main','mooria-sniff=mooria.sniff:main']},      
       package_data = {'':['VERSION','devices/*.yaml']},
       #package_data = {'':['VERSION','devices/iow_stations.yaml','ships/ships.yaml']},
       install_requires=[ 'pyaml','geojson'],
+      extras_require={'zstd':['zstandard']},
       zip_safe=False)
 
 
@@ -0,0 +1,46 @@
+from mooria import cache as cachemodule
+from mooria.cache import artifactCache, artifact_key, cached_map
+
+
+def test_cached_map(tmp_path):
+    cache = artifactCache(str(tmp_path / 'artifacts.sqlite'))
+    calls = []
+    def func(item):
+        calls.append(item['name'])
+        return item['name'].encode('utf-8')
+
+    items = [{'name':'M1'},{'name':'M2'},{'name':'M1'}]
+    assert cached_map(cache,'test',1,{},items,func) == [b'M1',b'M2',b'M1']
+    assert calls == ['M1','M2']
+    # Unchanged items are taken from the cache
+    items[1]['name'] = 'M3'
+    assert cached_map(cache,'test',1,{},items,func) == [b'M1',b'M3',b'M1']
+    assert calls == ['M1','M2','M3']
+    # Another version or other options create the artifacts again
+    cached_map(cache,'test',2,{},items[:1],func)
+    cached_map(cache,'test',1,{'option':True},items[:1],func)
+    assert calls == ['M1','M2','M3','M1','M1']
+    assert cached_map(None,'test',1,{},items[:1],func) == [b'M1']
+    cache.close()
+
+
+def test_eviction(tmp_path,monkeypatch):
+    now = [0.0]
+    def clock():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(cachemodule.time,'time',clock)
+    cache = artifactCache(str(tmp_path / 'artifacts.sqlite'),maxsize=250)
+    keys = [artifact_key('test',1,{},{'name':n}) for n in ('M1','M2','M3')]
+    cache.put(keys[0],b'1' * 100)
+    cache.put(keys[1],b'2' * 100)
+    assert cache.get(keys[0]) == b'1' * 100 # M1 is now used more recently than M2
+    cache.put(keys[2],b'3' * 100)
+    assert cache.size() == 200
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.evict(0) == 2
+    assert cache.size() == 0
+    cache.close()
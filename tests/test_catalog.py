@@ -0,0 +1,76 @@
+import pytest
+
+from mooria.catalog import catalogIndex, deviceDict, deviceCatalog
+
+DEVICES = {'Microcat':{'company':'Sea-Bird Scientific','parameter':['T','C','P']},
+           'ADCP 300kHz':{'company':'Teledyne RDI','parameter':['U','V','W']},
+           'Aquadopp':{'company':'Nortek','parameter':['U','V','P']}}
+
+
+def test_search():
+    index = catalogIndex(DEVICES)
+    assert index.search('') is None
+    assert index.search('micro') == {'Microcat'}
+    assert index.search('sea-bird') == {'Microcat'}
+    assert index.search('u') == {'ADCP 300kHz','Aquadopp'}
+    # Several terms are combined with AND
+    assert index.search('nortek u') == {'Aquadopp'}
+    assert index.search('NORTEK t') == set()
+    assert index.search('xyz') == set()
+
+
+def test_search_rebuild():
+    index = catalogIndex(DEVICES)
+    devices = dict(DEVICES,Seaguard={'company':'Aanderaa','parameter':['U','V']})
+    index.build(devices)
+    assert index.search('aan') == {'Seaguard'}
+
+
+def test_device_dict():
+    template = {'name':'Microcat','sampling_interval':60,'parameter':['T','C','P']}
+    d1 = deviceDict(template,{'Serial Number':'1001'})
+    d2 = deviceDict(template)
+    assert dict(d1) == {'name':'Microcat','sampling_interval':60,'parameter':['T','C','P'],'Serial Number':'1001'}
+    # Values equal to the template are not stored, numbers compare with their string
+    d1['sampling_interval'] = '60'
+    assert d1.overrides == {'Serial Number':'1001'}
+    d1['sampling_interval'] = 30
+    assert d1['sampling_interval'] == 30
+    assert d2['sampling_interval'] == 60
+    assert template['sampling_interval'] == 60
+    # The template cannot be changed through the device
+    with pytest.raises(TypeError):
+        d1.template['name'] = 'ADCP'
+
+
+def test_device_dict_delete_and_copy():
+    template = {'name':'Microcat','comment':''}
+    d = deviceDict(template,{'location':'100'})
+    del d['comment']
+    assert 'comment' not in d
+    assert list(d) == ['name','location']
+    with pytest.raises(KeyError):
+        d['comment']
+    with pytest.raises(KeyError):
+        del d['comment']
+    c = d.copy()
+    c['comment'] = 'new'
+    assert c['comment'] == 'new'
+    assert 'comment' not in d
+    assert c.template is d.template
+    d['comment'] = ''
+    assert d['comment'] == ''
+    assert len(d) == 3
+
+
+def test_catalog_version(tmp_path):
+    with open(str(tmp_path / 'devices.yaml'),'w') as f:
+        f.write('Microcat:\n  parameter: [T, C]\n')
+    catalog = deviceCatalog([str(tmp_path)])
+    version = catalog.version
+    assert catalog.rescan() == set()
+    assert catalog.version == version
+    with open(str(tmp_path / 'more.yaml'),'w') as f:
+        f.write('Seaguard:\n  parameter: [U, V]\n')
+    assert catalog.rescan() == {'Seaguard'}
+    assert catalog.version == version + 1
@@ -0,0 +1,93 @@
+import copy
+
+from mooria.diff import diff_moorings, merge_moorings, merge_items, merge_device, device_key
+
+
+def make_collection():
+    devices = [{'name':'Microcat','Serial Number':'1001','location':'100','parameter':['T','C','P']},
+               {'name':'ADCP','Serial Number':'2001','location':'200','parameter':['U','V']}]
+    moorings = [{'name':'M1','deployed':'2020-01-01 00:00:00','depth':'1000','comment':'','devices':devices},
+                {'name':'M2','deployed':'2020-02-01 00:00:00','depth':'2000','comment':'','devices':[]}]
+    return {'moorings':moorings}
+
+
+def test_diff_moorings():
+    old = make_collection()
+    new = copy.deepcopy(old)
+    new['moorings'][0]['depth'] = '1010'
+    new['moorings'][0]['devices'][1]['location'] = '210'
+    new['moorings'].append({'name':'M3','deployed':'2021-01-01 00:00:00','devices':[]})
+    result = diff_moorings(old,new)
+    assert result['added'] == [('M3','2021-01-01 00:00:00',0)]
+    assert result['removed'] == []
+    assert result['unchanged'] == 1
+    assert len(result['changed']) == 1
+    change = result['changed'][0]
+    assert change['fields'] == {'depth':('1000','1010')}
+    assert change['devices']['changed'][0]['key'] == ('ADCP','2001',0)
+    assert change['devices']['changed'][0]['fields'] == {'location':('200','210')}
+
+
+def test_merge_one_side_changed():
+    base = make_collection()
+    ours = copy.deepcopy(base)
+    theirs = copy.deepcopy(base)
+    theirs['moorings'][1]['comment'] = 'recovered early'
+    theirs['moorings'][0]['devices'][0]['location'] = '110'
+    merged,conflicts = merge_moorings(base,ours,theirs)
+    assert conflicts == []
+    assert merged == theirs
+
+
+def test_merge_both_sides_changed():
+    base = make_collection()
+    ours = copy.deepcopy(base)
+    theirs = copy.deepcopy(base)
+    ours['moorings'][0]['comment'] = 'ours'
+    theirs['moorings'][0]['depth'] = '1010'
+    merged,conflicts = merge_moorings(base,ours,theirs)
+    assert conflicts == []
+    assert merged['moorings'][0]['comment'] == 'ours'
+    assert merged['moorings'][0]['depth'] == '1010'
+
+    # The same field changed differently, ours is kept
+    theirs['moorings'][0]['comment'] = 'theirs'
+    merged,conflicts = merge_moorings(base,ours,theirs)
+    assert merged['moorings'][0]['comment'] == 'ours'
+    assert len(conflicts) == 1
+    assert conflicts[0]['mooring'] == ('M1','2020-01-01 00:00:00',0)
+    assert conflicts[0]['field'] == 'comment'
+    assert (conflicts[0]['base'],conflicts[0]['ours'],conflicts[0]['theirs']) == ('','ours','theirs')
+
+
+def test_merge_removed_and_changed():
+    base = make_collection()
+    ours = copy.deepcopy(base)
+    theirs = copy.deepcopy(base)
+    del ours['moorings'][1]
+    theirs['moorings'][1]['depth'] = '2010'
+    merged,conflicts = merge_moorings(base,ours,theirs)
+    assert [m['name'] for m in merged['moorings']] == ['M1','M2']
+    assert merged['moorings'][1]['depth'] == '2010'
+    assert len(conflicts) == 1
+    assert conflicts[0]['message'] == 'removed by ours, changed by theirs'
+
+    # Removed on one side and unchanged on the other side is removed
+    theirs = copy.deepcopy(base)
+    merged,conflicts = merge_moorings(base,ours,theirs)
+    assert conflicts == []
+    assert [m['name'] for m in merged['moorings']] == ['M1']
+
+
+def test_merge_duplicate_keys():
+    # Two devices without serial number have the same key, they are told apart by their order
+    base = [{'name':'Microcat','location':'100'},{'name':'Microcat','location':'200'}]
+    ours = copy.deepcopy(base)
+    theirs = copy.deepcopy(base)
+    ours[0]['location'] = '110'
+    theirs[1]['location'] = '210'
+    theirs.append({'name':'Microcat','location':'300'})
+    conflicts = []
+    merged = merge_items(base,ours,theirs,device_key,merge_device,conflicts,{'level':'device','mooring':None,'device':None})
+    assert conflicts == []
+    assert [d['location'] for d in merged] == ['110','210','300']
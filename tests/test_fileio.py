@@ -0,0 +1,42 @@
+import copy
+
+from mooria.fileio import write_mooring_file, read_mooring_files, known_moorings, mooring_identity, describe_duplicate
+
+
+def make_collection():
+    devices = [{'name':'Microcat','Serial Number':'1001','location':'100','parameter':['T','C','P']}]
+    moorings = [{'name':'M1','lon':'10.0','lat':'54.0','deployed':'2020-01-01 00:00:00','depth':'1000','devices':devices},
+                {'name':'M2','lon':'11.0','lat':'55.0','deployed':'2020-02-01 00:00:00','depth':'2000','devices':[]}]
+    return {'moorings':moorings}
+
+
+def test_read_duplicates(tmp_path):
+    data = make_collection()
+    changed = copy.deepcopy(data)
+    changed['moorings'][1]['depth'] = '2010'
+    write_mooring_file(data,str(tmp_path / 'a.yaml'))
+    write_mooring_file(changed,str(tmp_path / 'b.yaml'))
+    collection,report = read_mooring_files([str(tmp_path / 'a.yaml'),str(tmp_path / 'b.yaml')],nprocs=1)
+    assert [m['name'] for m in collection['moorings']] == ['M1','M2']
+    assert [(d['name'],d['identical']) for d in report['duplicates']] == [('M1',True),('M2',False)]
+    assert 'is a different version of' in describe_duplicate(report['duplicates'][1])
+
+
+def test_reimport_known(tmp_path):
+    # Reimporting an unchanged file reports copies of the known moorings
+    data = make_collection()
+    filename = str(tmp_path / 'a.yaml')
+    write_mooring_file(data,filename)
+    collection,_ = read_mooring_files(filename,nprocs=1)
+    known = known_moorings(collection['moorings'],'moorings table')
+    collection,report = read_mooring_files(filename,nprocs=1,known=known)
+    assert collection['moorings'] == []
+    assert [d['identical'] for d in report['duplicates']] == [True,True]
+    assert report['duplicates'][0]['duplicate_of'] == 'moorings table'
+
+    # Without a content hash only the identity is known
+    known = {mooring_identity(data['moorings'][0]):('moorings table',None)}
+    collection,report = read_mooring_files(filename,nprocs=1,known=known)
+    assert [m['name'] for m in collection['moorings']] == ['M2']
+    assert report['duplicates'][0]['identical'] is None
+    assert 'name, position and deployment date' in describe_duplicate(report['duplicates'][0])
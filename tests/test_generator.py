@@ -0,0 +1,16 @@
+from mooria.catalog import get_catalog, is_hardware
+from mooria.generator import create_campaign
+
+
+def test_campaign_without_hardware():
+    devices = get_catalog().devices
+    assert is_hardware('Float',devices)
+    data = create_campaign(50,seed=1,devices=devices)
+    names = set(d['name'] for m in data['moorings'] for d in m['devices'])
+    assert len(names) > 0
+    assert not any(is_hardware(name,devices) for name in names)
+    assert all('hardware' not in d for m in data['moorings'] for d in m['devices'])
+
+
+def test_reproducible():
+    assert create_campaign(20,seed=3) == create_campaign(20,seed=3)
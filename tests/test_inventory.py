@@ -0,0 +1,33 @@
+from mooria.inventory import build_inventory, find_double_bookings
+
+
+def mooring(name,deployed,recovered,lon,lat,serials):
+    devices = [{'name':'Microcat','Serial Number':s} for s in serials]
+    return {'name':name,'deployed':deployed,'recovered':recovered,'lon':lon,'lat':lat,'devices':devices}
+
+
+def test_inventory():
+    data = {'moorings':[mooring('M1','2020-01-01 00:00:00','2020-06-01 00:00:00','10.0','54.0',['1001','']),
+                        mooring('M2','2020-07-01 00:00:00','2020-12-01 00:00:00','10.0','54.0',['1001'])]}
+    inventory = build_inventory(data)
+    assert list(inventory) == [('Microcat','1001')]
+    assert [d['mooring'] for d in inventory[('Microcat','1001')]] == ['M1','M2']
+    assert find_double_bookings(inventory) == []
+
+
+def test_double_bookings():
+    data = {'moorings':[mooring('M1','2020-01-01 00:00:00','2020-06-01 00:00:00','10.0','54.0',['1001','1002']),
+                        mooring('M2','2020-05-01 00:00:00','2020-12-01 00:00:00','10.0','54.0',['1001']),
+                        mooring('M3','2020-03-01 00:00:00','2020-04-01 00:00:00','12.0','55.0',['1002']),
+                        mooring('M4','2020-03-01 00:00:00','','12.0','55.0',['1001'])]}
+    conflicts = find_double_bookings(build_inventory(data))
+    found = sorted((c['key'][1],c['type'],c['first']['mooring'],c['second']['mooring']) for c in conflicts)
+    # M4 has no recovery date and is not checked
+    assert found == [('1001','overlap','M1','M2'),('1002','position','M1','M3')]
+
+
+def test_hardware_not_in_inventory():
+    devices = {'Microcat':{'name':'Microcat','parameter':['T']},'Release':{'name':'Release','hardware':True,'parameter':[]}}
+    data = {'moorings':[mooring('M1','2020-01-01 00:00:00','2020-06-01 00:00:00','10.0','54.0',['1001'])]}
+    data['moorings'][0]['devices'].append({'name':'Release','Serial Number':'77'})
+    assert list(build_inventory(data,devices)) == [('Microcat','1001')]
@@ -0,0 +1,46 @@
+import pytest
+
+from mooria import jsonformat
+from mooria.jsonformat import FORMAT, FORMAT_VERSION, migrate, dumps_json, loads_json, export_json, read_json_file
+
+
+def make_collection():
+    return {'moorings':[{'name':'M1','depth':'1000','devices':[{'name':'Microcat','location':'100'}]}]}
+
+
+def test_migrate_unversioned():
+    data = migrate(make_collection())
+    assert data['version'] == FORMAT_VERSION
+    assert data['format'] == FORMAT
+    # Missing optional fields are filled by the migration from version 0
+    assert 'campaign' in data['moorings'][0]
+    assert data['moorings'][0]['devices'][0]['Serial Number'] == ''
+
+
+def test_migrate_newer_version():
+    with pytest.raises(ValueError):
+        migrate({'version':FORMAT_VERSION + 1,'moorings':[]})
+    with pytest.raises(ValueError):
+        migrate({'version':'1','moorings':[]})
+
+
+def test_migration_chain(monkeypatch):
+    # A new version registers the migration from the previous one
+    monkeypatch.setattr(jsonformat,'FORMAT_VERSION',FORMAT_VERSION + 1)
+    monkeypatch.setitem(jsonformat.MIGRATIONS,FORMAT_VERSION,lambda data: dict(data,renamed=True))
+    data = migrate({'version':FORMAT_VERSION,'moorings':[]})
+    assert data['version'] == FORMAT_VERSION + 1
+    assert data['renamed']
+
+
+def test_roundtrip(tmp_path):
+    data = migrate(make_collection())
+    for compact in (False,True):
+        s = dumps_json(data,compact)
+        assert ('\n' not in s) == compact
+        assert loads_json(s) == data
+    filename = str(tmp_path / 'moorings.json.gz')
+    export_json(data,filename,compact=True)
+    assert read_json_file(filename) == data
+    with pytest.raises(ValueError):
+        loads_json('{"moorings":[]}')
@@ -0,0 +1,51 @@
+import numpy as np
+
+from mooria.mechanics import G, RHO, LINE_WEIGHT, LINE_DIAMETER, LINE_CD, mooring_elements, solve_static
+
+
+def make_mooring():
+    devices = [{'name':'Microcat','location':'50 Above bottom','buoyancy':'0','weight':'1','drag_area':'0.05'},
+               {'name':'Float','location':'90 Above bottom','buoyancy':'100','weight':'','drag_area':'0.5'}]
+    return {'name':'M1','depth':'100','devices':devices}
+
+
+def test_elements():
+    elements = mooring_elements(make_mooring())
+    assert elements['names'] == ['Microcat','Float']
+    np.testing.assert_allclose(elements['length'],[50,40])
+    np.testing.assert_allclose(elements['net'],[-G,100 * G])
+    np.testing.assert_allclose(elements['line_net'],[-50 * LINE_WEIGHT,-40 * LINE_WEIGHT])
+
+
+def test_force_balance():
+    # A uniform current, the drag does not depend on the positions
+    u = 0.5
+    elements = mooring_elements(make_mooring())
+    result = solve_static(elements,[0],[[u]])
+    assert result['converged']
+    drag_line  = 0.5 * RHO * LINE_CD * LINE_DIAMETER * np.array([50,40]) * u**2
+    drag_float = 0.5 * RHO * 0.5 * u**2
+    drag_total = 0.5 * RHO * 0.55 * u**2 + drag_line.sum()
+    net_total  = 99 * G - 90 * LINE_WEIGHT
+    # The anchor holds all forces of the mooring
+    np.testing.assert_allclose(result['anchor_horizontal'],[drag_total])
+    np.testing.assert_allclose(result['anchor_vertical'],[net_total])
+    np.testing.assert_allclose(result['anchor_tension'],[np.hypot(drag_total,net_total)])
+    # The top segment holds the float
+    np.testing.assert_allclose(result['tension'][0,1],np.hypot(drag_float,100 * G))
+    incl = np.rad2deg(np.arctan2(drag_float + drag_line[1]/2,100 * G - 40 * LINE_WEIGHT/2))
+    np.testing.assert_allclose(result['inclination'][0,1],incl)
+    # The devices move down and downstream
+    assert np.all(result['knockdown'] > 0)
+    assert np.all(result['offset'] > 0)
+    assert not result['slack'][0]
+
+
+def test_no_current():
+    elements = mooring_elements(make_mooring())
+    result = solve_static(elements,[0,100],[[0,0]])
+    np.testing.assert_allclose(result['knockdown'],0,atol=1e-9)
+    np.testing.assert_allclose(result['inclination'],0,atol=1e-9)
+    np.testing.assert_allclose(result['offset'],0,atol=1e-9)
+    np.testing.assert_allclose(result['depth'],[[50,10]])
+    np.testing.assert_allclose(result['anchor_horizontal'],[0],atol=1e-9)
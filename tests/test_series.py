@@ -0,0 +1,42 @@
+import numpy as np
+
+from mooria.series import analyze_intervals, analyze_series
+
+DAY = np.timedelta64(1,'D')
+
+
+def mooring(name,deployed,recovered,series='S1'):
+    return {'name':name,'longtermseries':series,'deployed':deployed,'recovered':recovered}
+
+
+def test_gaps_and_overlaps():
+    data = {'moorings':[mooring('M3','2020-03-01 00:00:00','2020-05-01 00:00:00'),
+                        mooring('M1','2020-01-01 00:00:00','2020-02-01 00:00:00'),
+                        mooring('M2','2020-02-11 00:00:00','2020-03-11 00:00:00'),
+                        mooring('M4','2020-04-01 00:00:00','',),
+                        mooring('X1','2020-01-01 00:00:00','2021-01-01 00:00:00',series='')]}
+    results = analyze_series(data)
+    assert list(results) == ['S1']
+    r = results['S1']
+    assert r['names'] == ['M1','M2','M3']
+    assert r['undated'] == ['M4']
+    assert r['start'] == np.datetime64('2020-01-01')
+    assert r['end'] == np.datetime64('2020-05-01')
+    np.testing.assert_array_equal(r['gaps'],np.array([['2020-02-01','2020-02-11']],dtype='datetime64[s]'))
+    np.testing.assert_array_equal(r['overlaps'],np.array([['2020-03-01','2020-03-11']],dtype='datetime64[s]'))
+    assert r['covered'] == r['span'] - 10 * DAY
+
+
+def test_nested_deployment():
+    # A short deployment within a long one neither opens a gap nor ends the coverage
+    start = np.array(['2020-01-01','2020-02-01','2020-06-01'],dtype='datetime64[s]')
+    end   = np.array(['2020-05-01','2020-03-01','2020-07-01'],dtype='datetime64[s]')
+    r = analyze_intervals(start,end)
+    np.testing.assert_array_equal(r['gaps'],np.array([['2020-05-01','2020-06-01']],dtype='datetime64[s]'))
+    np.testing.assert_array_equal(r['overlaps'],np.array([['2020-02-01','2020-03-01']],dtype='datetime64[s]'))
+
+
+def test_empty_series():
+    r = analyze_intervals(np.zeros(0,dtype='datetime64[s]'),np.zeros(0,dtype='datetime64[s]'))
+    assert r['start'] is None
+    assert len(r['gaps']) == 0
@@ -0,0 +1,120 @@
+import json
+import asyncio
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from mooria.fileio import write_mooring_file
+from mooria.generator import create_campaign
+from mooria.server import collectionCache, mooriaServer
+from mooria.spatial import haversine
+from mooria.utils import parse_datetime
+
+
+@pytest.fixture
+def server(tmp_path):
+    """ Serves a generated mooring file on an ephemeral port, yields the
+    base url, the filename and the moorings of the file
+    """
+    filename = str(tmp_path / 'campaign.yaml')
+    data = create_campaign(60,seed=5)
+    write_mooring_file(data,filename)
+    cache = collectionCache([filename],interval=0)
+    cache.refresh()
+    loop = asyncio.new_event_loop()
+    started = loop.run_until_complete(asyncio.start_server(mooriaServer(cache).handle,'127.0.0.1',0))
+    port = started.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield 'http://127.0.0.1:{:d}'.format(port),filename,data['moorings']
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    started.close()
+    loop.run_until_complete(started.wait_closed())
+    loop.close()
+
+
+def get(url):
+    with urllib.request.urlopen(url,timeout=10) as f:
+        return f.headers.get('Content-Type'),f.read().decode('utf-8')
+
+
+def get_json(url):
+    return json.loads(get(url)[1])
+
+
+def get_error(url):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        get(url)
+    return e.value.code,json.loads(e.value.read().decode('utf-8'))['error']
+
+
+def test_pagination(server):
+    url,filename,moorings = server
+    page = get_json(url + '/moorings?offset=10&limit=20')
+    assert (page['total'],page['offset'],page['limit']) == (60,10,20)
+    assert [m['id'] for m in page['items']] == list(range(10,30))
+    assert [m['name'] for m in page['items']] == [m['name'] for m in moorings[10:30]]
+    assert 'devices' not in page['items'][0]
+    assert page['items'][0]['ndevices'] == len(moorings[10]['devices'])
+    assert get_json(url + '/moorings?offset=55')['items'][-1]['id'] == 59
+    mooring = get_json(url + '/moorings/3')
+    assert [d['Serial Number'] for d in mooring['devices']] == [d['Serial Number'] for d in moorings[3]['devices']]
+    assert mooring['file'] == filename
+
+
+def test_filters(server):
+    url,filename,moorings = server
+    lon = np.array([float(m['lon']) for m in moorings])
+    lat = np.array([float(m['lat']) for m in moorings])
+    page = get_json(url + '/moorings?bbox=12,55,16,57&limit=1000')
+    inside = (lon >= 12) & (lon <= 16) & (lat >= 55) & (lat <= 57)
+    assert sorted(m['id'] for m in page['items']) == list(np.nonzero(inside)[0])
+
+    page = get_json(url + '/moorings?near=15,56,100&limit=1000')
+    dist = haversine(15,56,lon,lat)
+    ids = [m['id'] for m in page['items']]
+    assert sorted(ids) == list(np.nonzero(dist <= 100)[0])
+    assert np.all(np.diff(dist[ids]) >= 0) # Nearest first
+
+    start = [parse_datetime(m['deployed']) for m in moorings]
+    end = [parse_datetime(m['recovered']) for m in moorings]
+    t0,t1 = parse_datetime('2011-01-01 00:00:00'),parse_datetime('2011-06-01 00:00:00')
+    page = get_json(url + '/moorings?start=2011-01-01&end=2011-06-01&limit=1000')
+    expected = [i for i in range(len(moorings)) if (end[i] >= t0) and (start[i] <= t1)]
+    assert len(expected) > 0
+    assert [m['id'] for m in page['items']] == expected
+
+
+def test_ndjson(server):
+    url,filename,moorings = server
+    content_type,body = get(url + '/devices?format=ndjson')
+    assert content_type == 'application/x-ndjson'
+    lines = body.splitlines()
+    assert len(lines) == sum(len(m['devices']) for m in moorings)
+    first = json.loads(lines[0])
+    assert (first['mooring'],first['mooring_id'],first['name']) == (moorings[0]['name'],0,moorings[0]['devices'][0]['name'])
+
+
+def test_errors(server):
+    url,filename,moorings = server
+    assert get_error(url + '/moorings/-1') == (404,'no mooring -1')
+    assert get_error(url + '/moorings/60') == (404,'no mooring 60')
+    assert get_error(url + '/moorings/x') == (404,'no mooring x')
+    assert get_error(url + '/unknown')[0] == 404
+    assert get_error(url + '/catalog/unknown')[0] == 404
+    assert get_error(url + '/moorings?bbox=1,2,3') == (400,'bbox needs 4 comma separated numbers')
+    assert get_error(url + '/moorings?start=soon') == (400,"invalid time 'soon'")
+    assert get_error(url + '/moorings?limit=many') == (400,'offset and limit have to be integers')
+
+
+def test_reload(server):
+    url,filename,moorings = server
+    assert get_json(url + '/moorings?limit=0')['total'] == 60
+    write_mooring_file({'moorings':moorings[:5]},filename)
+    assert get_json(url + '/moorings?limit=0')['total'] == 5
+    files = get_json(url + '/files')
+    assert [(f['file'],f['moorings']) for f in files] == [(filename,5)]
@@ -0,0 +1,112 @@
+import struct
+import datetime
+
+from mooria.sniff import sniff_file
+
+
+def pd0_ensemble(time,serial=12345,sysconfig=0x41c2):
+    """ A PD0 ensemble with fixed and variable leader only
+    """
+    fixed = bytearray(60)
+    struct.pack_into('<HH',fixed,0,0x0000,0)
+    struct.pack_into('<H',fixed,4,sysconfig)
+    struct.pack_into('<I',fixed,54,serial)
+    variable = bytearray(65)
+    struct.pack_into('<H',variable,0,0x0080)
+    struct.pack_into('<7B',variable,4,time.year % 100,time.month,time.day,time.hour,time.minute,time.second,0)
+    nbytes = 6 + 2 * 2 + len(fixed) + len(variable)
+    header = struct.pack('<BBHBB2H',0x7f,0x7f,nbytes,0,2,10,10 + len(fixed))
+    ensemble = header + bytes(fixed) + bytes(variable)
+    return ensemble + struct.pack('<H',sum(ensemble) & 0xffff)
+
+
+def test_pd0(tmp_path):
+    t0 = datetime.datetime(2020,5,1,12,0,0)
+    filename = str(tmp_path / 'ADCP001.000')
+    with open(filename,'wb') as f:
+        for i in range(10):
+            f.write(pd0_ensemble(t0 + datetime.timedelta(minutes=20 * i)))
+        f.write(b'\x7f\x7f\x00') # Incomplete ensemble at the end
+    info = sniff_file(filename)
+    assert info['device'] == 'Workhorse'
+    assert info['Serial Number'] == '12345'
+    assert info['frequency'] == '300'
+    assert info['orientation'] == 'up'
+    assert info['beam_angle'] == '20'
+    assert info['sampling_interval'] == '1200'
+    assert info['first_sample'] == '2020-05-01 12:00:00'
+    assert info['last_sample'] == '2020-05-01 15:00:00'
+
+
+def test_seabird_header(tmp_path):
+    filename = str(tmp_path / 'sbe.cnv')
+    with open(filename,'w') as f:
+        f.write("* Sea-Bird SBE37 Data File:\n")
+        f.write("* <HardwareData DeviceType='SBE37SM-RS232' SerialNumber='03712345'>\n")
+        f.write("# nvalues = 100\n")
+        f.write("# interval = seconds: 60\n")
+        f.write("# start_time = May 01 2020 12:00:00 [Instrument's time stamp, header]\n")
+        f.write("*END*\n")
+        f.write(" 1 2 3\n")
+    info = sniff_file(filename)
+    assert info['device'] == 'Microcat'
+    assert info['Serial Number'] == '3712345'
+    assert info['sampling_interval'] == '60'
+    assert info['first_sample'] == '2020-05-01 12:00:00'
+    assert info['last_sample'] == '2020-05-01 13:39:00'
+
+
+def test_seabird_data_lines(tmp_path):
+    # Without start time the first and last data line are used
+    filename = str(tmp_path / 'sbe.asc')
+    with open(filename,'w') as f:
+        f.write("* SeacatPlus V 1.6  SERIAL NO. 6789\n")
+        f.write("* sample interval = 300 seconds\n")
+        f.write("*END*\n")
+        for i in range(5):
+            f.write(' 12.3456,  3.45678, 01 May 2020, 12:{:02d}:00\n'.format(5 * i))
+    info = sniff_file(filename)
+    assert info['device'] == 'Seacat'
+    assert info['Serial Number'] == '6789'
+    assert info['sampling_interval'] == '300'
+    assert info['first_sample'] == '2020-05-01 12:00:00'
+    assert info['last_sample'] == '2020-05-01 12:20:00'
+
+
+def test_unknown_file(tmp_path):
+    filename = str(tmp_path / 'notes.txt')
+    with open(filename,'w') as f:
+        f.write('nothing to see\n')
+    assert sniff_file(filename) is None
+
+
+def test_seabird_with_header_file(tmp_path):
+    # Sea-Bird software writes a .hdr file next to the .cnv file, it is not a Nortek file
+    header = "* Sea-Bird SBE37 Data File:\n* <HardwareData DeviceType='SBE37SM-RS232' SerialNumber='03712345'>\n"
+    with open(str(tmp_path / 'sbe.hdr'),'w') as f:
+        f.write(header + '*END*\n')
+    filename = str(tmp_path / 'sbe.cnv')
+    with open(filename,'w') as f:
+        f.write(header)
+        f.write("# interval = seconds: 60\n")
+        f.write("*END*\n")
+    info = sniff_file(filename)
+    assert info['device'] == 'Microcat'
+    assert info['Serial Number'] == '3712345'
+    assert info['sampling_interval'] == '60'
+    assert sniff_file(str(tmp_path / 'sbe.hdr'))['device'] == 'Microcat'
+
+
+def test_nortek_header_file(tmp_path):
+    with open(str(tmp_path / 'AQD01.hdr'),'w') as f:
+        f.write('Nortek\n\nProfile interval                      600 sec\n')
+        f.write('Time of first measurement             17.05.2019 08:00:00\n')
+        f.write('Serial number                         AQD 5678\n')
+    filename = str(tmp_path / 'AQD01.prf')
+    with open(filename,'wb') as f:
+        f.write(b'\xa5\x05' + bytes(20))
+    info = sniff_file(filename)
+    assert info['device'] == 'Aquadopp'
+    assert info['Serial Number'] == '5678'
+    assert info['sampling_interval'] == '600'
+    assert info['first_sample'] == '2019-05-17 08:00:00'
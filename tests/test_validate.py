@@ -0,0 +1,91 @@
+from mooria.validate import validate_mooring_dict, validate_catalog, normalize_mooring_dict, get_catalog_validators
+
+DEVICES = {'Microcat':{'name':'Microcat','parameter':['T','C','P'],'pump':{'options':['on','off']}},
+           'Release':{'name':'Release','hardware':True,'parameter':[]}}
+
+
+def make_data():
+    devices = [{'name':'Microcat','parameter':['T','C'],'pump':'on','location':'100 Depth'},
+               {'name':'Release','location':'2 Above bottom'}]
+    mooring = {'name':'M1','depth':'1000','lon':'10.0','lat':'54.0','deployed':'2020-01-01 00:00:00',
+               'recovered':'2020-06-01 12:00','devices':devices}
+    return {'moorings':[mooring]}
+
+
+def found(errors):
+    return sorted((e['level'],e['path'],e['message']) for e in errors)
+
+
+def test_valid_mooring():
+    assert validate_mooring_dict(make_data(),DEVICES) == []
+
+
+def test_invalid_mooring():
+    data = make_data()
+    mooring = data['moorings'][0]
+    del mooring['name']
+    mooring['depth'] = 'deep'
+    mooring['lat'] = '95'
+    mooring['recovered'] = '2019-12-31 00:00:00'
+    mooring['devices'][0]['pump'] = 'auto'
+    mooring['devices'][0]['parameter'] = ['T','O2']
+    mooring['devices'][0]['location'] = 'bottom'
+    mooring['devices'][1]['colour'] = 'yellow'
+    mooring['devices'].append({'name':'Seaguard'})
+    mooring['devices'].append('ADCP')
+    errors = found(validate_mooring_dict(data,DEVICES))
+    assert errors == [('error','moorings[0]','missing required field "name"'),
+                      ('error','moorings[0].depth',"expected a number, got 'deep'"),
+                      ('error','moorings[0].devices[0].location','expected a location of the form "12.5 Depth" or "2.0 Above bottom", got \'bottom\''),
+                      ('error','moorings[0].devices[0].parameter','parameter \'O2\' not measured by device "Microcat"'),
+                      ('error','moorings[0].devices[0].pump',"value 'auto' is not one of the options ['off', 'on']"),
+                      ('error','moorings[0].devices[3]','expected a dictionary, got str'),
+                      ('error','moorings[0].lat','value 95.000000 larger than 90.000000'),
+                      ('error','moorings[0].recovered','recovered before deployed'),
+                      ('warning','moorings[0].devices[1].colour','field not in catalog entry of device "Release"'),
+                      ('warning','moorings[0].devices[2].name',"device 'Seaguard' not in device catalog")]
+
+
+def test_invalid_collection():
+    assert found(validate_mooring_dict([],DEVICES)) == [('error','','expected a dictionary with the key "moorings"')]
+    assert found(validate_mooring_dict({'moorings':{}},DEVICES)) == [('error','moorings','expected a list of moorings')]
+    errors = validate_mooring_dict({'moorings':['M1',{'name':'','depth':''}]},DEVICES)
+    assert found(errors) == [('error','moorings[0]','expected a dictionary, got str'),
+                             ('error','moorings[1].name','field must not be empty')]
+
+
+def test_validators_follow_devices():
+    compiled = get_catalog_validators(DEVICES)
+    assert get_catalog_validators(dict(DEVICES)) is compiled
+    devices = dict(DEVICES,Seaguard={'name':'Seaguard','parameter':['U','V']})
+    assert set(get_catalog_validators(devices)) == {'Microcat','Release','Seaguard'}
+    data = {'moorings':[{'name':'M1','depth':'','devices':[{'name':'Seaguard','parameter':['U']}]}]}
+    assert validate_mooring_dict(data,devices) == []
+
+
+def test_validate_catalog():
+    devices = {'Microcat':{'parameter':'T'},
+               'ADCP':{'parameter':['U','V'],'frequency':{'options':[]},'beams':[4,5],'hardware':'no'},
+               'Float':'buoyancy'}
+    assert found(validate_catalog(devices)) == [('error','ADCP.beams','lists are only allowed for "parameter", use "options" for choices'),
+                                                ('error','ADCP.frequency','expected a non empty list of "options"'),
+                                                ('error','ADCP.hardware','expected true or false'),
+                                                ('error','Float','expected a dictionary, got str'),
+                                                ('error','Microcat.parameter','expected a list of parameter names')]
+    assert validate_catalog(DEVICES) == []
+
+
+def test_normalize_mooring_dict():
+    data = {'moorings':[{'name':'M1','depth':'100','comment':'keep','devices':[{'name':'Microcat'},'ADCP']},'M2']}
+    assert normalize_mooring_dict(data) is data
+    mooring = data['moorings'][0]
+    assert mooring['comment'] == 'keep'
+    assert mooring['lon'] == ''
+    assert mooring['longtermseries'] == ''
+    assert mooring['devices'][0]['parameter'] == []
+    assert mooring['devices'][0]['Serial Number'] == ''
+    assert mooring['devices'][1] == 'ADCP'
+    assert data['moorings'][1] == 'M2'
+    # Missing optional fields are no errors
+    del mooring['devices'][1]
+    assert validate_mooring_dict({'moorings':[mooring]},DEVICES) == []